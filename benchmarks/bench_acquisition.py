@@ -0,0 +1,350 @@
+# coding=utf-8
+
+"""
+Benchmark of frame acquisition and writing throughput, for
+TimestampedVideoSource, VideoSourceWrapper, StereoVideo, with each layout
+and each of raw, scaled, undistorted and rectified output, and the three
+VideoWriter classes, reporting frames per second, median and 99th
+percentile latency, memory allocated per frame and CPU utilisation,
+and comparing them with a stored baseline.
+
+Sources are the AVI files under tests/data, and synthetic 1920x1080 and
+3840x2160 files written to a temporary directory, so no camera is needed.
+
+Run from the top level of the repository::
+
+    python -m benchmarks.bench_acquisition
+
+which exits with status 1 if any case has a lower frame rate than the
+baseline, or allocates more memory per frame, by more than the tolerance.
+To store new results as the baseline::
+
+    python -m benchmarks.bench_acquisition --save-baseline
+
+Latency is the time of one grab, retrieve and getter call, or of one
+write_frame call, which for ThreadedTimestampedVideoWriter only queues the
+frame. Frames per second include closing the writer, and waiting for the
+writer thread to empty its queue. Memory per frame is the peak traced by
+tracemalloc during each frame, which includes numpy arrays returned by
+OpenCV, but not OpenCV's internal buffers. CPU utilisation is process
+time, over all threads, divided by elapsed time, so can exceed 100%.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import cv2
+import numpy as np
+import sksurgeryimage.acquire.stereo_video as sv
+import sksurgeryimage.acquire.video_source as vs
+import sksurgeryimage.acquire.video_writer as vw
+
+BASELINE = 'benchmarks/baselines/bench_acquisition.json'
+TOLERANCE = 0.25
+MINIMUM_KIB_DIFFERENCE = 64
+RESOLUTIONS = [(1920, 1080), (3840, 2160)]
+TEST_VIDEOS = ['tests/data/acquire/100x50_100_frames.avi',
+               'tests/data/acquire/test-16x8-rgb.avi',
+               'tests/data/calib-ucl-chessboard/leftImage.avi',
+               'tests/data/calib-ucl-chessboard/rightImage.avi',
+               'tests/data/calib-opencv/left01.avi',
+               'tests/data/calib-opencv/right01.avi']
+LAYOUTS = [('dual', sv.StereoVideoLayouts.DUAL),
+           ('interlaced', sv.StereoVideoLayouts.INTERLACED),
+           ('vertical', sv.StereoVideoLayouts.VERTICAL)]
+GETTERS = ['get_images', 'get_scaled', 'get_undistorted', 'get_rectified']
+WRITERS = [vw.VideoWriter,
+           vw.TimestampedVideoWriter,
+           vw.ThreadedTimestampedVideoWriter]
+
+
+def load_matrix(file_name):
+    """
+    Loads the first matrix from an OpenCV XML file.
+    """
+    storage = cv2.FileStorage(file_name, cv2.FILE_STORAGE_READ)
+    matrix = storage.getFirstTopLevelNode().mat()
+    storage.release()
+    return matrix
+
+
+def make_synthetic_frames(size, number_of_frames):
+    """
+    Returns frames of the given (width, height), made by tiling a
+    calibration image, and shifting it each frame, so they are not
+    trivially compressible.
+    """
+    tile = cv2.imread('tests/data/calib-ucl-chessboard/leftImage.png')
+    repeats = (size[1] // tile.shape[0] + 1, size[0] // tile.shape[1] + 1, 1)
+    tiled = np.tile(tile, repeats)[0:size[1], 0:size[0]]
+    return [np.roll(tiled, 8 * index, axis=1)
+            for index in range(number_of_frames)]
+
+
+def make_synthetic_video(file_name, size, number_of_frames):
+    """
+    Writes an MJPG file of synthetic frames.
+    """
+    writer = cv2.VideoWriter(file_name, cv2.VideoWriter_fourcc(*'MJPG'),
+                             25, size)
+    for frame in make_synthetic_frames(size, number_of_frames):
+        writer.write(frame)
+    writer.release()
+
+
+def run(create, number_of_frames):
+    """
+    Runs one case, and returns its statistics.
+
+    :param create: function returning (step, finish), where step()
+        processes one frame, and finish() waits for any work to complete
+    :param number_of_frames: number of times to call step, after one
+        untimed call, to initialise e.g. decoders and rectification maps
+    """
+    step, finish = create()
+    step()
+    latencies = np.zeros(number_of_frames)
+    start_cpu = time.process_time()
+    start = time.perf_counter()
+    for index in range(number_of_frames):
+        before = time.perf_counter()
+        step()
+        latencies[index] = time.perf_counter() - before
+    finish()
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - start_cpu
+
+    step, finish = create()
+    step()
+    allocated = np.zeros(number_of_frames)
+    tracemalloc.start()
+    for index in range(number_of_frames):
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        step()
+        allocated[index] = tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    finish()
+
+    return {'fps': round(number_of_frames / elapsed, 2),
+            'p50_ms': round(float(np.percentile(latencies, 50)) * 1000, 3),
+            'p99_ms': round(float(np.percentile(latencies, 99)) * 1000, 3),
+            'kib_per_frame': round(float(np.mean(allocated)) / 1024, 1),
+            'cpu_percent': round(cpu / elapsed * 100, 1)}
+
+
+def source_case(file_name):
+    """
+    Returns a function creating a TimestampedVideoSource reading case,
+    which rewinds at the end of the file, as some test files have only
+    one frame.
+    """
+    def create():
+        source = vs.TimestampedVideoSource(file_name)
+
+        def step():
+            success, frame = source.read()
+            if not success:
+                source.source.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                success, frame = source.read()
+            return frame
+        return step, source.release
+    return create
+
+
+def wrapper_case(file_names):
+    """
+    Returns a function creating a VideoSourceWrapper reading case.
+    """
+    def create():
+        wrapper = vs.VideoSourceWrapper()
+        for file_name in file_names:
+            wrapper.add_file(file_name)
+        return wrapper.get_next_frames, wrapper.release_all_sources
+    return create
+
+
+def stereo_case(layout, file_names, getter, size):
+    """
+    Returns a function creating a StereoVideo case, calling
+    grab, retrieve and getter for each frame.
+    """
+    def create():
+        video = sv.StereoVideo(layout, file_names)
+        video.set_intrinsic_parameters(
+            [load_matrix(f'tests/data/calib-ucl-chessboard/'
+                         f'calib.{side}.intrinsic.xml')
+             for side in ['left', 'right']],
+            [load_matrix(f'tests/data/calib-ucl-chessboard/'
+                         f'calib.{side}.distortion.xml')
+             for side in ['left', 'right']])
+        video.set_extrinsic_parameters(
+            load_matrix('tests/data/calib-ucl-chessboard/'
+                        'calib.r2l.rotation.xml'),
+            load_matrix('tests/data/calib-ucl-chessboard/'
+                        'calib.r2l.translation.xml'),
+            size)
+        get_frames = getattr(video, getter)
+
+        def step():
+            video.grab()
+            video.retrieve()
+            return get_frames()
+        return step, video.release
+    return create
+
+
+def writer_case(writer_class, file_name, frames):
+    """
+    Returns a function creating a case writing frames with writer_class.
+    """
+    def create():
+        writer = writer_class(file_name, 25, frames[0].shape[1],
+                              frames[0].shape[0])
+        counter = iter(range(sys.maxsize))
+        is_timestamped = writer_class is not vw.VideoWriter
+
+        def step():
+            frame = frames[next(counter) % len(frames)]
+            if is_timestamped:
+                writer.write_frame(frame, datetime.datetime.now())
+            else:
+                writer.write_frame(frame)
+
+        def finish():
+            if writer_class is vw.ThreadedTimestampedVideoWriter:
+                writer.stop()
+                while not writer.timestamp_file.closed:
+                    time.sleep(0.001)
+            else:
+                writer.close()
+        return step, finish
+    return create
+
+
+def get_cases(directory, number_of_frames):
+    """
+    Returns a list of (name, create, number of frames), writing synthetic
+    videos into directory.
+    """
+    cases = []
+    for file_name in TEST_VIDEOS:
+        cases.append((f'source / {os.path.basename(file_name)}',
+                      source_case(file_name), number_of_frames))
+
+    for width, height in RESOLUTIONS:
+        resolution = f'{width}x{height}'
+        file_names = [os.path.join(directory, f'{side}_{resolution}.avi')
+                      for side in ['left', 'right']]
+        for file_name in file_names:
+            make_synthetic_video(file_name, (width, height),
+                                 number_of_frames + 1)
+
+        cases.append((f'source / synthetic {resolution}',
+                      source_case(file_names[0]), number_of_frames))
+        cases.append((f'wrapper x2 / synthetic {resolution}',
+                      wrapper_case(file_names), number_of_frames))
+
+        for layout_name, layout in LAYOUTS:
+            channels = file_names if layout == sv.StereoVideoLayouts.DUAL \
+                else file_names[0:1]
+            for getter in GETTERS:
+                cases.append((f'stereo {layout_name} {getter} / {resolution}',
+                              stereo_case(layout, channels, getter,
+                                          (width, height)),
+                              number_of_frames))
+
+        frames = make_synthetic_frames((width, height), 4)
+        for writer_class in WRITERS:
+            cases.append((f'{writer_class.__name__} / {resolution}',
+                          writer_case(writer_class,
+                                      os.path.join(directory,
+                                                   f'out_{resolution}.avi'),
+                                      frames),
+                          number_of_frames))
+    return cases
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns a list of regressions of results relative to baseline.
+    """
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        expected = baseline[key]
+        if result['fps'] < expected['fps'] * (1 - tolerance):
+            regressions.append(f"{key}: {result['fps']:.1f} fps, "
+                               f"was {expected['fps']:.1f} fps")
+        if result['kib_per_frame'] > expected['kib_per_frame'] \
+                * (1 + tolerance) + MINIMUM_KIB_DIFFERENCE:
+            regressions.append(f"{key}: {result['kib_per_frame']:.0f} KiB, "
+                               f"was {expected['kib_per_frame']:.0f} KiB")
+    return regressions
+
+
+def print_table(results, baseline):
+    """
+    Prints results, and the baseline frames per second.
+    """
+    print(f"{'case':<46} {'fps':>8} {'baseline':>8} {'p50 ms':>8} "
+          f"{'p99 ms':>8} {'KiB/frame':>10} {'CPU %':>6}")
+    for key, result in results.items():
+        expected = baseline.get(key, {}).get('fps', float('nan'))
+        print(f"{key:<46} {result['fps']:>8.1f} {expected:>8.1f} "
+              f"{result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+              f"{result['kib_per_frame']:>10.0f} "
+              f"{result['cpu_percent']:>6.0f}")
+    print()
+
+
+def main(args=None):
+    """
+    Runs the benchmarks, and returns 1 if there are regressions.
+    """
+    parser = argparse.ArgumentParser(
+        description=__doc__.split('\n\n', maxsplit=1)[0])
+    parser.add_argument('--frames', type=int, default=30,
+                        help='number of synthetic frames per case')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help='allowed fractional decrease in frame rate, '
+                             'and increase in memory')
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args(args)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, create, number_of_frames in get_cases(directory,
+                                                        args.frames):
+            results[name] = run(create, number_of_frames)
+    print_table(results, baseline)
+
+    if args.save_baseline:
+        baseline.update(results)
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write('\n')
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
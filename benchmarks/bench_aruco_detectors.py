@@ -0,0 +1,108 @@
+# coding=utf-8
+
+"""
+Benchmark comparing the legacy cv2.aruco functions, which create their
+detector objects on every call, with persistent cv2.aruco.ArucoDetector
+and cv2.aruco.CharucoDetector objects, as used by ArucoPointDetector
+and CharucoPointDetector.
+
+Run from the top level of the repository::
+
+    python -m benchmarks.bench_aruco_detectors
+
+The set up cost is fixed, so the saving is most visible on small images.
+"""
+
+import functools
+import timeit
+import cv2
+from sksurgeryimage.calibration import charuco
+
+
+def time_in_ms(function, repeats=20):
+    """
+    Returns the best of 3 average run times of function, in milliseconds.
+    """
+    timings = timeit.repeat(function, number=repeats, repeat=3)
+    return min(timings) / repeats * 1000
+
+
+def legacy_aruco(image, dictionary):
+    """
+    Detects markers, with per-call parameter and detector creation.
+    """
+    parameters = charuco.create_detector_parameters()
+    return cv2.aruco.detectMarkers(image, dictionary, parameters=parameters)
+
+
+def load_images(file_name, scales):
+    """
+    Loads a grey scale image, and returns resized copies of it.
+    """
+    image = cv2.imread(file_name, cv2.IMREAD_GRAYSCALE)
+    return [(scale, cv2.resize(image, None, fx=scale, fy=scale,
+                               interpolation=cv2.INTER_AREA))
+            for scale in scales]
+
+
+def benchmark_aruco(scales):
+    """
+    Compares legacy detectMarkers with a persistent ArucoDetector.
+    """
+    dictionary = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_ARUCO_ORIGINAL)
+    detector = cv2.aruco.ArucoDetector(dictionary,
+                                       charuco.create_detector_parameters())
+    rows = []
+    for scale, image in load_images('tests/data/calibration/test-aruco.png',
+                                    scales):
+        legacy = time_in_ms(functools.partial(legacy_aruco, image, dictionary))
+        persistent = time_in_ms(functools.partial(detector.detectMarkers,
+                                                  image))
+        rows.append((image.shape, scale, legacy, persistent))
+    return rows
+
+
+def benchmark_charuco(scales):
+    """
+    Compares legacy detectMarkers + interpolateCornersCharuco
+    with a persistent CharucoDetector.
+    """
+    dictionary = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_250)
+    board = charuco.make_charuco_board_definition(dictionary, (13, 10), (3, 2))
+    detector = charuco.create_charuco_detector(board)
+    rows = []
+    for scale, image in load_images('tests/data/calibration/test-charuco.png',
+                                    scales):
+        legacy = time_in_ms(functools.partial(
+            charuco.detect_charuco_points, dictionary, board, image))
+        persistent = time_in_ms(functools.partial(
+            charuco.detect_charuco_points_with_detector, detector, image))
+        rows.append((image.shape, scale, legacy, persistent))
+    return rows
+
+
+def print_table(title, rows):
+    """
+    Prints timings, in milliseconds.
+    """
+    print(title)
+    print(f"{'image size':>14} {'scale':>6} {'legacy':>9} "
+          f"{'persistent':>11} {'saved':>8}")
+    for shape, scale, legacy, persistent in rows:
+        size = f"{shape[1]}x{shape[0]}"
+        print(f"{size:>14} {scale:>6.2f} {legacy:>9.3f} "
+              f"{persistent:>11.3f} {legacy - persistent:>8.3f}")
+    print()
+
+
+def main():
+    """
+    Runs the benchmarks.
+    """
+    scales = [0.125, 0.25, 0.5, 1.0]
+    print_table("ArUco marker detection (ms)", benchmark_aruco(scales))
+    print_table("ChArUco corner detection (ms)", benchmark_charuco(scales))
+
+
+if __name__ == "__main__":
+    main()
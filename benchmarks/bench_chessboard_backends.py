@@ -0,0 +1,124 @@
+# coding=utf-8
+
+"""
+Benchmark comparing the ChessboardPointDetector backends,
+cv2.findChessboardCorners followed by cv2.cornerSubPix, with a fixed or
+scaled refinement window, and cv2.findChessboardCornersSB, on the test
+calibration sets.
+
+Accuracy is the RMS reprojection error, in pixels, after cv2.solvePnP,
+using each set's stored intrinsic and distortion parameters.
+
+Run from the top level of the repository::
+
+    python -m benchmarks.bench_chessboard_backends
+"""
+
+import functools
+import timeit
+import cv2
+import numpy as np
+from sksurgeryimage.calibration import chessboard_point_detector as cpd
+
+# (name, image, intrinsics, distortion, number of corners, scale)
+DATA_SETS = [
+    ('ucl left', 'tests/data/calib-ucl-chessboard/leftImage.png',
+     'tests/data/calib-ucl-chessboard/calib.left.intrinsic.xml',
+     'tests/data/calib-ucl-chessboard/calib.left.distortion.xml',
+     (13, 10), (1, 2)),
+    ('ucl right', 'tests/data/calib-ucl-chessboard/rightImage.png',
+     'tests/data/calib-ucl-chessboard/calib.right.intrinsic.xml',
+     'tests/data/calib-ucl-chessboard/calib.right.distortion.xml',
+     (13, 10), (1, 2)),
+    ('opencv left', 'tests/data/calib-opencv/left01.jpg',
+     'tests/data/calib-opencv/calib.left.intrinsic.xml',
+     'tests/data/calib-opencv/calib.left.distortion.xml',
+     (9, 6), (1, 1)),
+    ('opencv right', 'tests/data/calib-opencv/right01.jpg',
+     'tests/data/calib-opencv/calib.right.intrinsic.xml',
+     'tests/data/calib-opencv/calib.right.distortion.xml',
+     (9, 6), (1, 1)),
+]
+
+BACKENDS = [
+    ('classic', {}),
+    ('classic, scaled window', {'scale_refinement_window': True}),
+    ('sector based', {'backend': cpd.FIND_CHESSBOARD_CORNERS_SB}),
+]
+
+
+def time_in_ms(function, repeats=3):
+    """
+    Returns the best of 3 average run times of function, in milliseconds.
+    """
+    timings = timeit.repeat(function, number=repeats, repeat=3)
+    return min(timings) / repeats * 1000
+
+
+def load_matrix(file_name):
+    """
+    Loads the first matrix from an OpenCV XML file.
+    """
+    storage = cv2.FileStorage(file_name, cv2.FILE_STORAGE_READ)
+    matrix = storage.getFirstTopLevelNode().mat()
+    storage.release()
+    return matrix
+
+
+def reprojection_error(object_points, image_points, intrinsics, distortion):
+    """
+    Returns the RMS reprojection error, in pixels, after cv2.solvePnP.
+    """
+    _, rvec, tvec = cv2.solvePnP(object_points, image_points,
+                                 intrinsics, distortion)
+    projected, _ = cv2.projectPoints(object_points, rvec, tvec,
+                                     intrinsics, distortion)
+    squared = np.sum((projected.reshape(-1, 2) - image_points) ** 2, axis=1)
+    return np.sqrt(np.mean(squared))
+
+
+def benchmark():
+    """
+    Runs each backend on each data set.
+    """
+    rows = []
+    for name, image_file, intrinsics_file, distortion_file, corners, scale \
+            in DATA_SETS:
+        image = cv2.imread(image_file)
+        intrinsics = load_matrix(intrinsics_file)
+        distortion = load_matrix(distortion_file)
+        for backend_name, kwargs in BACKENDS:
+            detector = cpd.ChessboardPointDetector(corners, 3, scale=scale,
+                                                   **kwargs)
+            ids, object_points, image_points = detector.get_points(image)
+            milliseconds = time_in_ms(functools.partial(detector.get_points,
+                                                        image))
+            error = float('nan')
+            if ids.shape[0] > 0:
+                error = reprojection_error(object_points, image_points,
+                                           intrinsics, distortion)
+            rows.append((name, backend_name, ids.shape[0], milliseconds,
+                         error))
+    return rows
+
+
+def print_table(rows):
+    """
+    Prints timings, in milliseconds, and errors, in pixels.
+    """
+    print(f"{'data set':>14} {'backend':>24} {'points':>7} "
+          f"{'time (ms)':>10} {'rms (px)':>9}")
+    for name, backend_name, points, milliseconds, error in rows:
+        print(f"{name:>14} {backend_name:>24} {points:>7} "
+              f"{milliseconds:>10.1f} {error:>9.4f}")
+
+
+def main():
+    """
+    Runs the benchmark.
+    """
+    print_table(benchmark())
+
+
+if __name__ == "__main__":
+    main()
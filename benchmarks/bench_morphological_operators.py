@@ -0,0 +1,102 @@
+# coding=utf-8
+
+"""
+Benchmark to find the crossover points between the direct and the
+fast paths in sksurgeryimage.processing.morphological_operators.
+
+Run from the top level of the repository::
+
+    python -m benchmarks.bench_morphological_operators
+
+and update SEPARABLE_MIN_SIZE and DISTANCE_TRANSFORM_MIN_ITERATIONS
+if the crossover on your hardware is very different.
+"""
+
+import functools
+import timeit
+import cv2
+import numpy as np
+from sksurgeryimage.processing import morphological_operators as mo
+
+
+def make_binary_mask(width=1920, height=1080):
+    """
+    Creates a blobby, binary, HD sized mask, similar to a segmentation mask.
+    """
+    generator = np.random.default_rng(seed=42)
+    mask = (generator.random((height, width)) > 0.3).astype(np.uint8) * 255
+    return cv2.medianBlur(mask, 5)
+
+
+def time_in_ms(function, repeats=10):
+    """
+    Returns the best of 3 average run times of function, in milliseconds.
+    """
+    timings = timeit.repeat(function, number=repeats, repeat=3)
+    return min(timings) / repeats * 1000
+
+
+def crossover(rows):
+    """
+    Returns the first parameter value where the fast method was faster.
+    """
+    for parameter, direct, fast in rows:
+        if fast < direct:
+            return parameter
+    return None
+
+
+def benchmark_size(image, sizes):
+    """
+    Compares direct and separable erosion, for increasing cross size.
+    """
+    rows = []
+    for size in sizes:
+        direct = time_in_ms(functools.partial(
+            mo.erode_with_cross, image, size=size, method='direct'))
+        fast = time_in_ms(functools.partial(
+            mo.erode_with_cross, image, size=size, method='separable'))
+        rows.append((size, direct, fast))
+    return rows
+
+
+def benchmark_iterations(image, iterations_list):
+    """
+    Compares direct and distance transform erosion, for increasing iterations.
+    """
+    rows = []
+    for iterations in iterations_list:
+        direct = time_in_ms(functools.partial(
+            mo.erode_with_cross, image, iterations=iterations,
+            method='direct'), repeats=3)
+        fast = time_in_ms(functools.partial(
+            mo.erode_with_cross, image, iterations=iterations,
+            method='distance'), repeats=3)
+        rows.append((iterations, direct, fast))
+    return rows
+
+
+def print_table(title, rows):
+    """
+    Prints a table of timings, and the crossover point.
+    """
+    print(title)
+    print(f"{'value':>8} {'direct ms':>10} {'fast ms':>10}")
+    for parameter, direct, fast in rows:
+        print(f"{parameter:>8} {direct:>10.2f} {fast:>10.2f}")
+    print(f"crossover: {crossover(rows)}\n")
+
+
+def main():
+    """
+    Runs both benchmarks on an HD binary mask.
+    """
+    image = make_binary_mask()
+    print_table("Cross size, 1 iteration, separable vs direct:",
+                benchmark_size(image, [3, 5, 9, 15, 21, 31, 45, 61]))
+    print_table("Iterations of 3x3 cross, distance transform vs direct:",
+                benchmark_iterations(image, [1, 5, 10, 15, 20, 30, 50, 100]))
+
+
+if __name__ == "__main__":
+    main()
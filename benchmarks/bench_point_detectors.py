@@ -0,0 +1,330 @@
+# coding=utf-8
+
+"""
+Benchmark of every PointDetector on the test images and videos, on
+synthetic ChArUco boards at several resolutions, and on frames without
+a pattern, reporting milliseconds per frame, points per frame and peak
+memory, and comparing them with a stored baseline.
+
+Run from the top level of the repository::
+
+    python -m benchmarks.bench_point_detectors
+
+which exits with status 1 if any frame is slower or uses more memory
+than the baseline by more than the tolerance, or detects fewer points.
+To store new results as the baseline, e.g. after an intended change,
+or to benchmark on different hardware::
+
+    python -m benchmarks.bench_point_detectors --save-baseline
+
+Timings depend on the machine, so compare against a baseline saved on
+the same machine. Peak memory is measured with tracemalloc, so counts
+allocations made through Python, including numpy arrays, but not those
+made inside OpenCV.
+"""
+
+import argparse
+import functools
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+import cv2
+import numpy as np
+from sksurgeryimage.calibration import charuco
+from sksurgeryimage.calibration.aruco_point_detector \
+    import ArucoPointDetector
+from sksurgeryimage.calibration.charuco_plus_chessboard_point_detector \
+    import CharucoPlusChessboardPointDetector
+from sksurgeryimage.calibration.charuco_point_detector \
+    import CharucoPointDetector
+from sksurgeryimage.calibration.chessboard_point_detector \
+    import ChessboardPointDetector
+from sksurgeryimage.calibration.dotty_grid_point_detector \
+    import DottyGridPointDetector, create_model_points
+
+BASELINE = 'benchmarks/baselines/bench_point_detectors.json'
+TOLERANCE = 0.25
+MINIMUM_MS_DIFFERENCE = 1.0
+SYNTHETIC_CHARUCO_SIZES = [(650, 500), (1300, 1000), (2600, 2000)]
+
+
+def time_in_ms(function, seconds_per_repeat=0.2):
+    """
+    Returns the best of 3 average run times of function, in milliseconds,
+    running it enough times to take about seconds_per_repeat, so slow
+    frames are not run needlessly often.
+    """
+    single = timeit.timeit(function, number=1)
+    repeats = max(1, min(20, int(seconds_per_repeat / max(single, 1e-6))))
+    timings = timeit.repeat(function, number=repeats, repeat=3)
+    return min(timings) / repeats * 1000
+
+
+def peak_memory_in_kib(function):
+    """
+    Returns the peak memory allocated while running function, in KiB.
+    """
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def load_video_frames(file_name):
+    """
+    Returns all frames of a video file.
+    """
+    capture = cv2.VideoCapture(file_name)
+    frames = []
+    success, frame = capture.read()
+    while success:
+        frames.append(frame)
+        success, frame = capture.read()
+    capture.release()
+    return frames
+
+
+def make_miss_frames(image):
+    """
+    Returns a blank frame, and a frame of noise, the size of image,
+    neither of which contains a pattern.
+    """
+    rng = np.random.default_rng(0)
+    blank = np.full_like(image, 128)
+    noise = rng.integers(0, 256, image.shape, dtype=np.uint8)
+    return [('blank', blank), ('noise', noise)]
+
+
+def make_synthetic_charuco(dictionary, image_size):
+    """
+    Returns a synthetic ChArUco board, of 13x10 squares, with a white
+    border, viewed with a slight perspective.
+    """
+    image, _ = charuco.make_charuco_board(dictionary, (13, 10), (3, 2),
+                                          image_size)
+    border = image_size[0] // 10
+    image = cv2.copyMakeBorder(image, border, border, border, border,
+                               cv2.BORDER_CONSTANT, value=255)
+    height, width = image.shape
+    homography = np.array([[0.95, 0.05, width * 0.02],
+                           [-0.03, 0.97, height * 0.02],
+                           [2e-5 * 1300 / width, 1e-5 * 1300 / width, 1]])
+    image = cv2.warpPerspective(image, homography, (width, height),
+                                borderValue=255)
+    return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+
+
+def chessboard_cases():
+    """
+    Returns ChessboardPointDetector cases, on the UCL and OpenCV
+    calibration images and videos.
+    """
+    ucl = cv2.imread('tests/data/calib-ucl-chessboard/leftImage.png')
+    opencv = cv2.imread('tests/data/calib-opencv/left01.jpg')
+    ucl_frames = [('ucl left png', ucl)] + \
+        [('ucl left avi', frame) for frame in load_video_frames(
+            'tests/data/calib-ucl-chessboard/leftImage.avi')] + \
+        make_miss_frames(ucl)
+    opencv_frames = [('opencv left jpg', opencv)] + \
+        [('opencv left avi', frame) for frame in load_video_frames(
+            'tests/data/calib-opencv/left01.avi')] + \
+        make_miss_frames(opencv)
+    return [('chessboard 13x10', ChessboardPointDetector((13, 10), 3, (1, 2)),
+             ucl_frames),
+            ('chessboard 9x6', ChessboardPointDetector((9, 6), 3),
+             opencv_frames)]
+
+
+def charuco_cases():
+    """
+    Returns CharucoPointDetector cases, on the test image, and on
+    synthetic boards.
+    """
+    dictionary = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_250)
+    image = cv2.imread('tests/data/calibration/test-charuco.png')
+    frames = [('test-charuco png', image)]
+    for image_size in SYNTHETIC_CHARUCO_SIZES:
+        frames.append((f'synthetic {image_size[0]}x{image_size[1]}',
+                       make_synthetic_charuco(dictionary, image_size)))
+    frames += make_miss_frames(image)
+    return [('charuco 13x10',
+             CharucoPointDetector(dictionary, (13, 10), (3, 2)),
+             frames)]
+
+
+def charuco_plus_chessboard_cases():
+    """
+    Returns CharucoPlusChessboardPointDetector cases.
+    """
+    image = cv2.imread('tests/data/calibration/'
+                       'pattern_4x4_19x26_5_4_with_inset_9x14.png')
+    detector = CharucoPlusChessboardPointDetector(
+        dictionary=cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_250),
+        minimum_number_of_points=50,
+        number_of_charuco_squares=[19, 26],
+        size_of_charuco_squares=[5, 4],
+        number_of_chessboard_squares=[9, 14],
+        chessboard_square_size=3,
+        legacy_pattern=True,
+        error_if_no_chessboard=False,
+        parallel=True,
+        restrict_chessboard_search=True)
+    return [('charuco plus chessboard', detector,
+             [('inset 9x14 png', image)] + make_miss_frames(image))]
+
+
+def aruco_cases():
+    """
+    Returns ArucoPointDetector cases, with a model of the 12 markers
+    in the test image.
+    """
+    image = cv2.imread('tests/data/calibration/test-aruco.png')
+    model = {}
+    for index, identifier in enumerate([860, 759, 752, 892, 304, 996,
+                                        11, 1000, 962, 308, 109, 560]):
+        model[identifier] = np.array([[index % 3 * 20, index // 3 * 20, 0]],
+                                     dtype=np.float32)
+    dictionary = cv2.aruco.getPredefinedDictionary(
+        cv2.aruco.DICT_ARUCO_ORIGINAL)
+    detector = ArucoPointDetector(dictionary,
+                                  cv2.aruco.DetectorParameters(),
+                                  model)
+    return [('aruco', detector,
+             [('test-aruco png', image)] + make_miss_frames(image))]
+
+
+def dotty_grid_cases():
+    """
+    Returns DottyGridPointDetector cases, on a synthetic dot pattern,
+    and on a captured one.
+    """
+    intrinsics = np.loadtxt('tests/data/calib-ucl-circles/'
+                            'calib.left.intrinsics.txt')
+    distortion = np.loadtxt('tests/data/calib-ucl-circles/'
+                            'calib.left.distortion.txt')
+    synthetic = DottyGridPointDetector(create_model_points([18, 25], 80, 5),
+                                       [132, 142, 307, 317],
+                                       intrinsics,
+                                       distortion,
+                                       reference_image_size=(2600, 1900))
+    image = cv2.imread('tests/data/calib-ucl-circles/circles-25x18-r50-s2.png')
+    captured = DottyGridPointDetector(create_model_points([18, 25], 100, 5),
+                                      [133, 141, 308, 316],
+                                      intrinsics,
+                                      distortion,
+                                      reference_image_size=(2600, 1900))
+    snapshot = cv2.imread('tests/data/calib-ucl-circles/'
+                          'snapshots-calibrated/08_56_08/left_image.png')
+    return [('dotty grid synthetic', synthetic,
+             [('circles r50 png', image)] + make_miss_frames(image)),
+            ('dotty grid captured', captured,
+             [('snapshot left png', snapshot)])]
+
+
+CASES = {'chessboard': chessboard_cases,
+         'charuco': charuco_cases,
+         'charuco_plus_chessboard': charuco_plus_chessboard_cases,
+         'aruco': aruco_cases,
+         'dotty_grid': dotty_grid_cases}
+
+
+def benchmark(case_names):
+    """
+    Runs the named cases, and returns a dict of results,
+    keyed by 'detector / frame'.
+    """
+    results = {}
+    for case_name in case_names:
+        for detector_name, detector, frames in CASES[case_name]():
+            for frame_name, frame in frames:
+                get_points = functools.partial(detector.get_points, frame)
+                ids, _, _ = get_points()
+                results[f'{detector_name} / {frame_name}'] = {
+                    'ms_per_frame': round(time_in_ms(get_points), 3),
+                    'points_per_frame': int(ids.shape[0]),
+                    'peak_memory_kib': round(peak_memory_in_kib(get_points),
+                                             1)}
+            # Shuts down any worker threads, e.g. in parallel mode.
+            if hasattr(detector, 'close'):
+                detector.close()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns a list of regressions of results relative to baseline.
+    """
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        expected = baseline[key]
+        if result['ms_per_frame'] > expected['ms_per_frame'] \
+                * (1 + tolerance) + MINIMUM_MS_DIFFERENCE:
+            regressions.append(f"{key}: {result['ms_per_frame']:.1f} ms, "
+                               f"was {expected['ms_per_frame']:.1f} ms")
+        if result['points_per_frame'] < expected['points_per_frame']:
+            regressions.append(f"{key}: {result['points_per_frame']} points, "
+                               f"was {expected['points_per_frame']}")
+        if result['peak_memory_kib'] > expected['peak_memory_kib'] \
+                * (1 + tolerance):
+            regressions.append(f"{key}: {result['peak_memory_kib']:.0f} KiB, "
+                               f"was {expected['peak_memory_kib']:.0f} KiB")
+    return regressions
+
+
+def print_table(results, baseline):
+    """
+    Prints results, and the baseline milliseconds per frame.
+    """
+    print(f"{'detector / frame':<52} {'ms':>9} {'baseline':>9} "
+          f"{'points':>7} {'peak KiB':>9}")
+    for key, result in results.items():
+        expected = baseline.get(key, {}).get('ms_per_frame', float('nan'))
+        print(f"{key:<52} {result['ms_per_frame']:>9.2f} {expected:>9.2f} "
+              f"{result['points_per_frame']:>7} "
+              f"{result['peak_memory_kib']:>9.0f}")
+    print()
+
+
+def main(args=None):
+    """
+    Runs the benchmarks, and returns 1 if there are regressions.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n', maxsplit=1)[0])
+    parser.add_argument('--cases', nargs='+', choices=list(CASES),
+                        default=list(CASES))
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help='allowed fractional increase in time and memory')
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args(args)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+
+    results = benchmark(args.cases)
+    print_table(results, baseline)
+
+    if args.save_baseline:
+        baseline.update(results)
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write('\n')
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,6 +10,7 @@ import sksurgerycore.utilities.validate as scv
 import sksurgerycore.utilities.validate_matrix as scvm
 import sksurgeryimage.acquire.video_source as vs
 import sksurgeryimage.processing.interlace as i
+import sksurgeryimage.utilities.instrumentation as si
 
 
 LOGGER = logging.getLogger(__name__)
@@ -188,7 +189,8 @@ class StereoVideo:
 
         :return: list of images
         """
-        return self._extract_separate_views()
+        with si.stage('stereo_video.get_images'):
+            return self._extract_separate_views()
 
     def get_scaled(self):
         """
@@ -196,19 +198,22 @@ class StereoVideo:
 
         :return: list of images
         """
-        frames = self.get_images()
-        scaled = []
-        if len(self.channels) == 1:  # stereo frames provided in one image
-            for frame in frames:
-                scaled_image = cv2.resize(frame,
-                                          None,
-                                          fx=self.scaling[0],
-                                          fy=self.scaling[1],
-                                          interpolation=cv2.INTER_NEAREST)
-                scaled.append(scaled_image)
-        else:
-            scaled = frames
-        return scaled
+        with si.stage('stereo_video.get_scaled'):
+            frames = self.get_images()
+            scaled = []
+            if len(self.channels) == 1:  # stereo frames provided in one image
+                with si.stage('stereo_video.scale'):
+                    for frame in frames:
+                        scaled_image = cv2.resize(
+                            frame,
+                            None,
+                            fx=self.scaling[0],
+                            fy=self.scaling[1],
+                            interpolation=cv2.INTER_NEAREST)
+                        scaled.append(scaled_image)
+            else:
+                scaled = frames
+            return scaled
 
     def get_undistorted(self):
         """
@@ -218,17 +223,19 @@ class StereoVideo:
         :raises: ValueError - if you haven't already provided camera parameters
         """
         self._validate_intrinsic_params()
-        frames = self.get_scaled()
-        undistorted = []
-        counter = 0
-        for frame in frames:
-            undist = cv2.undistort(frame,
-                                   self.camera_matrices[counter],
-                                   self.distortion_coefficients[counter]
-                                   )
-            undistorted.append(undist)
-            counter += 1
-        return undistorted
+        with si.stage('stereo_video.get_undistorted'):
+            frames = self.get_scaled()
+            undistorted = []
+            counter = 0
+            with si.stage('stereo_video.undistort'):
+                for frame in frames:
+                    undist = cv2.undistort(frame,
+                                           self.camera_matrices[counter],
+                                           self.distortion_coefficients[counter]
+                                           )
+                    undistorted.append(undist)
+                    counter += 1
+            return undistorted
 
     def get_rectified(self):
         """
@@ -241,54 +248,64 @@ class StereoVideo:
         scvm.validate_rotation_matrix(self.stereo_rotation)
         scvm.validate_translation_column_vector(self.stereo_translation)
 
-        frames = self.get_scaled()
-
-        if not self.rectify_initialised:
-
-            image_size = (frames[0].shape[1], frames[0].shape[0])
-
-            self.rectify_rotation[0], \
-                self.rectify_rotation[1], \
-                self.rectify_projection[0], \
-                self.rectify_projection[1], \
-                self.rectify_q, \
-                self.rectify_valid_roi[0], \
-                self.rectify_valid_roi[1] = \
-                cv2.stereoRectify(self.camera_matrices[0],
-                                  self.distortion_coefficients[0],
-                                  self.camera_matrices[1],
-                                  self.distortion_coefficients[1],
-                                  image_size,
-                                  self.stereo_rotation,
-                                  self.stereo_translation,
-                                  flags=cv2.CALIB_ZERO_DISPARITY,
-                                  alpha=0,
-                                  newImageSize=self.rectify_new_size
-                                  )
-            for image_index in [0, 1]:
-                self.rectify_dx[image_index], self.rectify_dy[image_index] = \
-                    cv2.initUndistortRectifyMap(
-                        self.camera_matrices[image_index],
-                        self.distortion_coefficients[image_index],
-                        self.rectify_rotation[image_index],
-                        self.rectify_projection[image_index],
-                        self.rectify_new_size,
-                        cv2.CV_32FC1
-                        )
-
-            self.rectify_initialised = True
-
-        rectified = []
-        counter = 0
-        for frame in frames:
-            rectified_image = cv2.remap(frame,
-                                        self.rectify_dx[counter],
-                                        self.rectify_dy[counter],
-                                        cv2.INTER_LINEAR
-                                        )
-            rectified.append(rectified_image)
-            counter += 1
-        return rectified
+        with si.stage('stereo_video.get_rectified'):
+            frames = self.get_scaled()
+
+            if not self.rectify_initialised:
+                with si.stage('stereo_video.rectify_maps'):
+                    self._initialise_rectification(frames)
+
+            rectified = []
+            counter = 0
+            with si.stage('stereo_video.remap'):
+                for frame in frames:
+                    rectified_image = cv2.remap(frame,
+                                                self.rectify_dx[counter],
+                                                self.rectify_dy[counter],
+                                                cv2.INTER_LINEAR
+                                                )
+                    rectified.append(rectified_image)
+                    counter += 1
+            return rectified
+
+    def _initialise_rectification(self, frames):
+        """
+        Internal method to compute the rectification maps.
+
+        :param frames: list of 2 scaled images
+        """
+        image_size = (frames[0].shape[1], frames[0].shape[0])
+
+        self.rectify_rotation[0], \
+            self.rectify_rotation[1], \
+            self.rectify_projection[0], \
+            self.rectify_projection[1], \
+            self.rectify_q, \
+            self.rectify_valid_roi[0], \
+            self.rectify_valid_roi[1] = \
+            cv2.stereoRectify(self.camera_matrices[0],
+                              self.distortion_coefficients[0],
+                              self.camera_matrices[1],
+                              self.distortion_coefficients[1],
+                              image_size,
+                              self.stereo_rotation,
+                              self.stereo_translation,
+                              flags=cv2.CALIB_ZERO_DISPARITY,
+                              alpha=0,
+                              newImageSize=self.rectify_new_size
+                              )
+        for image_index in [0, 1]:
+            self.rectify_dx[image_index], self.rectify_dy[image_index] = \
+                cv2.initUndistortRectifyMap(
+                    self.camera_matrices[image_index],
+                    self.distortion_coefficients[image_index],
+                    self.rectify_rotation[image_index],
+                    self.rectify_projection[image_index],
+                    self.rectify_new_size,
+                    cv2.CV_32FC1
+                    )
+
+        self.rectify_initialised = True
 
     def _validate_intrinsic_params(self):
         """
@@ -317,12 +334,14 @@ class StereoVideo:
             return self.video_sources.frames
 
         if self.layout == StereoVideoLayouts.INTERLACED:
-            even_rows, odd_rows \
-                = i.deinterlace_to_view(self.video_sources.frames[0])
+            with si.stage('stereo_video.deinterlace'):
+                even_rows, odd_rows \
+                    = i.deinterlace_to_view(self.video_sources.frames[0])
             separated = [even_rows, odd_rows]
             return separated
 
-        top, bottom \
-            = i.split_stacked_to_view(self.video_sources.frames[0])
+        with si.stage('stereo_video.split'):
+            top, bottom \
+                = i.split_stacked_to_view(self.video_sources.frames[0])
         separated = [top, bottom]
         return separated
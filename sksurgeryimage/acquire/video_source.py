@@ -12,6 +12,7 @@ import cv2
 import numpy as np
 import sksurgerycore.utilities.validate_file as vf
 import sksurgeryimage.utilities.camera_utilities as cu
+import sksurgeryimage.utilities.instrumentation as si
 
 LOGGER = logging.getLogger(__name__)
 
@@ -88,7 +89,8 @@ class TimestampedVideoSource:
         """
         Call the cv2.VideoCapture grab function and get a timestamp.
         """
-        self.ret = self.source.grab()
+        with si.stage('video_source.grab'):
+            self.ret = self.source.grab()
 
         self.timestamp = datetime.datetime.now()
 
@@ -99,7 +101,8 @@ class TimestampedVideoSource:
         Call the cv2.VideoCapture retrieve function and
         store the returned frame.
         """
-        self.ret, self.frame = self.source.retrieve()
+        with si.stage('video_source.retrieve'):
+            self.ret, self.frame = self.source.retrieve()
         return self.ret, self.frame
 
     def read(self):
@@ -10,6 +10,7 @@ from queue import Queue
 from threading import Thread
 import cv2
 import numpy as np
+import sksurgeryimage.utilities.instrumentation as si
 
 LOGGER = logging.getLogger(__name__)
 
@@ -47,7 +48,8 @@ class VideoWriter(object):
     def close(self):
         """ Close/release the output file for video. """
         logging.debug("Closing VideoWriter")
-        self.video_writer.release()
+        with si.stage('video_writer.flush'):
+            self.video_writer.release()
 
     def set_filename(self, filename):
         """
@@ -90,7 +92,8 @@ class VideoWriter(object):
         logging.debug("Writing frame with dimensions: %i x %i",
                       frame.shape[1], frame.shape[0])
 
-        self.video_writer.write(frame)
+        with si.stage('video_writer.encode'):
+            self.video_writer.write(frame)
 
 
 class TimestampedVideoWriter(VideoWriter):
@@ -118,8 +121,9 @@ class TimestampedVideoWriter(VideoWriter):
     def close(self):
         """ Close/release the output files for video and timestamps. """
         logging.debug("Closing video writer")
-        self.video_writer.release()
-        self.timestamp_file.close()
+        with si.stage('video_writer.flush'):
+            self.video_writer.release()
+            self.timestamp_file.close()
         logging.debug("Closing TimestampedVideoWriter.")
 
     def write_frame(self, frame, timestamp=None):
@@ -191,7 +195,8 @@ class ThreadedTimestampedVideoWriter(TimestampedVideoWriter):
         :param timestamp: Frame timestamp
         :type timestamp: datetime.datetime object """
 
-        self.queue.put((frame, timestamp))
+        with si.stage('video_writer.enqueue'):
+            self.queue.put((frame, timestamp))
 
     def run(self):
         """ Write data from the queue to the output file(s). """
@@ -219,7 +224,8 @@ class ThreadedTimestampedVideoWriter(TimestampedVideoWriter):
         logging.debug("Writing frame with dimensions: %i x %i",
                       frame.shape[1], frame.shape[0])
 
-        self.video_writer.write(frame)
+        with si.stage('video_writer.encode'):
+            self.video_writer.write(frame)
 
         if not timestamp:
             timestamp = self.default_timestamp_message
@@ -3,12 +3,14 @@
 """
 ArUco implementation of PointDetector.
 """
+import copy
 import logging
 from typing import Tuple
 import cv2
 import numpy as np
 import sksurgeryimage.calibration.point_detector as pd
 import sksurgeryimage.calibration.point_detector_utils as pdu
+import sksurgeryimage.utilities.instrumentation as si
 
 
 LOGGER = logging.getLogger(__name__)
@@ -51,6 +53,28 @@ class ArucoPointDetector(pd.PointDetector):
         self.dictionary = dictionary
         self.parameters = parameters
         self.model_points = model_points
+        self._is_in_model, self._dense_model_points = \
+            pdu.create_dense_model(self.model_points)
+
+        # Created once, so no set up is repeated per frame.
+        self._aruco_detector = cv2.aruco.ArucoDetector(self.dictionary,
+                                                       self.parameters)
+
+    def get_config(self) -> dict:
+        """
+        Returns the constructor arguments. See PointDetector.get_config().
+        """
+        return {'dictionary': pdu.aruco_dictionary_to_config(self.dictionary),
+                'parameters': pdu.opencv_parameters_to_config(self.parameters),
+                'model_points': copy.deepcopy(self.model_points),
+                'scale': tuple(self.scale)}
+
+    @classmethod
+    def from_config(cls, config: dict):
+        """
+        Creates a detector from the output of get_config().
+        """
+        return cls(**pdu.aruco_objects_from_config(config))
 
     def _internal_get_points(self,
                              image: np.ndarray,
@@ -62,36 +86,23 @@ class ArucoPointDetector(pd.PointDetector):
         :return: ids, object_points, image_points
         """
         # pylint: disable=unpacking-non-sequence
-        corners, ids, _ = \
-            cv2.aruco.detectMarkers(image,
-                                    self.dictionary,
-                                    parameters=self.parameters)
-
-        number_of_points = pdu.get_number_of_points(ids, self.model_points)
-
-        returned_ids = np.zeros((number_of_points, 1), dtype=np.int32)
-        image_points = np.zeros((number_of_points, 2))
-        object_points = np.zeros((number_of_points, 3))
-
-        if number_of_points > 0:
-
-            for i in range(number_of_points):
-                if ids[i][0] in self.model_points.keys(): # avoids key error
-                    point_id = ids[i][0]
-                    object_point = self.model_points[point_id]
-
-                    # intersect diagonals, more accurate than each corner.
-                    centre = pdu.get_intersect(corners[i][0][0],
-                                               corners[i][0][2],
-                                               corners[i][0][1],
-                                               corners[i][0][3],
-                                               )
-                    image_points[i][0] = centre[0]
-                    image_points[i][1] = centre[1]
-
-                    object_points[i][0] = object_point[0][0]
-                    object_points[i][1] = object_point[0][1]
-                    object_points[i][2] = object_point[0][2]
-                    returned_ids[i][0] = point_id
+        with si.stage('aruco.detect'):
+            corners, ids, _ = self._aruco_detector.detectMarkers(image)
+
+        in_model = pdu.get_model_mask(ids, self._is_in_model)
+        if not np.any(in_model):
+            return np.zeros((0, 1), dtype=np.int32), \
+                np.zeros((0, 3)), \
+                np.zeros((0, 2))
+
+        returned_ids = ids.reshape(-1, 1)[in_model].astype(np.int32)
+        object_points = self._dense_model_points[returned_ids[:, 0]]
+
+        # intersect diagonals, more accurate than each corner.
+        marker_corners = np.reshape(corners, (-1, 4, 2))[in_model]
+        image_points = pdu.get_intersects(marker_corners[:, 0],
+                                          marker_corners[:, 2],
+                                          marker_corners[:, 1],
+                                          marker_corners[:, 3])
 
         return returned_ids, object_points, image_points
@@ -0,0 +1,373 @@
+# coding=utf-8
+
+"""
+Accumulates PointDetector results, frame by frame, for camera calibration.
+"""
+
+import logging
+from typing import Tuple
+import cv2
+import numpy as np
+from sksurgeryimage.calibration.point_detection_result \
+    import PointDetectionResult
+
+LOGGER = logging.getLogger(__name__)
+
+# Number of points stored before the arrays first need to grow.
+INITIAL_CAPACITY = 4096
+
+# Perspective terms of a normalised homography are binned into
+# TILT_BINS x TILT_BINS cells, over +/- MAX_TILT, to measure tilt coverage.
+TILT_BINS = 3
+MAX_TILT = 1.0
+
+
+def _get_normalisation(image_size) -> np.ndarray:
+    """
+    Returns the 3x3 matrix mapping pixels to coordinates centred on
+    the image, scaled so the longest side spans [-1, 1], so
+    homographies from different views are comparable and well conditioned.
+    """
+    width, height = image_size
+    scale = 2.0 / max(width, height)
+    return np.array([[scale, 0, -scale * width / 2.0],
+                     [0, scale, -scale * height / 2.0],
+                     [0, 0, 1]])
+
+
+def _get_zhang_constraints(homography: np.ndarray) -> np.ndarray:
+    """
+    Returns the 2x6 linear constraints that one plane to image homography
+    puts on b = [B11, B12, B22, B13, B23, B33], where B = K^-T K^-1.
+    See Zhang, "A flexible new technique for camera calibration", 2000.
+    """
+    def v_ij(i, j):
+        h_i = homography[:, i]
+        h_j = homography[:, j]
+        return np.array([h_i[0] * h_j[0],
+                         h_i[0] * h_j[1] + h_i[1] * h_j[0],
+                         h_i[1] * h_j[1],
+                         h_i[2] * h_j[0] + h_i[0] * h_j[2],
+                         h_i[2] * h_j[1] + h_i[1] * h_j[2],
+                         h_i[2] * h_j[2]])
+    return np.vstack((v_ij(0, 1), v_ij(0, 0) - v_ij(1, 1)))
+
+
+def _get_intrinsics_from_b(b_vector: np.ndarray) -> np.ndarray:
+    """
+    Zhang's closed form solution for K, from b, or None if b is not valid.
+    """
+    if b_vector[0] < 0:
+        b_vector = -b_vector
+    b11, b12, b22, b13, b23, b33 = b_vector
+    denominator = b11 * b22 - b12 * b12
+    if b11 <= 0 or denominator <= 0:
+        return None
+    v_0 = (b12 * b13 - b11 * b23) / denominator
+    lamda = b33 - (b13 * b13 + v_0 * (b12 * b13 - b11 * b23)) / b11
+    if lamda <= 0:
+        return None
+    alpha = np.sqrt(lamda / b11)
+    beta = np.sqrt(lamda * b11 / denominator)
+    gamma = -b12 * alpha * alpha * beta / lamda
+    u_0 = gamma * v_0 / beta - b13 * alpha * alpha / lamda
+    return np.array([[alpha, gamma, u_0],
+                     [0, beta, v_0],
+                     [0, 0, 1]])
+
+
+# pylint: disable=too-many-instance-attributes
+class CalibrationAccumulator:
+    """
+    Accumulates detected points, frame by frame, into preallocated arrays,
+    which grow by doubling, so adding a view rarely allocates memory.
+
+    Only views that add to the diversity of board poses are kept.
+    Each view is summarised by a pose descriptor: the centroid and size of
+    its points in the image, and the perspective terms of its plane to
+    image homography, which measure tilt without needing intrinsics.
+    A view is kept if it covers new image cells or tilt bins, or if its
+    descriptor is at least minimum_pose_distance from every kept view.
+
+    Each kept view's homography adds two constraints to a running 6x6
+    normal matrix, from which get_rolling_intrinsics() solves for the
+    camera matrix, using Zhang's closed form solution, at a cost that
+    does not grow with the number of views. Planar boards only.
+
+    calibrate() only runs cv2.calibrateCamera when coverage has increased
+    by recalibration_threshold since the last calibration.
+
+    :param image_size: (width, height) in pixels
+    :param minimum_number_of_points: views with fewer points are rejected
+    :param maximum_number_of_views: views are rejected once this many kept
+    :param minimum_pose_distance: minimum descriptor distance to every
+        kept view, for a view that covers nothing new to be kept
+    :param coverage_grid: (number in x, number in y) image cells for
+        measuring coverage
+    :param recalibration_threshold: coverage increase, in [0, 1],
+        needed to trigger a new calibration
+    :param calibration_flags: flags for cv2.calibrateCamera
+    """
+    # pylint: disable=too-many-arguments
+    def __init__(self,
+                 image_size: Tuple[int, int],
+                 minimum_number_of_points: int=6,
+                 maximum_number_of_views: int=50,
+                 minimum_pose_distance: float=0.1,
+                 coverage_grid: Tuple[int, int]=(8, 6),
+                 recalibration_threshold: float=0.05,
+                 calibration_flags: int=0):
+        if minimum_number_of_points < 4:
+            raise ValueError("minimum_number_of_points should be >= 4")
+        if maximum_number_of_views < 1:
+            raise ValueError("maximum_number_of_views should be >= 1")
+        self.image_size = (int(image_size[0]), int(image_size[1]))
+        self.minimum_number_of_points = minimum_number_of_points
+        self.maximum_number_of_views = maximum_number_of_views
+        self.minimum_pose_distance = minimum_pose_distance
+        self.coverage_grid = (int(coverage_grid[0]), int(coverage_grid[1]))
+        self.recalibration_threshold = recalibration_threshold
+        self.calibration_flags = calibration_flags
+
+        self._normalisation = _get_normalisation(self.image_size)
+        self._ids = np.empty(INITIAL_CAPACITY, dtype=np.int32)
+        self._object_points = np.empty((INITIAL_CAPACITY, 3), dtype=np.float32)
+        self._image_points = np.empty((INITIAL_CAPACITY, 2), dtype=np.float32)
+        self._number_of_points = 0
+        self._view_starts = np.empty(maximum_number_of_views + 1,
+                                     dtype=np.int64)
+        self._view_starts[0] = 0
+        self._descriptors = np.empty((maximum_number_of_views, 5))
+        self._number_of_views = 0
+        self._covered_cells = np.zeros((self.coverage_grid[1],
+                                        self.coverage_grid[0]), dtype=bool)
+        self._covered_tilts = np.zeros((TILT_BINS, TILT_BINS), dtype=bool)
+        self._normal_matrix = np.zeros((6, 6))
+        self._number_of_constraints = 0
+        self._coverage_at_calibration = 0.0
+        self._calibration = None
+
+    def __len__(self) -> int:
+        return self._number_of_views
+
+    def get_number_of_points(self) -> int:
+        """
+        Returns the total number of points in the kept views.
+        """
+        return self._number_of_points
+
+    def get_view(self, index: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns the points of one kept view, as views of the stored arrays.
+
+        :return: ids, object_points, image_points as N, Nx3, Nx2 ndarrays
+        """
+        if not 0 <= index < self._number_of_views:
+            raise IndexError(f"No view {index}")
+        start, end = self._view_starts[index:index + 2]
+        return self._ids[start:end], \
+            self._object_points[start:end], \
+            self._image_points[start:end]
+
+    def get_coverage(self) -> float:
+        """
+        Returns the mean of the fractions of image cells, and tilt bins,
+        covered by the kept views, in [0, 1].
+        """
+        return 0.5 * (np.mean(self._covered_cells)
+                      + np.mean(self._covered_tilts))
+
+    def _get_view_cells(self, image_points):
+        """
+        Returns the image cells containing any of image_points.
+        """
+        cells = np.zeros_like(self._covered_cells)
+        column = np.clip((image_points[:, 0] * self.coverage_grid[0]
+                          / self.image_size[0]).astype(int),
+                         0, self.coverage_grid[0] - 1)
+        row = np.clip((image_points[:, 1] * self.coverage_grid[1]
+                       / self.image_size[1]).astype(int),
+                      0, self.coverage_grid[1] - 1)
+        cells[row, column] = True
+        return cells
+
+    def _get_homography(self, object_points, image_points):
+        """
+        Returns the homography from the board plane to normalised image
+        coordinates, or None if the board is not planar, in z = constant.
+        """
+        if np.ptp(object_points[:, 2]) > 1e-6 * max(np.ptp(object_points),
+                                                     1.0):
+            return None
+        normalised = image_points.astype(np.float64) \
+            * self._normalisation[0, 0] + self._normalisation[0:2, 2]
+        homography, _ = cv2.findHomography(
+            object_points[:, 0:2].astype(np.float64), normalised)
+        if homography is None or homography[2, 2] == 0:
+            return None
+        return homography / homography[2, 2]
+
+    def _get_descriptor(self, image_points, homography):
+        """
+        Returns the pose descriptor of a view: normalised centroid, size,
+        and perspective terms, divided by the length of the board's x axis
+        in the image, so they measure tilt independently of board units.
+        """
+        normalised = image_points * self._normalisation[0, 0] \
+            + self._normalisation[0:2, 2]
+        centroid = np.mean(normalised, axis=0)
+        size = np.sqrt(np.prod(np.ptp(normalised, axis=0)))
+        tilt = np.zeros(2)
+        if homography is not None:
+            axis_length = np.linalg.norm(homography[0:2, 0])
+            if axis_length > 0:
+                tilt = homography[2, 0:2] / axis_length * size
+        return np.array([centroid[0], centroid[1], size, tilt[0], tilt[1]])
+
+    def _grow(self, number_of_points):
+        """
+        Doubles the capacity of the point arrays, until they can hold
+        number_of_points more points.
+        """
+        required = self._number_of_points + number_of_points
+        capacity = self._ids.shape[0]
+        if required <= capacity:
+            return
+        while capacity < required:
+            capacity *= 2
+        for name in ['_ids', '_object_points', '_image_points']:
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self._number_of_points] = old[:self._number_of_points]
+            setattr(self, name, new)
+
+    def add(self, result: PointDetectionResult) -> bool:
+        """
+        Adds one view, if it has enough points, and adds to the diversity
+        of the kept views.
+
+        :param result: PointDetectionResult, e.g. from
+            PointDetector.get_result()
+        :return: True if the view was kept
+        """
+        number_of_points = len(result)
+        if number_of_points < self.minimum_number_of_points:
+            return False
+        if self._number_of_views >= self.maximum_number_of_views:
+            return False
+
+        object_points = result.object_points
+        image_points = result.image_points
+        homography = self._get_homography(object_points, image_points)
+        descriptor = self._get_descriptor(image_points, homography)
+        cells = self._get_view_cells(image_points)
+        tilt_bin = np.clip(((descriptor[3:5] + MAX_TILT) * TILT_BINS
+                            / (2 * MAX_TILT)).astype(int), 0, TILT_BINS - 1)
+
+        covers_new = np.any(cells & ~self._covered_cells) \
+            or not self._covered_tilts[tilt_bin[1], tilt_bin[0]]
+        if not covers_new and self._number_of_views > 0:
+            distances = np.linalg.norm(
+                self._descriptors[:self._number_of_views] - descriptor,
+                axis=1)
+            if np.min(distances) < self.minimum_pose_distance:
+                return False
+
+        self._grow(number_of_points)
+        start = self._number_of_points
+        end = start + number_of_points
+        self._ids[start:end] = result.ids
+        self._object_points[start:end] = object_points
+        self._image_points[start:end] = image_points
+        self._number_of_points = end
+        self._descriptors[self._number_of_views] = descriptor
+        self._number_of_views += 1
+        self._view_starts[self._number_of_views] = end
+        self._covered_cells |= cells
+        self._covered_tilts[tilt_bin[1], tilt_bin[0]] = True
+
+        if homography is not None:
+            constraints = _get_zhang_constraints(homography)
+            self._normal_matrix += np.matmul(constraints.T, constraints)
+            self._number_of_constraints += 2
+        return True
+
+    def add_points(self,
+                   ids: np.ndarray,
+                   object_points: np.ndarray,
+                   image_points: np.ndarray) -> bool:
+        """
+        As add(), for the output of PointDetector.get_points().
+        """
+        return self.add(PointDetectionResult(ids, object_points, image_points))
+
+    def get_rolling_intrinsics(self) -> np.ndarray:
+        """
+        Returns the camera matrix, estimated from the homographies of all
+        kept views, ignoring distortion. Cheap enough to call every frame.
+
+        :return: 3x3 camera matrix, or None if not enough views yet
+        """
+        if self._number_of_constraints < 6:
+            return None
+        _, eigen_vectors = np.linalg.eigh(self._normal_matrix)
+        normalised_intrinsics = _get_intrinsics_from_b(eigen_vectors[:, 0])
+        if normalised_intrinsics is None:
+            return None
+        return np.matmul(np.linalg.inv(self._normalisation),
+                         normalised_intrinsics)
+
+    def get_calibration_inputs(self):
+        """
+        Returns lists of object points and image points, one per kept view,
+        as views of the stored arrays, for cv2.calibrateCamera.
+
+        :return: list of Nx3 object points, list of Nx2 image points
+        """
+        object_points = []
+        image_points = []
+        for index in range(self._number_of_views):
+            _, view_object_points, view_image_points = self.get_view(index)
+            object_points.append(view_object_points)
+            image_points.append(view_image_points)
+        return object_points, image_points
+
+    def needs_recalibration(self) -> bool:
+        """
+        Returns True if coverage has increased by recalibration_threshold
+        since the last calibration, or there has been none yet.
+        """
+        if self._number_of_views == 0:
+            return False
+        if self._calibration is None:
+            return True
+        return self.get_coverage() - self._coverage_at_calibration \
+            >= self.recalibration_threshold
+
+    def calibrate(self, force: bool=False):
+        """
+        Runs cv2.calibrateCamera on all kept views, if needs_recalibration(),
+        or force is True, otherwise returns the previous calibration.
+
+        :param force: if True, always recalibrates
+        :return: rms, camera_matrix, distortion_coefficients, or None if
+            there are no views
+        """
+        if self._number_of_views == 0:
+            return None
+        if not force and not self.needs_recalibration():
+            return self._calibration
+
+        object_points, image_points = self.get_calibration_inputs()
+        rms, camera_matrix, distortion_coefficients, _, _ = \
+            cv2.calibrateCamera(object_points,
+                                image_points,
+                                self.image_size,
+                                None,
+                                None,
+                                flags=self.calibration_flags)
+        self._calibration = rms, camera_matrix, distortion_coefficients
+        self._coverage_at_calibration = self.get_coverage()
+        LOGGER.info("Calibrated with %s views, rms=%s.",
+                    self._number_of_views, rms)
+        return self._calibration
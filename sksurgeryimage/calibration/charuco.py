@@ -29,6 +29,30 @@ def make_charuco_board(dictionary,
     :param legacy_pattern: if True, uses the original OpenCV pattern (pre-OpenCV 4.6.0).
     :return: image, board
     """
+    board = make_charuco_board_definition(dictionary,
+                                          number_of_squares,
+                                          size,
+                                          legacy_pattern=legacy_pattern,
+                                          start_id=start_id)
+    image = board.generateImage(image_size, marginSize=0, borderBits=1)
+    return image, board
+
+
+def make_charuco_board_definition(dictionary,
+                                  number_of_squares,
+                                  size,
+                                  legacy_pattern: bool=True,
+                                  start_id: int=0):
+    """
+    Creates the ChArUco board definition, without rendering an image.
+
+    :param dictionary: aruco dictionary definition
+    :param number_of_squares: tuple of (number in x, number in y)
+    :param size: tuple of (size of chessboard square, size of internal tag), mm.
+    :param legacy_pattern: if True, uses the original OpenCV pattern (pre-OpenCV 4.6.0).
+    :param start_id: id of first marker
+    :return: board
+    """
     number_in_x, number_in_y = number_of_squares
     size_of_square, size_of_tag = size
     finish_id = start_id + np.ceil(((number_in_x * number_in_y) / 2.0)).astype(int)
@@ -40,8 +64,63 @@ def make_charuco_board(dictionary,
                                    ids=ids
                                    )
     board.setLegacyPattern(legacy_pattern)
-    image = board.generateImage(image_size, marginSize=0, borderBits=1)
-    return image, board
+    return board
+
+
+def create_detector_parameters():
+    """
+    Returns the default aruco DetectorParameters used in this package.
+
+    :return: cv2.aruco.DetectorParameters
+    """
+    parameters = cv2.aruco.DetectorParameters()
+    parameters.maxErroneousBitsInBorderRate = 0.1
+    parameters.perspectiveRemovePixelPerCell = 30
+    parameters.perspectiveRemoveIgnoredMarginPerCell = 0.3
+    return parameters
+
+
+def create_charuco_detector(board,
+                            camera_matrix=None,
+                            distortion_coefficients=None,
+                            parameters: cv2.aruco.DetectorParameters=None):
+    """
+    Creates an OpenCV ChArUco detector, to be created once, and then
+    used for many images via detect_charuco_points_with_detector(),
+    so that no set up is repeated per image.
+
+    :param board: aruco board definition, which includes the dictionary
+    :param camera_matrix: if specified, the 3x3 camera intrinsic matrix
+    :param distortion_coefficients: if specified, the distortion coefficients
+    :param parameters: aruco DetectorParameters, if None, uses
+        create_detector_parameters()
+    :return: cv2.aruco.CharucoDetector
+    """
+    if parameters is None:
+        parameters = create_detector_parameters()
+    charuco_parameters = cv2.aruco.CharucoParameters()
+    if camera_matrix is not None:
+        charuco_parameters.cameraMatrix = camera_matrix
+    if distortion_coefficients is not None:
+        charuco_parameters.distCoeffs = distortion_coefficients
+    return cv2.aruco.CharucoDetector(board, charuco_parameters, parameters)
+
+
+def detect_charuco_points_with_detector(detector, image):
+    """
+    Extracts ChArUco points, using a detector from create_charuco_detector().
+    Returns the same as detect_charuco_points().
+
+    :param detector: cv2.aruco.CharucoDetector
+    :param image: grey scale image in which to search
+    :return: marker_corners, marker_ids, chessboard_corners, chessboard_ids
+    """
+    chessboard_corners, chessboard_ids, marker_corners, marker_ids = \
+        detector.detectBoard(image)
+    return marker_corners,\
+        marker_ids,\
+        chessboard_corners,\
+        chessboard_ids
 
 
 def detect_charuco_points(dictionary: cv2.aruco.Dictionary,
@@ -52,7 +131,9 @@ def detect_charuco_points(dictionary: cv2.aruco.Dictionary,
                           parameters: cv2.aruco.DetectorParameters=None):
     """
     Extracts ChArUco points. If you can provide camera matrices,
-    it may be more accurate.
+    it may be more accurate. For a stream of images, it is quicker to
+    use create_charuco_detector() once, then
+    detect_charuco_points_with_detector() per image.
 
     :param dictionary: aruco dictionary definition
     :param board: aruco board definition
@@ -62,10 +143,7 @@ def detect_charuco_points(dictionary: cv2.aruco.Dictionary,
     :return: marker_corners, marker_ids, chessboard_corners, chessboard_ids
     """
     if parameters is None:
-        parameters = cv2.aruco.DetectorParameters()
-        parameters.maxErroneousBitsInBorderRate = 0.1
-        parameters.perspectiveRemovePixelPerCell = 30
-        parameters.perspectiveRemoveIgnoredMarginPerCell = 0.3
+        parameters = create_detector_parameters()
 
     # pylint: disable=unpacking-non-sequence
     marker_corners, marker_ids, _ =\
@@ -6,19 +6,131 @@ ChArUco + Chessboard implementation of PointDetector.
 
 # pylint: disable=too-many-instance-attributes
 
+import collections
 import copy
+import concurrent.futures
+import hashlib
 import logging
+import os
+import pickle
 from typing import Tuple
 import numpy as np
 import cv2
 import sksurgerycore.algorithms.procrustes as proc
+import sksurgeryimage
 import sksurgeryimage.calibration.point_detector as pd
+import sksurgeryimage.calibration.point_detector_utils as pdu
 import sksurgeryimage.calibration.charuco as ch
 import sksurgeryimage.calibration.charuco_point_detector as cpd
 import sksurgeryimage.calibration.chessboard_point_detector as cbpd
+import sksurgeryimage.utilities.instrumentation as si
 
 LOGGER = logging.getLogger(__name__)
 
+# Model points and registration, keyed by _get_cache_key(),
+# least recently used first.
+_MODEL_CACHE = collections.OrderedDict()
+
+#: Maximum number of boards whose model points are cached in memory.
+MODEL_CACHE_SIZE = 16
+
+#: Increment when the cached model points or their file format change,
+#: so older cache files are not used.
+MODEL_CACHE_FORMAT_VERSION = 1
+
+# Margin added round the predicted chessboard region, as a fraction of its
+# size, to allow for lens distortion and motion between frames.
+CHESSBOARD_ROI_MARGIN = 0.25
+
+
+def _get_cache_key(board_config: dict) -> str:
+    """
+    Returns a hash of everything that affects the model points and
+    registration, for use as a cache key, and file name. This includes
+    the versions of OpenCV and this package, as detection may change
+    between versions.
+    """
+    items = [('cache_format_version', MODEL_CACHE_FORMAT_VERSION),
+             ('opencv_version', cv2.__version__),
+             ('sksurgeryimage_version', sksurgeryimage.__version__)]
+    for name in sorted(board_config):
+        value = board_config[name]
+        if isinstance(value, dict):
+            value = sorted(value.items())
+        items.append((name, value))
+    return hashlib.sha1(pickle.dumps(items, protocol=4)).hexdigest()
+
+
+def _get_cache_file_name(cache_key, cache_directory):
+    """
+    Returns the file name for a given cache key.
+    """
+    return os.path.join(cache_directory,
+                        f"charuco_plus_chessboard_{cache_key}.npz")
+
+
+def _add_to_model_cache(cache_key, cached):
+    """
+    Adds cached to the in memory cache, as the most recently used,
+    removing the least recently used entries, beyond MODEL_CACHE_SIZE.
+    """
+    _MODEL_CACHE[cache_key] = cached
+    _MODEL_CACHE.move_to_end(cache_key)
+    while len(_MODEL_CACHE) > MODEL_CACHE_SIZE:
+        _MODEL_CACHE.popitem(last=False)
+
+
+def _read_model_cache(cache_key, cache_directory):
+    """
+    Returns cached (model_points, rotation_matrix, translation_vector),
+    from memory, or from cache_directory, or None if not cached.
+    """
+    if cache_key not in _MODEL_CACHE and cache_directory is not None:
+        file_name = _get_cache_file_name(cache_key, cache_directory)
+        if os.path.isfile(file_name):
+            with np.load(file_name, allow_pickle=False) as cached:
+                ids = np.asarray(cached['ids'], dtype=np.int64)
+                model_points = {int(idx): point for idx, point
+                                in zip(ids, cached['points'])}
+                _add_to_model_cache(cache_key,
+                                    (model_points,
+                                     cached['rotation_matrix'],
+                                     cached['translation_vector']))
+            LOGGER.debug("Loaded model points from %s", file_name)
+    if cache_key not in _MODEL_CACHE:
+        return None
+    _MODEL_CACHE.move_to_end(cache_key)
+    return copy.deepcopy(_MODEL_CACHE[cache_key])
+
+
+def _write_model_cache(cache_key,
+                       cache_directory,
+                       model_points,
+                       rotation_matrix,
+                       translation_vector):
+    """
+    Saves model_points and the registration, in memory,
+    and to cache_directory, if not None and not already saved.
+    """
+    _add_to_model_cache(cache_key, copy.deepcopy((model_points,
+                                                  rotation_matrix,
+                                                  translation_vector)))
+    if cache_directory is None:
+        return
+    file_name = _get_cache_file_name(cache_key, cache_directory)
+    if os.path.isfile(file_name):
+        return
+    os.makedirs(cache_directory, exist_ok=True)
+    # Write then rename, so other processes never read a partial file.
+    temporary_file_name = f"{file_name}.{os.getpid()}.tmp"
+    with open(temporary_file_name, 'wb') as file:
+        np.savez(file,
+                 ids=np.array(list(model_points.keys()), dtype=np.int64),
+                 points=np.array(list(model_points.values())),
+                 rotation_matrix=rotation_matrix,
+                 translation_vector=translation_vector)
+    os.replace(temporary_file_name, file_name)
+
 
 class CharucoPlusChessboardPointDetector(pd.PointDetector):
     """
@@ -26,6 +138,7 @@ class CharucoPlusChessboardPointDetector(pd.PointDetector):
     in a 2D grey scale video image.
     """
     # pylint: disable=too-many-arguments, too-many-locals, too-many-statements
+    # pylint: disable=too-many-branches
     def __init__(self,
                  dictionary: cv2.aruco.Dictionary,
                  number_of_charuco_squares=(19, 26),
@@ -49,7 +162,14 @@ class CharucoPlusChessboardPointDetector(pd.PointDetector):
                  optimisation_criteria: Tuple[int, int, float] = (cv2.TERM_CRITERIA_EPS
                                                                   + cv2.TERM_CRITERIA_MAX_ITER,
                                                                   30,
-                                                                  0.001)
+                                                                  0.001),
+                 model_points=None,
+                 charuco_model_points=None,
+                 rotation_matrix=None,
+                 translation_vector=None,
+                 cache_directory=None,
+                 parallel=False,
+                 restrict_chessboard_search=False
                  ):
         """
         Constructs a CharucoPlusChessboardPointDetector.
@@ -73,8 +193,40 @@ class CharucoPlusChessboardPointDetector(pd.PointDetector):
         :param legacy_pattern: if True, uses OpenCV pre-4.6 ChArUco pattern
         :param parameters: OpenCV aruco DetectorParameters,
                if None, will create reasonable defaults.
+        :param model_points: dictionary of {id : 3D point} for the combined
+               board, as returned by get_config(). If None, computed by
+               detecting the reference image.
+        :param charuco_model_points: model points of the ChArUco detector,
+               as returned by get_config().
+        :param rotation_matrix: [3x3] chessboard to ChArUco rotation, as
+               returned by get_config(). If None, computed by registration.
+        :param translation_vector: [3x1] chessboard to ChArUco translation.
+        :param cache_directory: if not None, directory in which to save and
+               re-load the model points and registration, as computing them
+               requires detecting the reference image, which is slow.
+               They are always cached in memory, for the current process,
+               for up to MODEL_CACHE_SIZE boards.
+        :param parallel: if True, the chessboard is detected on a separate
+               thread, created on first use, and shut down by close(),
+               while ChArUco is detected on the calling thread. OpenCV
+               releases the GIL, so the time per frame is that of the
+               slower one.
+        :param restrict_chessboard_search: if True, the chessboard is only
+               searched for in the region predicted by the ChArUco corners
+               and the chessboard registration, see
+               _predict_chessboard_roi(). When running in parallel, the
+               prediction comes from the previous frame, and, if the
+               chessboard is not found there, the search is repeated in the
+               region predicted from the current frame. If the chessboard is
+               not found in the predicted regions, the whole image is searched.
         """
         super().__init__(scale=scale)
+        self.dictionary = dictionary
+        self.start_id = start_id
+        self.legacy_pattern = legacy_pattern
+        self.parameters = parameters
+        self.chessboard_flags = chessboard_flags
+        self.optimisation_criteria = optimisation_criteria
         self.number_of_charuco_squares = number_of_charuco_squares
         self.size_of_charuco_squares = size_of_charuco_squares
         self.minimum_number_of_points = minimum_number_of_points
@@ -83,6 +235,14 @@ class CharucoPlusChessboardPointDetector(pd.PointDetector):
         self.chessboard_id_offset = chessboard_id_offset
         self.error_if_no_chessboard = error_if_no_chessboard
         self.error_if_no_charuco = error_if_no_charuco
+        # Set after detecting the model points, which runs serially,
+        # so the thread is only created when get_points() is first called.
+        self.parallel = False
+        self.restrict_chessboard_search = restrict_chessboard_search
+        # Created on first use, see _get_executor().
+        self._executor = None
+        self._predicted_chessboard_roi = None
+        self._predicted_chessboard_image_shape = None
 
         if use_chessboard_inset and not self.number_of_chessboard_squares:
             raise ValueError(
@@ -108,7 +268,8 @@ class CharucoPlusChessboardPointDetector(pd.PointDetector):
                                      camera_matrix=camera_matrix,
                                      distortion_coefficients=distortion_coeff,
                                      legacy_pattern=legacy_pattern,
-                                     parameters=parameters
+                                     parameters=parameters,
+                                     model_points=charuco_model_points
                                      )
 
         self.chessboard_point_detector = None
@@ -124,80 +285,326 @@ class CharucoPlusChessboardPointDetector(pd.PointDetector):
                     optimisation_criteria=optimisation_criteria
                     )
 
-        self.reference_image = ch.make_charuco_with_chessboard(
-            dictionary=dictionary,
-            charuco_squares=number_of_charuco_squares,
-            charuco_size=size_of_charuco_squares,
-            chessboard_squares=number_of_chessboard_squares,
-            chessboard_size=chessboard_square_size,
-            legacy_pattern=legacy_pattern,
-            start_id=start_id,
-            pixels_per_millimetre=(size_of_charuco_squares[0]
-                                   * size_of_charuco_squares[1])
-        )
+        # Rendered on demand, see get_reference_image().
+        self.reference_image = None
+
+        cache_key = None
+        if model_points is None \
+                or rotation_matrix is None or translation_vector is None:
+            cache_key = _get_cache_key(self._get_board_config())
+            cached = _read_model_cache(cache_key, cache_directory)
+            if cached is not None:
+                if model_points is None:
+                    model_points = cached[0]
+                if rotation_matrix is None or translation_vector is None:
+                    rotation_matrix, translation_vector = cached[1:]
 
         # Need to map between chessboard coordinates and
         # ChArUco coordinates and keep them consistent.
         self.rotation_matrix = np.eye(3)
         self.translation_vector = np.zeros((3, 1))
         if use_chessboard_inset:
-            _, chess_object_points, chess_image_points \
-                = self.chessboard_point_detector.get_points(self.reference_image)
-
-            # Pick 3 points, the origin, the furthest in x-axis,
-            # furthest in y-axis, in chessboard coords.
-            fixed_points = np.zeros((3,3))
-            fixed_points[0][0] = chess_object_points[0][0]
-            fixed_points[0][1] = chess_object_points[0][1]
-            x_offset = number_of_chessboard_squares[0] - 2
-            fixed_points[1][0] = chess_object_points[x_offset][0]
-            fixed_points[1][1] = chess_object_points[x_offset][1]
-            y_offset = ((number_of_chessboard_squares[0] - 1)
-                        * (number_of_chessboard_squares[1] - 2))
-            fixed_points[2][0] = chess_object_points[y_offset][0]
-            fixed_points[2][1] = chess_object_points[y_offset][1]
-
-            # Now we need the SAME points in ChArUco coords.
-            _, charuco_object_points, charuco_image_points = (
-                self.charuco_point_detector.get_points(self.reference_image))
-            moving_points = np.zeros((3,3))
-            charuco_origin_img = charuco_image_points[0]
-            charuco_opposite_img = charuco_image_points[-1]
-            charuco_origin_obj = charuco_object_points[0]
-            charuco_opposite_obj = charuco_object_points[-1]
-
-            charuco_pix_per_mm_x = ((charuco_origin_img[0] - charuco_opposite_img[0])
-                                    / (charuco_origin_obj[0] - charuco_opposite_obj[0]))
-            charuco_pix_per_mm_y = ((charuco_origin_img[1] - charuco_opposite_img[1])
-                                    / (charuco_origin_obj[1] - charuco_opposite_obj[1]))
-
-            moving_points[0][0] = ((chess_image_points[0][0] - charuco_origin_img[0])
-                                   / charuco_pix_per_mm_x + charuco_origin_obj[0])
-            moving_points[0][1] = ((chess_image_points[0][1] - charuco_origin_img[1])
-                                   / charuco_pix_per_mm_y + charuco_origin_obj[1])
-            moving_points[1][0] = ((chess_image_points[x_offset][0] - charuco_origin_img[0])
-                                   / charuco_pix_per_mm_x + charuco_origin_obj[0])
-            moving_points[1][1] = ((chess_image_points[x_offset][1] - charuco_origin_img[1])
-                                   / charuco_pix_per_mm_y + charuco_origin_obj[1])
-            moving_points[2][0] = ((chess_image_points[y_offset][0] - charuco_origin_img[0])
-                                   / charuco_pix_per_mm_x + charuco_origin_obj[0])
-            moving_points[2][1] = ((chess_image_points[y_offset][1] - charuco_origin_img[1])
-                                   / charuco_pix_per_mm_y + charuco_origin_obj[1])
-
-            # Do point-based rigid registration
-            self.rotation_matrix, self.translation_vector, fre \
-                = proc.orthogonal_procrustes(fixed=fixed_points, moving=moving_points)
-            if fre > 0.01:
-                raise ValueError(f"High fiducial registration error when "
-                                 f"registering chessboard to ChArUco: {fre:.2f}mm")
-
-        # Run this detector on the reference image, to get a model of ALL the available points.
-        ids, object_points, _ = self.get_points(self.reference_image)
+            if rotation_matrix is None or translation_vector is None:
+                rotation_matrix, translation_vector = self._register_chessboard()
+            self.rotation_matrix = np.asarray(rotation_matrix)
+            self.translation_vector = np.asarray(translation_vector)
+
+        self._merged_object_points = self._create_merged_model()
+
+        if model_points is None:
+            model_points = self._detect_model_points()
+        self.model_points = model_points
+
+        if cache_key is not None:
+            _write_model_cache(cache_key,
+                               cache_directory,
+                               self.model_points,
+                               self.rotation_matrix,
+                               self.translation_vector)
+
+        self.parallel = parallel
+
+        # Don't predict the first frame from the reference image.
+        self._predicted_chessboard_roi = None
+        self._predicted_chessboard_image_shape = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def close(self):
+        """
+        Shuts down the thread used when parallel is True. It is
+        created again if get_points() is called afterwards.
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _get_executor(self):
+        """
+        Returns the single thread pool used when parallel is True,
+        creating it if necessary, e.g. after unpickling.
+        """
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=1,
+                thread_name_prefix='CharucoPlusChessboardPointDetector')
+        return self._executor
+
+    def _register_chessboard(self):
+        """
+        Registers chessboard coordinates to ChArUco coordinates,
+        using the reference image.
+
+        :return: rotation_matrix, translation_vector
+        """
+        number_of_chessboard_squares = self.number_of_chessboard_squares
+        reference_image = self.get_reference_image()
+        _, chess_object_points, chess_image_points \
+            = self.chessboard_point_detector.get_points(reference_image)
+
+        # Pick 3 points, the origin, the furthest in x-axis,
+        # furthest in y-axis, in chessboard coords.
+        fixed_points = np.zeros((3,3))
+        fixed_points[0][0] = chess_object_points[0][0]
+        fixed_points[0][1] = chess_object_points[0][1]
+        x_offset = number_of_chessboard_squares[0] - 2
+        fixed_points[1][0] = chess_object_points[x_offset][0]
+        fixed_points[1][1] = chess_object_points[x_offset][1]
+        y_offset = ((number_of_chessboard_squares[0] - 1)
+                    * (number_of_chessboard_squares[1] - 2))
+        fixed_points[2][0] = chess_object_points[y_offset][0]
+        fixed_points[2][1] = chess_object_points[y_offset][1]
+
+        # Now we need the SAME points in ChArUco coords.
+        _, charuco_object_points, charuco_image_points = (
+            self.charuco_point_detector.get_points(reference_image))
+        moving_points = np.zeros((3,3))
+        charuco_origin_img = charuco_image_points[0]
+        charuco_opposite_img = charuco_image_points[-1]
+        charuco_origin_obj = charuco_object_points[0]
+        charuco_opposite_obj = charuco_object_points[-1]
+
+        charuco_pix_per_mm_x = ((charuco_origin_img[0] - charuco_opposite_img[0])
+                                / (charuco_origin_obj[0] - charuco_opposite_obj[0]))
+        charuco_pix_per_mm_y = ((charuco_origin_img[1] - charuco_opposite_img[1])
+                                / (charuco_origin_obj[1] - charuco_opposite_obj[1]))
+
+        moving_points[0][0] = ((chess_image_points[0][0] - charuco_origin_img[0])
+                               / charuco_pix_per_mm_x + charuco_origin_obj[0])
+        moving_points[0][1] = ((chess_image_points[0][1] - charuco_origin_img[1])
+                               / charuco_pix_per_mm_y + charuco_origin_obj[1])
+        moving_points[1][0] = ((chess_image_points[x_offset][0] - charuco_origin_img[0])
+                               / charuco_pix_per_mm_x + charuco_origin_obj[0])
+        moving_points[1][1] = ((chess_image_points[x_offset][1] - charuco_origin_img[1])
+                               / charuco_pix_per_mm_y + charuco_origin_obj[1])
+        moving_points[2][0] = ((chess_image_points[y_offset][0] - charuco_origin_img[0])
+                               / charuco_pix_per_mm_x + charuco_origin_obj[0])
+        moving_points[2][1] = ((chess_image_points[y_offset][1] - charuco_origin_img[1])
+                               / charuco_pix_per_mm_y + charuco_origin_obj[1])
+
+        # Do point-based rigid registration
+        rotation_matrix, translation_vector, fre \
+            = proc.orthogonal_procrustes(fixed=fixed_points, moving=moving_points)
+        if fre > 0.01:
+            raise ValueError(f"High fiducial registration error when "
+                             f"registering chessboard to ChArUco: {fre:.2f}mm")
+        return rotation_matrix, translation_vector
+
+    def _create_merged_model(self):
+        """
+        Precomputes one dense, id-indexed table of object points, for the
+        ChArUco corners, and the chessboard corners, mapped into ChArUco
+        coordinates, with ids offset by chessboard_id_offset, so
+        merging detections needs no per-frame transformation.
+
+        :return: dense_points, see pdu.create_dense_model()
+        """
+        merged_model = dict(self.charuco_point_detector.model_points)
+        if self.chessboard_point_detector:
+            chess_object_points = np.transpose(
+                np.matmul(self.rotation_matrix,
+                          np.transpose(
+                              self.chessboard_point_detector.object_points))
+                + self.translation_vector
+            )
+            chess_ids = self.chessboard_point_detector.ids[:, 0].astype(int) \
+                + self.chessboard_id_offset
+            merged_model.update(zip(chess_ids, chess_object_points))
+        _, dense_points = pdu.create_dense_model(merged_model)
+        return dense_points
+
+    def _merge_points(self,
+                      charuco_ids,
+                      charuco_image_points,
+                      chess_ids,
+                      chess_image_points):
+        """
+        Merges ChArUco and chessboard detections into single arrays,
+        each allocated once, with object points looked up in the
+        table from _create_merged_model().
+
+        :return: ids, object_points, image_points as Nx[1,3,2] ndarrays
+        """
+        number_of_charuco_points = charuco_ids.shape[0]
+        number_of_points = number_of_charuco_points + chess_ids.shape[0]
+
+        ids = np.empty((number_of_points, 1), dtype=np.int32)
+        ids[:number_of_charuco_points] = charuco_ids.reshape(-1, 1)
+        ids[number_of_charuco_points:] = chess_ids.reshape(-1, 1)
+        ids[number_of_charuco_points:] += self.chessboard_id_offset
+
+        image_points = np.empty((number_of_points, 2))
+        image_points[:number_of_charuco_points] = \
+            charuco_image_points.reshape(-1, 2)
+        image_points[number_of_charuco_points:] = \
+            chess_image_points.reshape(-1, 2)
+
+        object_points = np.take(self._merged_object_points, ids[:, 0], axis=0)
+        return ids, object_points, image_points
+
+    def _detect_model_points(self):
+        """
+        Runs this detector on the reference image,
+        to get a model of ALL the available points.
+
+        :return: dictionary of {id : 3D point}
+        """
+        ids, object_points, _ = self.get_points(self.get_reference_image())
         model_points = {}
         for i in range(0, ids.shape[0]):
-            idx = ids[i][0]
+            idx = int(ids[i][0])
             model_points[idx] = object_points[i][0]
-        self.model_points = model_points
+        return model_points
+
+    def _get_board_config(self) -> dict:
+        """
+        Returns the constructor arguments, excluding anything
+        precomputed from the reference image.
+        """
+        charuco_detector = self.charuco_point_detector
+        return {'dictionary': pdu.aruco_dictionary_to_config(self.dictionary),
+                'number_of_charuco_squares':
+                    tuple(self.number_of_charuco_squares),
+                'size_of_charuco_squares': tuple(self.size_of_charuco_squares),
+                'scale': tuple(self.scale),
+                'start_id': self.start_id,
+                'camera_matrix': copy.deepcopy(charuco_detector.camera_matrix),
+                'distortion_coeff':
+                    copy.deepcopy(charuco_detector.distortion_coefficients),
+                'use_chessboard_inset':
+                    self.chessboard_point_detector is not None,
+                'number_of_chessboard_squares':
+                    self.number_of_chessboard_squares,
+                'chessboard_square_size': self.chessboard_square_size,
+                'chessboard_id_offset': self.chessboard_id_offset,
+                'minimum_number_of_points': self.minimum_number_of_points,
+                'error_if_no_chessboard': self.error_if_no_chessboard,
+                'error_if_no_charuco': self.error_if_no_charuco,
+                'legacy_pattern': self.legacy_pattern,
+                'parameters': pdu.opencv_parameters_to_config(self.parameters),
+                'chessboard_flags': self.chessboard_flags,
+                'optimisation_criteria': tuple(self.optimisation_criteria)}
+
+    def get_config(self) -> dict:
+        """
+        Returns the constructor arguments, including the model points and
+        chessboard registration, so from_config() does not need to detect
+        the reference image. See PointDetector.get_config().
+        """
+        config = self._get_board_config()
+        config['model_points'] = copy.deepcopy(self.model_points)
+        config['charuco_model_points'] = \
+            copy.deepcopy(self.charuco_point_detector.model_points)
+        config['rotation_matrix'] = self.rotation_matrix.copy()
+        config['translation_vector'] = self.translation_vector.copy()
+        config['parallel'] = self.parallel
+        config['restrict_chessboard_search'] = self.restrict_chessboard_search
+        return config
+
+    @classmethod
+    def from_config(cls, config: dict):
+        """
+        Creates a detector from the output of get_config().
+        """
+        return cls(**pdu.aruco_objects_from_config(config))
+
+    def _predict_chessboard_roi(self,
+                                image_shape,
+                                charuco_object_points,
+                                charuco_image_points):
+        """
+        Predicts the region of the image containing the chessboard, by
+        mapping the chessboard outline into ChArUco coordinates, with the
+        chessboard registration, and then into the image, with the
+        homography fitted to the detected ChArUco corners.
+
+        :param image_shape: shape of the image searched
+        :param charuco_object_points: Nx3 detected ChArUco model points
+        :param charuco_image_points: Nx2 detected ChArUco image points
+        :return: (min_x, min_y, max_x, max_y), or None if not predictable
+        """
+        if charuco_object_points.shape[0] < 4:
+            return None
+        homography, _ = cv2.findHomography(
+            charuco_object_points[:, 0:2].astype(np.float64),
+            charuco_image_points.astype(np.float64))
+        if homography is None:
+            return None
+
+        # Outer corners of the chessboard squares, in chessboard coordinates.
+        square_size = self.chessboard_square_size
+        lower = -square_size
+        upper_x = (self.number_of_chessboard_squares[0] - 1) * square_size
+        upper_y = (self.number_of_chessboard_squares[1] - 1) * square_size
+        outline = np.array([[lower, lower, 0],
+                            [upper_x, lower, 0],
+                            [upper_x, upper_y, 0],
+                            [lower, upper_y, 0]], dtype=np.float64)
+        outline = np.transpose(np.matmul(self.rotation_matrix,
+                                         np.transpose(outline))
+                               + self.translation_vector)
+        projected = cv2.perspectiveTransform(
+            outline[:, 0:2].reshape(-1, 1, 2), homography).reshape(-1, 2)
+        if not np.all(np.isfinite(projected)):
+            return None
+
+        lower_corner = np.min(projected, axis=0)
+        upper_corner = np.max(projected, axis=0)
+        margin = np.maximum((upper_corner - lower_corner)
+                            * CHESSBOARD_ROI_MARGIN,
+                            pd.TRACKING_MIN_MARGIN)
+        height, width = image_shape[0:2]
+        min_x, min_y = np.maximum(np.floor(lower_corner - margin),
+                                  0).astype(int)
+        max_x, max_y = np.minimum(np.ceil(upper_corner + margin) + 1,
+                                  (width, height)).astype(int)
+        if min_x >= max_x or min_y >= max_y:
+            return None
+        return int(min_x), int(min_y), int(max_x), int(max_y)
+
+    def _get_chessboard_points(self, image, roi):
+        """
+        Detects the chessboard, within roi, if not None.
+
+        :param image: numpy 2D grey scale image.
+        :param roi: (min_x, min_y, max_x, max_y), or None to search it all
+        :return: ids, object_points, image_points as Nx[1,3,2] ndarrays,
+            image points in the coordinates of image
+        """
+        if roi is None:
+            return self.chessboard_point_detector.get_points(image)
+        min_x, min_y, max_x, max_y = roi
+        ids, object_points, image_points = \
+            self.chessboard_point_detector.get_points(
+                image[min_y:max_y, min_x:max_x])
+        if ids.shape[0] > 0:
+            image_points = image_points + [min_x, min_y]
+        return ids, object_points, image_points
 
     def _internal_get_points(self, image, is_distorted=True):
         """
@@ -207,21 +614,57 @@ class CharucoPlusChessboardPointDetector(pd.PointDetector):
         :param image: numpy 2D grey scale image.
         :return: ids, object_points, image_points as Nx[1,3,2] ndarrays
         """
+        searched_roi = None
+        if self.restrict_chessboard_search and self.parallel \
+                and self._predicted_chessboard_image_shape == image.shape:
+            searched_roi = self._predicted_chessboard_roi
+
+        chess_future = None
+        if self.chessboard_point_detector and self.parallel:
+            chess_future = self._get_executor().submit(
+                self._get_chessboard_points, image, searched_roi)
+        # ChArUco runs on this thread, while the chessboard is detected.
         charuco_ids, charuco_object_points, charuco_image_points = \
             self.charuco_point_detector.get_points(image)
 
         if self.error_if_no_charuco and charuco_ids.shape[0] == 0:
+            if chess_future is not None:
+                chess_future.result()
             raise ValueError("No ChArUco detected.")
 
         total_number_of_points = charuco_ids.shape[0]
 
         if self.chessboard_point_detector:
 
+            predicted_roi = None
+            if self.restrict_chessboard_search:
+                predicted_roi = self._predict_chessboard_roi(
+                    image.shape, charuco_object_points, charuco_image_points)
+                self._predicted_chessboard_roi = predicted_roi
+                self._predicted_chessboard_image_shape = image.shape
+
             # 2025-09-01: Retesting in OpenCV 4.12.
             # With image: tests/data/calibration/pattern_4x4_19x26_5_4_with_inset_9_14.png,
             # origin is bottom right of chessboard image, with x left and y up.
-            chess_ids, chess_object_points, chess_image_points = \
-                self.chessboard_point_detector.get_points(image)
+            if chess_future is not None:
+                chess_ids, _, chess_image_points = \
+                    chess_future.result()
+            else:
+                searched_roi = predicted_roi
+                chess_ids, _, chess_image_points = \
+                    self._get_chessboard_points(image, searched_roi)
+
+            # If the previous frame's prediction missed, search again,
+            # where this frame predicts, and, failing that, everywhere,
+            # so a wrong prediction never loses the chessboard.
+            if chess_ids.shape[0] == 0 and searched_roi is not None \
+                    and predicted_roi != searched_roi:
+                searched_roi = predicted_roi
+                chess_ids, _, chess_image_points = \
+                    self._get_chessboard_points(image, searched_roi)
+            if chess_ids.shape[0] == 0 and searched_roi is not None:
+                chess_ids, _, chess_image_points = \
+                    self._get_chessboard_points(image, None)
 
             if self.error_if_no_chessboard and chess_ids.shape[0] == 0:
                 raise ValueError("No chessboard detected.")
@@ -229,33 +672,14 @@ class CharucoPlusChessboardPointDetector(pd.PointDetector):
             total_number_of_points = total_number_of_points + \
                 chess_ids.shape[0]
 
-            # Prepare to merge charuco and chessboard points
-            chess_ids = chess_ids + self.chessboard_id_offset
-
-            # Map chessboard points into ChArUco space
-            chess_object_points = np.transpose(
-                np.matmul(self.rotation_matrix, np.transpose(chess_object_points))
-                + self.translation_vector
-            )
-
-            if charuco_ids.shape[0] == 0:
-
-                # No merging required
-                charuco_ids = chess_ids
-                charuco_object_points = chess_object_points
-                charuco_image_points = chess_image_points
-
-            elif charuco_ids.shape[0] != 0 and chess_ids.shape[0] != 0:
-
-                charuco_ids = np.append(charuco_ids,
-                                        chess_ids,
-                                        axis=0)
-                charuco_object_points = np.append(charuco_object_points,
-                                                  chess_object_points,
-                                                  axis=0)
-                charuco_image_points = np.append(charuco_image_points,
-                                                 chess_image_points,
-                                                 axis=0)
+            if chess_ids.shape[0] != 0:
+                with si.stage('charuco_plus_chessboard.merge'):
+                    charuco_ids, charuco_object_points, \
+                        charuco_image_points = \
+                        self._merge_points(charuco_ids,
+                                           charuco_image_points,
+                                           chess_ids,
+                                           chess_image_points)
 
         if total_number_of_points < self.minimum_number_of_points:
             LOGGER.info("Not enough points detected. Discard.")
@@ -269,4 +693,16 @@ class CharucoPlusChessboardPointDetector(pd.PointDetector):
 
         :return: numpy 2D grey scale image.
         """
+        if self.reference_image is None:
+            self.reference_image = ch.make_charuco_with_chessboard(
+                dictionary=self.dictionary,
+                charuco_squares=self.number_of_charuco_squares,
+                charuco_size=self.size_of_charuco_squares,
+                chessboard_squares=self.number_of_chessboard_squares,
+                chessboard_size=self.chessboard_square_size,
+                legacy_pattern=self.legacy_pattern,
+                start_id=self.start_id,
+                pixels_per_millimetre=(self.size_of_charuco_squares[0]
+                                       * self.size_of_charuco_squares[1])
+            )
         return copy.deepcopy(self.reference_image)
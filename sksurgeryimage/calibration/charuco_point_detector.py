@@ -10,6 +10,7 @@ import cv2
 import sksurgeryimage.calibration.point_detector_utils as pdu
 from sksurgeryimage.calibration.point_detector import PointDetector
 from sksurgeryimage.calibration import charuco
+import sksurgeryimage.utilities.instrumentation as si
 
 LOGGER = logging.getLogger(__name__)
 
@@ -28,7 +29,12 @@ class CharucoPointDetector(PointDetector):
                  camera_matrix=None,
                  distortion_coefficients=None,
                  legacy_pattern=True,
-                 parameters: cv2.aruco.DetectorParameters=None
+                 parameters: cv2.aruco.DetectorParameters=None,
+                 pyramid_scale=None,
+                 refinement_half_window=None,
+                 tracking=False,
+                 tracking_margin=0.5,
+                 model_points=None
                  ):
         """
         Constructs a CharucoPointDetector.
@@ -43,8 +49,23 @@ class CharucoPointDetector(PointDetector):
         :param legacy_pattern: if True, uses OpenCV pre-4.6 ChArUco pattern
         :param parameters: OpenCV aruco DetectorParameters, if None,
                will create reasonable defaults.
+        :param pyramid_scale: if not None, factor in (0, 1) to detect points
+            in a downsampled image, before refining them at full resolution.
+            camera_matrix is scaled to match the downsampled image.
+        :param refinement_half_window: half size of cv2.cornerSubPix window
+            used to refine points at full resolution
+        :param tracking: if True, search near the previous detection first,
+            see PointDetector
+        :param tracking_margin: fraction of the previous bounding box size,
+            to add on each side, when predicting the next search region
+        :param model_points: dictionary of {id : 3D point}, as returned by
+            get_config(). If None, they are computed from the board.
         """
-        super().__init__(scale=scale)
+        super().__init__(scale=scale,
+                         tracking=tracking,
+                         tracking_margin=tracking_margin,
+                         pyramid_scale=pyramid_scale,
+                         refinement_half_window=refinement_half_window)
         if dictionary is None:
             raise ValueError("dictionary is None")
         self.dictionary = dictionary
@@ -52,41 +73,87 @@ class CharucoPointDetector(PointDetector):
         self.number_in_x = self.number_of_squares[0] - 1
         self.number_in_y = self.number_of_squares[1] - 1
         self.size = size
+        self.start_id = start_id
+        self.legacy_pattern = legacy_pattern
         self.camera_matrix = camera_matrix
         self.distortion_coefficients = distortion_coefficients
         self.parameters = parameters
         self.total_number_of_points = self.number_in_x * self.number_in_y
 
-        self.reference_image, self.board = \
-            charuco.make_charuco_board(self.dictionary,
-                                       self.number_of_squares,
-                                       self.size,
-                                       (self.number_of_squares[0] * 100,
-                                        self.number_of_squares[1] * 100),
-                                       legacy_pattern=legacy_pattern,
-                                       start_id=start_id
-                                       )
-        model_points = {}
-        _, _, _, chessboard_ids = charuco.detect_charuco_points(self.dictionary,
-                                                                self.board,
-                                                                self.reference_image,
-                                                                self.camera_matrix,
-                                                                self.distortion_coefficients,
-                                                                self.parameters)
+        self.board = \
+            charuco.make_charuco_board_definition(self.dictionary,
+                                                  self.number_of_squares,
+                                                  self.size,
+                                                  legacy_pattern=legacy_pattern,
+                                                  start_id=start_id
+                                                  )
+        # Created once, so no set up is repeated per frame.
+        self._charuco_detector = \
+            charuco.create_charuco_detector(self.board,
+                                            self.camera_matrix,
+                                            self.distortion_coefficients,
+                                            self.parameters)
+        self._coarse_charuco_detector = self._charuco_detector
+        if pyramid_scale is not None and self.camera_matrix is not None:
+            self._coarse_charuco_detector = \
+                charuco.create_charuco_detector(
+                    self.board,
+                    pdu.scale_camera_matrix(self.camera_matrix,
+                                            pyramid_scale),
+                    self.distortion_coefficients,
+                    self.parameters)
+
+        # Rendered on demand, see get_reference_image().
+        self.reference_image = None
+
+        if model_points is None:
+            model_points = self._create_model_points()
+        self.model_points = {int(idx): np.asarray(point)
+                             for idx, point in model_points.items()}
+        self._is_in_model, self._dense_model_points = \
+            pdu.create_dense_model(self.model_points)
+
+    def _create_model_points(self):
+        """
+        Returns the model points, straight from the board geometry.
+        Every chessboard corner of a ChArUco board is detectable, and ids
+        are the index into board.getChessboardCorners(), so no detection
+        of a reference image is needed.
+
+        :return: dictionary of {id : 3D point}
+        """
         chessboard_corners_3d = self.board.getChessboardCorners()
-        number_of_chessboard_ids = chessboard_ids.shape[0]
-        number_of_chessboard_corners = len(chessboard_corners_3d)
-        if number_of_chessboard_ids != number_of_chessboard_corners:
-            raise ValueError(f"Number of chessboard ids {number_of_chessboard_ids}, "
-                f"doesn't match number of chessboard corners {number_of_chessboard_ids}. ")
-        for i in range(0, number_of_chessboard_ids):
-            idx = chessboard_ids[i][0]
-            if idx < 0 or idx >= number_of_chessboard_corners:
-                raise ValueError(f"chessboard id {idx} is out of range "
-                                 f"0 to {number_of_chessboard_corners-1}")
-            # pylint: disable=unsubscriptable-object
-            model_points[idx] = chessboard_corners_3d[idx]
-        self.model_points = model_points
+        # pylint: disable=unsubscriptable-object
+        return {idx: chessboard_corners_3d[idx]
+                for idx in range(len(chessboard_corners_3d))}
+
+    def get_config(self) -> dict:
+        """
+        Returns the constructor arguments, including the model points.
+        See PointDetector.get_config().
+        """
+        return {'dictionary': pdu.aruco_dictionary_to_config(self.dictionary),
+                'number_of_squares': tuple(self.number_of_squares),
+                'size': tuple(self.size),
+                'scale': tuple(self.scale),
+                'start_id': self.start_id,
+                'camera_matrix': copy.deepcopy(self.camera_matrix),
+                'distortion_coefficients':
+                    copy.deepcopy(self.distortion_coefficients),
+                'legacy_pattern': self.legacy_pattern,
+                'parameters': pdu.opencv_parameters_to_config(self.parameters),
+                'pyramid_scale': self.pyramid_scale,
+                'refinement_half_window': self.refinement_half_window,
+                'tracking': self.tracking,
+                'tracking_margin': self.tracking_margin,
+                'model_points': copy.deepcopy(self.model_points)}
+
+    @classmethod
+    def from_config(cls, config: dict):
+        """
+        Creates a detector from the output of get_config().
+        """
+        return cls(**pdu.aruco_objects_from_config(config))
 
     def _internal_get_points(self, image, is_distorted=True):
         """
@@ -95,38 +162,45 @@ class CharucoPointDetector(PointDetector):
         :param image: numpy 2D grey scale image.
         :return: ids, object_points, image_points as Nx[1,3,2] ndarrays
         """
-        _, \
-        _, \
-        chessboard_corners, \
-        chessboard_ids = \
-            charuco.detect_charuco_points(self.dictionary,
-                                          self.board,
-                                          image,
-                                          self.camera_matrix,
-                                          self.distortion_coefficients)
-
-        # Check how many points we detected, whose id is in the model.
-        number_of_points = 0
-        if chessboard_corners is not None \
-            and chessboard_ids is not None \
-            and len(chessboard_corners) > 0 \
-            and len(chessboard_ids) > 0:
-            number_of_points = pdu.get_number_of_points(chessboard_ids, self.model_points)
-
-        returned_ids = np.zeros((number_of_points, 1), dtype=np.int32)
-        image_points = np.zeros((number_of_points, 2))
-        object_points = np.zeros((number_of_points, 3))
-
-        if number_of_points > 0:
-
-            for i in range(chessboard_ids.shape[0]):
-                idx = chessboard_ids[i][0]
-                returned_ids[i][0] = idx
-                image_points[i][0] = chessboard_corners[i][0][0]
-                image_points[i][1] = chessboard_corners[i][0][1]
-                object_points[i][0] = self.model_points[idx][0]
-                object_points[i][1] = self.model_points[idx][1]
-                object_points[i][2] = self.model_points[idx][2]
+        return self._get_points_with_detector(self._charuco_detector, image)
+
+    def _internal_get_coarse_points(self, image, is_distorted=True):
+        """
+        Extracts points from the image downsampled by pyramid_scale,
+        using a detector with the camera matrix scaled to match.
+
+        :param image: numpy 2D grey scale image, downsampled.
+        :return: ids, object_points, image_points as Nx[1,3,2] ndarrays
+        """
+        return self._get_points_with_detector(self._coarse_charuco_detector,
+                                              image)
+
+    def _get_points_with_detector(self, detector, image):
+        """
+        Extracts points with detector, a cv2.aruco.CharucoDetector.
+
+        :param image: numpy 2D grey scale image.
+        :return: ids, object_points, image_points as Nx[1,3,2] ndarrays
+        """
+        with si.stage('charuco.detect'):
+            _, \
+            _, \
+            chessboard_corners, \
+            chessboard_ids = \
+                charuco.detect_charuco_points_with_detector(detector, image)
+
+        if chessboard_corners is None \
+                or chessboard_ids is None \
+                or len(chessboard_corners) == 0:
+            return np.zeros((0, 1), dtype=np.int32), \
+                np.zeros((0, 3)), \
+                np.zeros((0, 2))
+
+        # Keep points we detected, whose id is in the model.
+        in_model = pdu.get_model_mask(chessboard_ids, self._is_in_model)
+        returned_ids = chessboard_ids.reshape(-1, 1)[in_model].astype(np.int32)
+        image_points = chessboard_corners.reshape(-1, 2)[in_model].astype(np.float64)
+        object_points = self._dense_model_points[returned_ids[:, 0]]
 
         return returned_ids, object_points, image_points
 
@@ -136,4 +210,10 @@ class CharucoPointDetector(PointDetector):
 
         :return: numpy 2D grey scale image.
         """
+        if self.reference_image is None:
+            self.reference_image = self.board.generateImage(
+                (self.number_of_squares[0] * 100,
+                 self.number_of_squares[1] * 100),
+                marginSize=0,
+                borderBits=1)
         return copy.deepcopy(self.reference_image)
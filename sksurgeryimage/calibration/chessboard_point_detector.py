@@ -10,10 +10,97 @@ from typing import Tuple
 import cv2
 import numpy as np
 from sksurgeryimage.calibration.point_detector import PointDetector
+import sksurgeryimage.utilities.instrumentation as si
 
 LOGGER = logging.getLogger(__name__)
 
-# pylint: disable=too-many-arguments, too-many-instance-attributes
+# Corner detection backends, see ChessboardPointDetector.
+FIND_CHESSBOARD_CORNERS = 'findChessboardCorners'
+FIND_CHESSBOARD_CORNERS_SB = 'findChessboardCornersSB'
+
+# cv2.cornerSubPix half window, and the smallest it is scaled down to.
+DEFAULT_REFINEMENT_HALF_WINDOW = 11
+MIN_REFINEMENT_HALF_WINDOW = 2
+
+
+def get_refinement_half_window(corners: np.ndarray,
+                               number_of_corners: Tuple[int, int],
+                               fraction: float=0.4,
+                               maximum: int=DEFAULT_REFINEMENT_HALF_WINDOW):
+    """
+    Returns a cv2.cornerSubPix half window size, scaled to the size of the
+    chessboard in the image, so that the window around one corner does
+    not reach the neighbouring corners, even where the board is
+    foreshortened.
+
+    :param corners: N x 1 x 2 corners, from cv2.findChessboardCorners
+    :param number_of_corners: tuple of (number in x, number in y)
+    :param fraction: fraction of the smallest distance between adjacent
+        corners, in pixels
+    :param maximum: largest half window returned
+    :return: int half window, between MIN_REFINEMENT_HALF_WINDOW and maximum
+    """
+    grid = np.reshape(corners,
+                      (number_of_corners[1], number_of_corners[0], 2))
+    along_x = np.linalg.norm(np.diff(grid, axis=1), axis=2)
+    along_y = np.linalg.norm(np.diff(grid, axis=0), axis=2)
+    spacings = np.concatenate((along_x.ravel(), along_y.ravel()))
+    if spacings.size == 0:
+        return maximum
+    half_window = int(np.floor(fraction * np.min(spacings)))
+    return int(np.clip(half_window, MIN_REFINEMENT_HALF_WINDOW, maximum))
+
+
+def _get_intensity(image: np.ndarray, point: np.ndarray) -> int:
+    """
+    Returns the grey level of the pixel nearest to point, clipped to image.
+    """
+    height, width = image.shape[0:2]
+    column, row = np.clip(np.round(point).astype(int),
+                          0, [width - 1, height - 1])
+    return int(image[row, column])
+
+
+def canonicalise_corner_order(image: np.ndarray,
+                              corners: np.ndarray,
+                              number_of_corners: Tuple[int, int]):
+    """
+    Returns corners, e.g. from cv2.findChessboardCornersSB, in the order
+    cv2.findChessboardCorners uses, reversing them if needed.
+
+    If one of the numbers of corners is odd, and the other even, the board
+    looks different when rotated by 180 degrees, and the first corner is
+    the one next to a dark square, at that end of the board. Otherwise,
+    as cv2.findChessboardCorners does, the first corner is the one above
+    the first corner of the last row.
+
+    :param image: numpy 2D grey scale image, in which corners were found
+    :param corners: N x 1 x 2 corners, in rows of number_of_corners[0]
+    :param number_of_corners: tuple of (number in x, number in y)
+    :return: corners, possibly reversed
+    """
+    number_in_x, number_in_y = number_of_corners
+    points = np.reshape(corners, (-1, 2))
+    if (number_in_x + number_in_y) % 2 == 1 \
+            and number_in_x > 1 and number_in_y > 1:
+        # Centres of the squares at each end, inside the corners.
+        first = _get_intensity(
+            image,
+            np.mean(points[[0, 1, number_in_x, number_in_x + 1]], axis=0))
+        last = _get_intensity(
+            image,
+            np.mean(points[[-1, -2, -1 - number_in_x, -2 - number_in_x]],
+                    axis=0))
+        is_reversed = first > last
+    else:
+        last_row = (number_in_y - 1) * number_in_x
+        is_reversed = points[last_row][1] < points[0][1]
+    if is_reversed:
+        return corners[::-1].copy()
+    return corners
+
+
+# pylint: disable=too-many-arguments, too-many-instance-attributes, too-many-locals
 class ChessboardPointDetector(PointDetector):
     """
     Class to detect chessboard points in a 2D grey scale video image.
@@ -28,7 +115,19 @@ class ChessboardPointDetector(PointDetector):
                  optimisation_criteria: Tuple[int, int, float]=(cv2.TERM_CRITERIA_EPS
                                                                 + cv2.TERM_CRITERIA_MAX_ITER,
                                                                 30,
-                                                                0.001)):
+                                                                0.001),
+                 pyramid_scale: float=None,
+                 refinement_half_window: int=None,
+                 tracking: bool=False,
+                 tracking_margin: float=0.5,
+                 fast_check: bool=False,
+                 fast_check_size: int=240,
+                 fast_check_min_contrast: int=32,
+                 backend: str=FIND_CHESSBOARD_CORNERS,
+                 sector_based_flags: int=cv2.CALIB_CB_NORMALIZE_IMAGE
+                                         + cv2.CALIB_CB_EXHAUSTIVE
+                                         + cv2.CALIB_CB_ACCURACY,
+                 scale_refinement_window: bool=False):
         """
         Constructs a ChessboardPointDetector.
 
@@ -37,8 +136,45 @@ class ChessboardPointDetector(PointDetector):
         :param scale: if you want to resize the image, specify scale factors
         :param chessboard_flags: OpenCV flags to pass to cv2.findChessboardCorners
         :param optimisation_criteria: criteria for cv2.cornerSubPix
+        :param pyramid_scale: if not None, factor in (0, 1) to detect points
+            in a downsampled image, before refining them at full resolution
+        :param refinement_half_window: half size of cv2.cornerSubPix window
+            used to refine points at full resolution, in pyramid mode.
+            Defaults to the window used without pyramid mode, so that
+            both modes give the same corners.
+        :param tracking: if True, search near the previous detection first,
+            see PointDetector
+        :param tracking_margin: fraction of the previous bounding box size,
+            to add on each side, when predicting the next search region
+        :param fast_check: if True, before cv2.findChessboardCorners, check
+            a copy of the image, downsampled to fast_check_size, and reject
+            frames that clearly contain no chessboard, see _fast_check()
+        :param fast_check_size: size in pixels of the shorter side of the
+            downsampled image. Using the shorter side, rather than the
+            width, keeps enough pixels per square for interlaced images.
+        :param fast_check_min_contrast: frames whose downsampled grey level
+            range, (max - min), is less than this are rejected
+        :param backend: FIND_CHESSBOARD_CORNERS, to use
+            cv2.findChessboardCorners with chessboard_flags, followed by
+            cv2.cornerSubPix, or FIND_CHESSBOARD_CORNERS_SB, to use the sector
+            based cv2.findChessboardCornersSB with sector_based_flags, which
+            returns subpixel corners, so cv2.cornerSubPix is not used.
+            Its corners, which may start from the other end of the board,
+            are put in the cv2.findChessboardCorners order, by
+            canonicalise_corner_order(), so ids match between backends.
+        :param sector_based_flags: OpenCV flags to pass to
+            cv2.findChessboardCornersSB
+        :param scale_refinement_window: if True, the cv2.cornerSubPix window
+            is scaled to the size of the chessboard in the image, see
+            get_refinement_half_window(), rather than a fixed 11x11 half size
         """
-        super().__init__(scale=scale)
+        if pyramid_scale is not None and refinement_half_window is None:
+            refinement_half_window = DEFAULT_REFINEMENT_HALF_WINDOW
+        super().__init__(scale=scale,
+                         pyramid_scale=pyramid_scale,
+                         refinement_half_window=refinement_half_window,
+                         tracking=tracking,
+                         tracking_margin=tracking_margin)
         model_points = {}
         self.number_of_corners = number_of_corners
         self.number_in_x, self.number_in_y = self.number_of_corners
@@ -48,6 +184,18 @@ class ChessboardPointDetector(PointDetector):
         self.ids = np.zeros((self.expected_number_of_points, 1), dtype=np.int16)
         self.chessboard_flags = chessboard_flags
         self.optimisation_criteria = optimisation_criteria
+        if backend not in (FIND_CHESSBOARD_CORNERS, FIND_CHESSBOARD_CORNERS_SB):
+            raise ValueError(f"Unknown chessboard backend:{backend}")
+        self.backend = backend
+        self.sector_based_flags = sector_based_flags
+        self.scale_refinement_window = scale_refinement_window
+        if fast_check_size <= 0:
+            raise ValueError("fast_check_size should be > 0")
+        self.fast_check = fast_check
+        self.fast_check_size = fast_check_size
+        self.fast_check_min_contrast = fast_check_min_contrast
+        self.fast_check_statistics = {}
+        self.reset_fast_check_statistics()
 
         for i in range(0, self.expected_number_of_points):
             self.object_points[i][0] = (i % self.number_in_x) \
@@ -60,6 +208,84 @@ class ChessboardPointDetector(PointDetector):
         self.model_points = model_points
 
 
+    def get_config(self) -> dict:
+        """
+        Returns the constructor arguments. See PointDetector.get_config().
+        """
+        return {'number_of_corners': tuple(self.number_of_corners),
+                'square_size_in_mm': self.square_size_in_mm,
+                'scale': tuple(self.scale),
+                'chessboard_flags': self.chessboard_flags,
+                'optimisation_criteria': tuple(self.optimisation_criteria),
+                'pyramid_scale': self.pyramid_scale,
+                'refinement_half_window': self.refinement_half_window,
+                'tracking': self.tracking,
+                'tracking_margin': self.tracking_margin,
+                'fast_check': self.fast_check,
+                'fast_check_size': self.fast_check_size,
+                'fast_check_min_contrast': self.fast_check_min_contrast,
+                'backend': self.backend,
+                'sector_based_flags': self.sector_based_flags,
+                'scale_refinement_window': self.scale_refinement_window}
+
+    def reset_fast_check_statistics(self):
+        """
+        Resets the counts returned by get_fast_check_statistics().
+        """
+        self.fast_check_statistics = {'frames': 0,
+                                      'rejected': 0,
+                                      'passed': 0,
+                                      'found': 0}
+
+    def get_fast_check_statistics(self) -> dict:
+        """
+        Returns counts of frames checked, rejected by the fast check, passed
+        to cv2.findChessboardCorners, and then found, along with rates:
+
+        rejection_rate: rejected / frames
+
+        hit_rate: found / passed, i.e. how often a full search paid off
+
+        miss_rate: (passed - found) / passed, i.e. how often the fast check
+        let through a frame with no detectable chessboard
+
+        :return: dict of counts and rates, rates are 0 if undefined
+        """
+        statistics = dict(self.fast_check_statistics)
+        frames = statistics['frames']
+        passed = statistics['passed']
+        statistics['rejection_rate'] = \
+            statistics['rejected'] / frames if frames > 0 else 0.0
+        statistics['hit_rate'] = \
+            statistics['found'] / passed if passed > 0 else 0.0
+        statistics['miss_rate'] = \
+            (passed - statistics['found']) / passed if passed > 0 else 0.0
+        return statistics
+
+    def _fast_check(self, image: np.ndarray) -> bool:
+        """
+        Returns False if the image clearly contains no chessboard.
+
+        The image is downsampled, so its shorter side is fast_check_size.
+        Low contrast frames, e.g. blank or dark, are rejected, then
+        cv2.checkChessboard, the same test as the cv2.CALIB_CB_FAST_CHECK
+        flag, looks for enough quadrilaterals of both colours at a few
+        thresholds.
+
+        :param image: numpy 2D grey scale image.
+        :return: True if cv2.findChessboardCorners is worth running
+        """
+        shorter_side = min(image.shape[0], image.shape[1])
+        small = image
+        if shorter_side > self.fast_check_size:
+            factor = self.fast_check_size / shorter_side
+            small = cv2.resize(image, None, fx=factor, fy=factor,
+                               interpolation=cv2.INTER_LINEAR)
+        minimum, maximum, _, _ = cv2.minMaxLoc(small)
+        if maximum - minimum < self.fast_check_min_contrast:
+            return False
+        return cv2.checkChessboard(small, self.number_of_corners)
+
     def _internal_get_points(self, image: np.ndarray, is_distorted: bool=True):
         """
         Extracts points using OpenCV's chessboard implementation.
@@ -67,19 +293,94 @@ class ChessboardPointDetector(PointDetector):
         :param image: numpy 2D grey scale image.
         :return: ids, object_points, image_points as Nx[1,3,2] ndarrays
         """
+        return self._get_corners(image, refine=True)
+
+    def _internal_get_coarse_points(self,
+                                    image: np.ndarray,
+                                    is_distorted: bool=True):
+        """
+        Extracts points from the image downsampled by pyramid_scale,
+        without cv2.cornerSubPix, whose window, sized for the full
+        resolution image, could reach neighbouring corners. The points
+        are refined at full resolution, by _refine_points().
+
+        :param image: numpy 2D grey scale image, downsampled.
+        :return: ids, object_points, image_points as Nx[1,3,2] ndarrays
+        """
+        return self._get_corners(image, refine=False)
+
+    def _refine_points(self, image: np.ndarray, image_points: np.ndarray):
+        """
+        Refines approximate points at full resolution, with
+        cv2.cornerSubPix, using a window of refinement_half_window,
+        scaled to the chessboard, if scale_refinement_window is True,
+        as in _internal_get_points().
+
+        :param image: numpy 2D grey scale image, at full resolution.
+        :param image_points: Nx2 approximate points, in image coordinates.
+        :return: Nx2 refined points
+        """
+        corners = np.ascontiguousarray(image_points,
+                                       dtype=np.float32).reshape(-1, 1, 2)
+        half_window = self.refinement_half_window
+        if self.scale_refinement_window:
+            half_window = get_refinement_half_window(
+                corners, self.number_of_corners, maximum=half_window)
+        with si.stage('chessboard.refine'):
+            cv2.cornerSubPix(image,
+                             corners,
+                             (half_window, half_window),
+                             (-1, -1),
+                             self.optimisation_criteria)
+        return corners.reshape(-1, 2)
+
+    def _get_corners(self, image: np.ndarray, refine: bool):
+        """
+        Finds the chessboard corners, with the configured backend.
+
+        :param image: numpy 2D grey scale image.
+        :param refine: if True, and using cv2.findChessboardCorners,
+            refine the corners with cv2.cornerSubPix
+        :return: ids, object_points, image_points as Nx[1,3,2] ndarrays
+        """
         img_points = np.zeros((0, 2))
 
-        ret, corners = cv2.findChessboardCorners(image,
-                                                 self.number_of_corners,
-                                                 self.chessboard_flags)
+        if self.fast_check:
+            self.fast_check_statistics['frames'] += 1
+            with si.stage('chessboard.fast_check'):
+                is_possible = self._fast_check(image)
+            if not is_possible:
+                self.fast_check_statistics['rejected'] += 1
+                return np.zeros((0, 1)), np.zeros((0, 3)), img_points
+            self.fast_check_statistics['passed'] += 1
+
+        with si.stage('chessboard.find_corners'):
+            if self.backend == FIND_CHESSBOARD_CORNERS_SB:
+                ret, corners = cv2.findChessboardCornersSB(
+                    image, self.number_of_corners, self.sector_based_flags)
+            else:
+                ret, corners = cv2.findChessboardCorners(
+                    image, self.number_of_corners, self.chessboard_flags)
 
         if ret:
-            img_points = cv2.cornerSubPix(image,
-                                          corners,
-                                          (11, 11),
-                                          (-1, -1),
-                                          self.optimisation_criteria
-                                          )
+            if self.fast_check:
+                self.fast_check_statistics['found'] += 1
+            img_points = corners
+            if self.backend == FIND_CHESSBOARD_CORNERS_SB:
+                img_points = canonicalise_corner_order(
+                    image, corners, self.number_of_corners)
+            if self.backend == FIND_CHESSBOARD_CORNERS and refine:
+                half_window = DEFAULT_REFINEMENT_HALF_WINDOW
+                if self.scale_refinement_window:
+                    half_window = get_refinement_half_window(
+                        corners, self.number_of_corners)
+                with si.stage('chessboard.refine'):
+                    img_points = cv2.cornerSubPix(image,
+                                                  corners,
+                                                  (half_window, half_window),
+                                                  (-1, -1),
+                                                  self.optimisation_criteria
+                                                  )
 
             # If successful, we return all ids, 3D points and 2D points.
             return copy.deepcopy(self.ids), \
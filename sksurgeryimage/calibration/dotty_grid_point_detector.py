@@ -6,13 +6,29 @@ Dotty Grid implementation of PointDetector.
 
 # pylint:disable=too-many-instance-attributes
 
+import collections
+import copy
 import logging
+import time
 import cv2
 import numpy as np
+import sksurgeryimage.calibration.point_detector_utils as pdu
 from sksurgeryimage.calibration.point_detector import PointDetector
+import sksurgeryimage.utilities.instrumentation as si
 
 LOGGER = logging.getLogger(__name__)
 
+# Dot localisers, see DottyGridPointDetector.
+BLOB_DETECTOR = 'blob_detector'
+CONNECTED_COMPONENTS = 'connected_components'
+
+# Minimum ratio of a dot's area to its bounding box area. A disc is 0.785.
+MIN_DOT_FILL_RATIO = 0.5
+
+#: Maximum number of undistortion maps kept per detector, each of which
+#: is about 50 MB for a 4K image.
+UNDISTORT_MAPS_CACHE_SIZE = 2
+
 
 def create_model_points(dots_rows_columns: (int, int),
                         pixels_per_mm: int,
@@ -45,13 +61,169 @@ def create_model_points(dots_rows_columns: (int, int),
     return model_points
 
 
+def find_nearest_points(points, reference_points, chunk_size=1024):
+    """
+    For each point, finds the index of the nearest reference point,
+    by computing all squared distances with numpy, in chunks of
+    chunk_size points, to bound memory use. Ties go to the lowest index.
+
+    :param points: Nx2 ndarray of query points
+    :param reference_points: Mx2 ndarray of reference points, M > 0
+    :param chunk_size: number of query points per distance matrix
+    :return: N ndarray of indexes into reference_points,
+        N ndarray of squared distances
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    reference_points = np.asarray(reference_points, dtype=np.float64)
+    indexes = np.zeros(points.shape[0], dtype=np.int64)
+    distances = np.zeros(points.shape[0])
+    for start in range(0, points.shape[0], chunk_size):
+        chunk = points[start:start + chunk_size]
+        delta_x = reference_points[np.newaxis, :, 0] - chunk[:, 0:1]
+        delta_y = reference_points[np.newaxis, :, 1] - chunk[:, 1:2]
+        squared = delta_x * delta_x + delta_y * delta_y
+        nearest = np.argmin(squared, axis=1)
+        indexes[start:start + chunk.shape[0]] = nearest
+        distances[start:start + chunk.shape[0]] = \
+            squared[np.arange(chunk.shape[0]), nearest]
+    return indexes, distances
+
+
+def find_dots(thresholded,
+              image,
+              min_area=0,
+              max_area=np.inf,
+              min_inertia_ratio=0.0,
+              min_fill_ratio=MIN_DOT_FILL_RATIO):
+    """
+    Finds dark dots, in one pass of cv2.connectedComponentsWithStats,
+    and localises each to subpixel accuracy as the centroid of its pixels,
+    weighted by how dark they are in image. All components are processed
+    together, with numpy, rather than one at a time.
+
+    Components touching the image border, or failing the area, aspect
+    ratio, or fill ratio tests, are discarded.
+
+    :param thresholded: 2D uint8 image, dots 0, background 255,
+        e.g. from cv2.adaptiveThreshold
+    :param image: 2D grey scale image, same size, used for weighting
+    :param min_area: minimum dot area in pixels
+    :param max_area: maximum dot area in pixels
+    :param min_inertia_ratio: minimum squared ratio of bounding box
+        short side to long side, c.f. SimpleBlobDetector_Params
+    :param min_fill_ratio: minimum area / bounding box area
+    :return: Nx3 ndarray of [size, x, y], where size is the diameter of
+        a disc of the same area, c.f. cv2.KeyPoint.size
+    """
+    # pylint:disable=too-many-arguments, too-many-locals
+    mask = cv2.bitwise_not(thresholded)
+    number_of_labels, labels, stats, _ = \
+        cv2.connectedComponentsWithStats(mask, connectivity=8,
+                                         ltype=cv2.CV_32S)
+    left = stats[:, cv2.CC_STAT_LEFT]
+    top = stats[:, cv2.CC_STAT_TOP]
+    width = stats[:, cv2.CC_STAT_WIDTH]
+    height = stats[:, cv2.CC_STAT_HEIGHT]
+    area = stats[:, cv2.CC_STAT_AREA]
+    image_height, image_width = mask.shape[0:2]
+
+    keep = (area >= min_area) & (area <= max_area)
+    keep &= area >= min_fill_ratio * width * height
+    keep &= np.minimum(width, height) ** 2 \
+        >= min_inertia_ratio * np.maximum(width, height) ** 2
+    keep &= (left > 0) & (top > 0) \
+        & (left + width < image_width) & (top + height < image_height)
+    keep[0] = False
+    kept_labels = np.flatnonzero(keep)
+    if kept_labels.size == 0:
+        return np.zeros((0, 3))
+
+    # Map each pixel to the index of its kept component, or -1.
+    lookup = np.full(number_of_labels, -1, dtype=np.int64)
+    lookup[kept_labels] = np.arange(kept_labels.size)
+    components = lookup[labels.ravel()]
+    pixels = np.flatnonzero(components >= 0)
+    components = components[pixels]
+
+    weights = 255.0 - image.ravel()[pixels]
+    columns = pixels % image_width
+    rows = pixels // image_width
+    total = np.bincount(components, weights, minlength=kept_labels.size)
+    total = np.where(total > 0, total, np.finfo(np.float64).tiny)
+
+    dots = np.zeros((kept_labels.size, 3))
+    dots[:, 0] = 2.0 * np.sqrt(area[kept_labels] / np.pi)
+    dots[:, 1] = np.bincount(components, weights * columns,
+                             minlength=kept_labels.size) / total
+    dots[:, 2] = np.bincount(components, weights * rows,
+                             minlength=kept_labels.size) / total
+    return dots
+
+
+def get_otsu_thresholds(histograms):
+    """
+    Returns the threshold that cv2.threshold, with cv2.THRESH_OTSU, picks
+    for each of many 8 bit images, from their histograms, all at once.
+
+    :param histograms: Nx256 ndarray of pixel counts, one row per image
+    :return: N ndarray of int thresholds
+    """
+    counts = np.asarray(histograms, dtype=np.float64)
+    total = np.maximum(counts.sum(axis=1, keepdims=True), 1)
+    probabilities = counts / total
+    levels = np.arange(counts.shape[1])
+    lower_probability = np.cumsum(probabilities, axis=1)
+    upper_probability = 1.0 - lower_probability
+    lower_sum = np.cumsum(probabilities * levels, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lower_mean = lower_sum / lower_probability
+        upper_mean = (lower_sum[:, -1:] - lower_sum) / upper_probability
+        variance = lower_probability * upper_probability \
+            * (lower_mean - upper_mean) ** 2
+
+    # As OpenCV, skip levels with (almost) everything on one side.
+    epsilon = np.finfo(np.float32).eps
+    valid = (np.minimum(lower_probability, upper_probability) >= epsilon) \
+        & (np.maximum(lower_probability, upper_probability) <= 1 - epsilon)
+    variance = np.where(valid, variance, 0.0)
+    return np.argmax(variance, axis=1)
+
+
+def _remove_duplicates(indexes, object_points, image_points):
+    """
+    Removes all points whose id was matched more than once.
+    """
+    _, unique_idxs, counts = \
+        np.unique(indexes, return_index=True, return_counts=True)
+
+    unique_idxs = unique_idxs[counts == 1]
+
+    return indexes[unique_idxs], \
+        object_points[unique_idxs], \
+        image_points[unique_idxs]
+
+
+def _record_stage(timings, stage, start):
+    """
+    Adds the time since start to timings[stage], and passes it on to
+    any instrumentation callbacks, as 'dotty_grid.' + stage.
+
+    :return: the current time, i.e. the start of the next stage
+    """
+    now = time.perf_counter()
+    timings[stage] = timings.get(stage, 0.0) + now - start
+    if si.is_enabled():
+        si.record('dotty_grid.' + stage, now - start)
+    return now
+
+
 class DottyGridPointDetector(PointDetector):
     """
     Class to detect a grid of dots in a 2D grey scale video image.
 
     More specifically, a grid of dots with 4 larger dots at known locations.
     """
-    # pylint: disable=too-many-arguments
+    # pylint: disable=too-many-arguments, too-many-locals
     def __init__(self,
                  model_points,
                  list_of_indexes,
@@ -65,7 +237,10 @@ class DottyGridPointDetector(PointDetector):
                  threshold_offset=20,
                  min_area=50,
                  max_area=50000,
-                 dot_detector_params=None
+                 dot_detector_params=None,
+                 pyramid_scale=None,
+                 refinement_half_window=None,
+                 dot_localiser=BLOB_DETECTOR
                  ):
         """
         Constructs a PointDetector that extracts a grid of dots,
@@ -92,19 +267,42 @@ class DottyGridPointDetector(PointDetector):
         :param min_area: minimum area when filtering by area
         :param max_area: maximum area when filtering by area
         :param dot_detector_params: instance of cv2.SimpleBlobDetector_Params()
+        :param pyramid_scale: if not None, factor in (0, 1) to detect dots
+            in a downsampled image, before refining them at full resolution.
+            Pixel sized parameters, e.g. areas and window sizes, then
+            apply to the downsampled image.
+        :param refinement_half_window: half size of window used to refine
+            dots at full resolution. Should be bigger than the dot radius.
+        :param dot_localiser: BLOB_DETECTOR, to run cv2.SimpleBlobDetector
+            on the image, the undistorted image and the warped image, or
+            CONNECTED_COMPONENTS, to find dots once, with find_dots(), and
+            then undistort and warp the dot centres, not the image.
         """
+        # Before super().__init__(), which calls set_camera_parameters().
+        # Least recently used undistortion maps,
+        # keyed by image size and camera matrix.
+        self._undistort_maps = collections.OrderedDict()
+
         super().\
             __init__(scale=scale,
                      camera_intrinsics=camera_intrinsics,
-                     distortion_coefficients=distortion_coefficients
+                     distortion_coefficients=distortion_coefficients,
+                     pyramid_scale=pyramid_scale,
+                     refinement_half_window=refinement_half_window
                      )
 
         if len(list_of_indexes) != 4:
             raise ValueError('list_of_index not of length 4')
         if reference_image_size is None:
             raise ValueError('You must provide a reference image size')
+        if dot_localiser not in (BLOB_DETECTOR, CONNECTED_COMPONENTS):
+            raise ValueError(f'Unknown dot_localiser:{dot_localiser}')
+        self.dot_localiser = dot_localiser
 
         self.model_points = model_points
+        # Contiguous copy of the model's pixel coordinates, for matching.
+        self.model_pixels = np.ascontiguousarray(model_points[:, 1:3],
+                                                 dtype=np.float64)
         self.list_of_indexes = list_of_indexes
         self.model_fiducials = self.model_points[self.list_of_indexes]
         self.reference_image_size = reference_image_size
@@ -127,6 +325,95 @@ class DottyGridPointDetector(PointDetector):
         if dot_detector_params is not None:
             self.dot_detector_params = dot_detector_params
 
+        # Created once, and reused for every frame. Changes made to
+        # dot_detector_params after construction are not picked up.
+        self._blob_detector = \
+            cv2.SimpleBlobDetector_create(self.dot_detector_params)
+
+        # Seconds spent in each stage of the last call to get_points().
+        self.stage_timings = {}
+
+    def set_camera_parameters(self,
+                              camera_intrinsics: np.ndarray,
+                              distortion_coefficients: np.ndarray):
+        """
+        Sets the camera parameters, see PointDetector, and discards
+        cached undistortion maps, which depend on them.
+
+        :param camera_intrinsics: [3x3] camera matrix
+        :param distortion_coefficients: [1xn] distortion coefficients
+        """
+        super().set_camera_parameters(camera_intrinsics,
+                                      distortion_coefficients)
+        self._undistort_maps = collections.OrderedDict()
+
+    def get_stage_timings(self) -> dict:
+        """
+        Returns the time spent in each stage of the last call
+        to get_points(), e.g. 'smoothing', 'thresholding',
+        'blob_detection', 'undistortion', 'warping', 'matching',
+        'distortion' and, in pyramid mode, 'refinement'.
+
+        :return: dict of stage name : seconds
+        """
+        return dict(self.stage_timings)
+
+    def _undistort(self, image, camera_intrinsics):
+        """
+        Equivalent to cv2.undistort(), but reuses the undistortion maps,
+        for each image size and camera matrix, until
+        set_camera_parameters() is called. Keeps at most
+        UNDISTORT_MAPS_CACHE_SIZE maps, removing the least recently used.
+        """
+        height, width = image.shape[0:2]
+        key = (width, height, np.asarray(camera_intrinsics).tobytes())
+        if key not in self._undistort_maps:
+            self._undistort_maps[key] = cv2.initUndistortRectifyMap(
+                camera_intrinsics,
+                self.distortion_coefficients,
+                None,
+                camera_intrinsics,
+                (width, height),
+                cv2.CV_16SC2)
+            while len(self._undistort_maps) > UNDISTORT_MAPS_CACHE_SIZE:
+                self._undistort_maps.popitem(last=False)
+        self._undistort_maps.move_to_end(key)
+        map_1, map_2 = self._undistort_maps[key]
+        return cv2.remap(image, map_1, map_2, cv2.INTER_LINEAR)
+
+    def get_config(self) -> dict:
+        """
+        Returns the constructor arguments. See PointDetector.get_config().
+        """
+        return {'model_points': self.model_points.copy(),
+                'list_of_indexes': copy.deepcopy(self.list_of_indexes),
+                'camera_intrinsics': copy.deepcopy(self.camera_intrinsics),
+                'distortion_coefficients':
+                    copy.deepcopy(self.distortion_coefficients),
+                'scale': tuple(self.scale),
+                'reference_image_size': tuple(self.reference_image_size),
+                'rms': self.rms_tolerance,
+                'gaussian_sigma': self.gaussian_sigma,
+                'threshold_window_size': self.threshold_window_size,
+                'threshold_offset': self.threshold_offset,
+                'min_area': self.min_area,
+                'max_area': self.max_area,
+                'dot_detector_params':
+                    pdu.opencv_parameters_to_config(self.dot_detector_params),
+                'pyramid_scale': self.pyramid_scale,
+                'refinement_half_window': self.refinement_half_window,
+                'dot_localiser': self.dot_localiser}
+
+    @classmethod
+    def from_config(cls, config: dict):
+        """
+        Creates a detector from the output of get_config().
+        """
+        config = dict(config)
+        config['dot_detector_params'] = pdu.opencv_parameters_from_config(
+            cv2.SimpleBlobDetector_Params, config['dot_detector_params'])
+        return cls(**config)
+
     def _internal_get_points(self, image, is_distorted=True):
         """
         Extracts points.
@@ -136,17 +423,225 @@ class DottyGridPointDetector(PointDetector):
              undistorted.
         :return: ids, object_points, image_points as Nx[1,3,2] ndarrays
         """
+        return self._detect_points(image, is_distorted,
+                                   self.camera_intrinsics)
+
+    def _internal_get_coarse_points(self, image, is_distorted=True):
+        """
+        Extracts points from the image downsampled by pyramid_scale,
+        using camera intrinsics scaled to match.
+
+        :param image: numpy 2D grey scale image, downsampled.
+        :param is_distorted: False if the input image has already been \
+             undistorted.
+        :return: ids, object_points, image_points as Nx[1,3,2] ndarrays
+        """
+        scaled_intrinsics = pdu.scale_camera_matrix(self.camera_intrinsics,
+                                                    self.pyramid_scale)
+        return self._detect_points(image, is_distorted, scaled_intrinsics)
+
+    def _refine_points(self, image, image_points):
+        """
+        Refines each approximate dot location at full resolution, as the
+        intensity weighted centroid of the dark, Otsu thresholded, connected
+        component under the point, within refinement_half_window pixels.
+        If the component is not entirely inside the window, the approximate
+        point is kept, so refinement_half_window should exceed the dot radius.
+
+        All windows are processed together: they are thresholded with
+        numpy, and labelled in one call of cv2.connectedComponentsWithStats,
+        stacked into one image, with a background gap between them.
+
+        :param image: numpy 2D grey scale image, at full resolution.
+        :param image_points: Nx2 approximate points, in image coordinates.
+        :return: Nx2 refined points
+        """
+        # pylint:disable=too-many-locals
+        start = time.perf_counter()
+        refined = np.array(image_points, dtype=np.float64).reshape(-1, 2)
+        half_window = self.refinement_half_window
+        size = 2 * half_window + 1
+        height, width = image.shape[0:2]
+
+        centres = np.round(refined).astype(np.int64)
+        indexes = np.flatnonzero((centres[:, 0] >= 0)
+                                 & (centres[:, 0] < width)
+                                 & (centres[:, 1] >= 0)
+                                 & (centres[:, 1] < height))
+        if indexes.size == 0:
+            _record_stage(self.stage_timings, 'refinement', start)
+            return refined
+        centres = centres[indexes]
+        number_of_windows = indexes.size
+
+        # Windows of pixels, clipped to the image, where valid is True.
+        offsets = np.arange(size) - half_window
+        valid = ((centres[:, 1:2] + offsets >= 0)
+                 & (centres[:, 1:2] + offsets < height))[:, :, np.newaxis] \
+            & ((centres[:, 0:1] + offsets >= 0)
+               & (centres[:, 0:1] + offsets < width))[:, np.newaxis, :]
+        padded = cv2.copyMakeBorder(image, half_window, half_window,
+                                    half_window, half_window,
+                                    cv2.BORDER_CONSTANT, value=255)
+        patches = np.lib.stride_tricks.sliding_window_view(
+            padded, (size, size))[centres[:, 1], centres[:, 0]]
+
+        # Histogram of each window, with pixels outside the image
+        # counted in an extra bin, which is then dropped.
+        bins = np.arange(0, number_of_windows * 256, 256,
+                         dtype=np.int32)[:, np.newaxis, np.newaxis] + patches
+        bins[~valid] = number_of_windows * 256
+        histograms = np.bincount(bins.ravel(),
+                                 minlength=number_of_windows * 256 + 1)
+        thresholds = get_otsu_thresholds(
+            histograms[:-1].reshape(number_of_windows, 256))
+        mask = valid & (patches <= thresholds[:, np.newaxis, np.newaxis])
+
+        stacked = np.zeros((number_of_windows, size + 1, size + 1),
+                           dtype=np.uint8)
+        stacked[:, 0:size, 0:size] = mask
+        _, labels, stats, _ = cv2.connectedComponentsWithStats(
+            stacked.reshape(-1, size + 1), connectivity=8, ltype=cv2.CV_32S)
+        labels = labels.reshape(number_of_windows, size + 1, size + 1)
+        centre_labels = labels[:, half_window, half_window]
+
+        # Reject components reaching the edge of the clipped window.
+        first = np.maximum(half_window - centres, 0)
+        last = np.minimum(half_window - centres + [width - 1, height - 1],
+                          size - 1)
+        left = stats[centre_labels, cv2.CC_STAT_LEFT]
+        top = stats[centre_labels, cv2.CC_STAT_TOP] \
+            - np.arange(number_of_windows) * (size + 1)
+        right = left + stats[centre_labels, cv2.CC_STAT_WIDTH] - 1
+        bottom = top + stats[centre_labels, cv2.CC_STAT_HEIGHT] - 1
+        keep = (centre_labels > 0) \
+            & (left > first[:, 0]) & (right < last[:, 0]) \
+            & (top > first[:, 1]) & (bottom < last[:, 1])
+
+        component = labels[:, 0:size, 0:size] \
+            == centre_labels[:, np.newaxis, np.newaxis]
+        weights = np.where(component, 255 - patches.astype(np.int32), 0)
+        total = weights.sum(axis=(1, 2), dtype=np.int64)
+        keep &= total > 0
+        total = np.where(keep, total, 1)
+        refined[indexes[keep], 0] = (centres[:, 0] + np.einsum(
+            'nij,j->n', weights, offsets) / total)[keep]
+        refined[indexes[keep], 1] = (centres[:, 1] + np.einsum(
+            'nij,i->n', weights, offsets) / total)[keep]
+
+        _record_stage(self.stage_timings, 'refinement', start)
+        return refined
+
+    def _find_fiducial_homography(self, undistorted_key_points):
+        """
+        Finds the homography from undistorted image coordinates, to
+        the reference image, using the 4 biggest dots as fiducials.
+
+        :param undistorted_key_points: Nx3 [size, x, y], N > 4, of dots
+            in the undistorted image
+        :return: 3x3 homography
+        """
+        number_of_undistorted_keypoints = undistorted_key_points.shape[0]
+
+        # Sort undistorted_key_points and pick biggest 4
+        sorted_points = undistorted_key_points[
+            undistorted_key_points[:, 0].argsort()]
+
+        biggest_four = np.zeros((4, 5))
+        counter = 0
+        for row_counter in range(number_of_undistorted_keypoints - 4,
+                                 number_of_undistorted_keypoints):
+            biggest_four[counter][0] = sorted_points[row_counter][1]
+            biggest_four[counter][1] = sorted_points[row_counter][2]
+            counter = counter + 1
+
+        LOGGER.debug('Biggest 4 points in undistorted image:%s',
+                     str(biggest_four))
+
+        # Labelling which points are below or to the right of the centroid,
+        # and assigning a score.
+        centroid = np.mean(biggest_four, axis=0)
+
+        for row_counter in range(4):
+            if biggest_four[row_counter][1] > centroid[1]:
+                biggest_four[row_counter][2] = 1
+            if biggest_four[row_counter][0] > centroid[0]:
+                biggest_four[row_counter][3] = 1
+
+        for row_counter in range(4):
+            biggest_four[row_counter][4] = \
+                biggest_four[row_counter][2] * 2 \
+                + biggest_four[row_counter][3]
+
+        # Then we sort by this score, so the fiducials are
+        # top left, top right, bottom left, bottom right.
+        sorted_fiducials = biggest_four[biggest_four[:, 4].argsort()]
+
+        # Find the homography between the distortion corrected points
+        # and the reference points, from an ideal face-on image.
+        homography, _ = \
+            cv2.findHomography(sorted_fiducials[:, 0:2],
+                               self.model_fiducials[:, 1:3])
+        return homography
+
+    def _match_to_model(self, warped_points, number_of_undistorted_keypoints):
+        """
+        Matches points in reference image coordinates to the nearest
+        model point, and computes the RMS error of the fit.
+
+        :param warped_points: Nx2 points, in reference image coordinates
+        :param number_of_undistorted_keypoints: number of dots found
+            in the undistorted image, used to normalise the RMS error
+        :return: N ids, Nx3 object points, Nx2 model pixel points, rms_error
+        """
+        best_ids, best_distances = \
+            find_nearest_points(warped_points, self.model_pixels)
+        best_model_points = self.model_points[best_ids]
+
+        # Compute total RMS error, to see if fit was good enough.
+        rms_error = np.sum(best_distances)
+        rms_error = rms_error / number_of_undistorted_keypoints
+        rms_error = np.sqrt(rms_error)
+
+        LOGGER.debug('Matching points to reference, RMS=%s', rms_error)
+
+        return best_model_points[:, 0], \
+            best_model_points[:, 3:6], \
+            best_model_points[:, 1:3], \
+            rms_error
+
+    def _detect_points(self, image, is_distorted, camera_intrinsics):
+        """
+        Extracts points, using the given camera intrinsics, which must
+        match the resolution of image.
+
+        :param image: numpy 2D grey scale image.
+        :param is_distorted: False if the input image has already been \
+             undistorted.
+        :param camera_intrinsics: 3x3 ndarray of camera intrinsics
+        :return: ids, object_points, image_points as Nx[1,3,2] ndarrays
+        """
 
         # pylint:disable=too-many-locals, invalid-name, too-many-branches
         # pylint:disable=too-many-statements
 
+        if self.dot_localiser == CONNECTED_COMPONENTS:
+            return self._detect_points_by_components(image,
+                                                     is_distorted,
+                                                     camera_intrinsics)
+
         # If we didn't find all points, of the fit was poor,
         # return a consistent set of 'nothing'
         default_return = np.zeros((0, 1)), np.zeros((0, 3)), np.zeros((0, 2))
 
+        timings = {}
+        self.stage_timings = timings
+        clock = time.perf_counter()
+
         smoothed = cv2.GaussianBlur(image,
                                     (self.gaussian_sigma, self.gaussian_sigma),
                                     0)
+        clock = _record_stage(timings, 'smoothing', clock)
 
         thresholded = cv2.adaptiveThreshold(smoothed,
                                             255,
@@ -154,18 +649,18 @@ class DottyGridPointDetector(PointDetector):
                                             cv2.THRESH_BINARY,
                                             self.threshold_window_size,
                                             self.threshold_offset)
+        clock = _record_stage(timings, 'thresholding', clock)
 
         # Detect points in the distorted image
-        detector = cv2.SimpleBlobDetector_create(self.dot_detector_params)
+        detector = self._blob_detector
         keypoints = detector.detect(thresholded)
+        clock = _record_stage(timings, 'blob_detection', clock)
 
         # If input image is distorted, undistort and also detect points
         # in undistorted image.
         if is_distorted:
-            undistorted_image = cv2.undistort(smoothed,
-                                              self.camera_intrinsics,
-                                              self.distortion_coefficients
-                                              )
+            undistorted_image = self._undistort(smoothed, camera_intrinsics)
+            clock = _record_stage(timings, 'undistortion', clock)
 
             undistorted_thresholded = \
                 cv2.adaptiveThreshold(undistorted_image,
@@ -174,8 +669,10 @@ class DottyGridPointDetector(PointDetector):
                                       cv2.THRESH_BINARY,
                                       self.threshold_window_size,
                                       self.threshold_offset)
+            clock = _record_stage(timings, 'thresholding', clock)
 
             undistorted_keypoints = detector.detect(undistorted_thresholded)
+            clock = _record_stage(timings, 'blob_detection', clock)
 
         else:
             undistorted_image = image
@@ -184,83 +681,23 @@ class DottyGridPointDetector(PointDetector):
         # Note that keypoints and undistorted_keypoints
         # can be of different length
         if len(keypoints) > 4 and len(undistorted_keypoints) > 4:
-            number_of_keypoints = len(keypoints)
             number_of_undistorted_keypoints = len(undistorted_keypoints)
 
-            # These are for intermediate storage.
-            key_points = \
-                np.zeros((number_of_keypoints, 3))
+            # Converting OpenCV keypoints to numpy [size, x, y]
             undistorted_key_points = \
-                np.zeros((number_of_undistorted_keypoints, 3))
-
-            # Converting OpenCV keypoints to numpy key_points
-            counter = 0
-            for key in keypoints:
-                key_points[counter][0] = key.size
-                key_points[counter][1] = key.pt[0]
-                key_points[counter][2] = key.pt[1]
-                counter = counter + 1
-            counter = 0
-            for key in undistorted_keypoints:
-                undistorted_key_points[counter][0] = key.size
-                undistorted_key_points[counter][1] = key.pt[0]
-                undistorted_key_points[counter][2] = key.pt[1]
-                counter = counter + 1
-
-            # Sort undistorted_key_points and pick biggest 4
-            sorted_points = undistorted_key_points[
-                undistorted_key_points[:, 0].argsort()]
-
-            biggest_four = np.zeros((4, 5))
-            counter = 0
-            for row_counter in range(number_of_undistorted_keypoints - 4,
-                                     number_of_undistorted_keypoints):
-                biggest_four[counter][0] = sorted_points[row_counter][1]
-                biggest_four[counter][1] = sorted_points[row_counter][2]
-                counter = counter + 1
-
-            LOGGER.debug('Biggest 4 points in undistorted image:%s',
-                         str(biggest_four))
-
-            # Labelling which points are below or to the right of the centroid,
-            # and assigning a score.
-            centroid = np.mean(biggest_four, axis=0)
-
-            for row_counter in range(4):
-                if biggest_four[row_counter][1] > centroid[1]:
-                    biggest_four[row_counter][2] = 1
-                if biggest_four[row_counter][0] > centroid[0]:
-                    biggest_four[row_counter][3] = 1
-
-            for row_counter in range(4):
-                biggest_four[row_counter][4] = \
-                    biggest_four[row_counter][2] * 2 \
-                    + biggest_four[row_counter][3]
-
-            # Then we sort by this score, so the fiducials are
-            # top left, top right, bottom left, bottom right.
-            sorted_fiducials = biggest_four[biggest_four[:, 4].argsort()]
-
-            # Find the homography between the distortion corrected points
-            # and the reference points, from an ideal face-on image.
-            homography, _ = \
-                cv2.findHomography(sorted_fiducials[:, 0:2],
-                                   self.model_fiducials[:, 1:3])
+                pdu.keypoints_to_array(undistorted_keypoints)
+
+            homography = self._find_fiducial_homography(undistorted_key_points)
 
             # Warp image to cannonical face on.
             warped = cv2.warpPerspective(undistorted_image,
                                          homography,
                                          self.reference_image_size)
+            clock = _record_stage(timings, 'warping', clock)
             warped_keypoints = detector.detect(warped)
+            clock = _record_stage(timings, 'blob_detection', clock)
             number_of_warped_keypoints = len(warped_keypoints)
-            warped_key_points = \
-                np.zeros((number_of_warped_keypoints, 3))
-            counter = 0
-            for key in warped_keypoints:
-                warped_key_points[counter][0] = key.size
-                warped_key_points[counter][1] = key.pt[0]
-                warped_key_points[counter][2] = key.pt[1]
-                counter = counter + 1
+            warped_key_points = pdu.keypoints_to_array(warped_keypoints)
             img_points = np.zeros((number_of_warped_keypoints, 2))
             object_points = np.zeros((number_of_warped_keypoints, 3))
             indexes = np.zeros((number_of_warped_keypoints, 1),
@@ -287,116 +724,112 @@ class DottyGridPointDetector(PointDetector):
                 cv2.perspectiveTransform(transformed_points,
                                          np.linalg.inv(homography))
 
-            # For each transformed point, find closest point in reference grid.
-            rms_error = 0
-            counter = 0
-            for transformed_point in transformed_points:
-                best_distance_so_far = np.finfo('d').max
-                best_id_so_far = -1
-                for model_point_counter in range(self.model_points.shape[0]):
-                    sq_dist = (self.model_points[model_point_counter][1]
-                               - transformed_point[0][0]) \
-                            * (self.model_points[model_point_counter][1]
-                               - transformed_point[0][0]) \
-                            + (self.model_points[model_point_counter][2]
-                               - transformed_point[0][1]) \
-                            * (self.model_points[model_point_counter][2]
-                               - transformed_point[0][1])
-
-                    if sq_dist < best_distance_so_far:
-                        best_id_so_far = model_point_counter
-                        best_distance_so_far = sq_dist
-
-                indexes[counter] = self.model_points[best_id_so_far][0]
-                object_points[counter][0] = self.model_points[best_id_so_far][3]
-                object_points[counter][1] = self.model_points[best_id_so_far][4]
-                object_points[counter][2] = self.model_points[best_id_so_far][5]
-                matched_points[counter][0] = \
-                    warped_key_points[counter][1]
-                matched_points[counter][1] = \
-                    warped_key_points[counter][2]
-                matched_points[counter][2] = \
-                    self.model_points[best_id_so_far][1]
-                matched_points[counter][3] = \
-                    self.model_points[best_id_so_far][2]
-                rms_error = rms_error + best_distance_so_far
-                counter = counter + 1
-
-            # Compute total RMS error, to see if fit was good enough.
-            rms_error = rms_error / number_of_undistorted_keypoints
-            rms_error = np.sqrt(rms_error)
-
-            LOGGER.debug('Matching points to reference, RMS=%s', rms_error)
+            indexes[:, 0], object_points[:, :], matched_points[:, 2:4], \
+                rms_error = self._match_to_model(
+                    transformed_points.reshape(-1, 2),
+                    number_of_undistorted_keypoints)
+            matched_points[:, 0:2] = warped_key_points[:, 1:3]
+            clock = _record_stage(timings, 'matching', clock)
 
             if rms_error > self.rms_tolerance:
                 LOGGER.warning('Matching points to reference, RMS too high')
                 return np.zeros((0, 1)), np.zeros((0, 3)), np.zeros((0, 2))
 
             # Now copy inverted points into matched_points
-            # pylint: disable=consider-using-enumerate
-            for counter in range(len(inverted_points)):
-                matched_points[counter][0] = inverted_points[counter][0][0]
-                matched_points[counter][1] = inverted_points[counter][0][1]
-                img_points[counter][0] = inverted_points[counter][0][0]
-                img_points[counter][1] = inverted_points[counter][0][1]
+            matched_points[:, 0:2] = inverted_points.reshape(-1, 2)
+            img_points[:, :] = inverted_points.reshape(-1, 2)
 
             if is_distorted:
                 # Input image was a distorted image, so now we have to map
                 # undistorted points back to distorted points.
-                for counter in range(number_of_warped_keypoints):
-                    # Distort point to match original input image.
-                    relative_x = (matched_points[counter][0]
-                                  - self.camera_intrinsics[0][2]) \
-                                 / self.camera_intrinsics[0][0]
-                    relative_y = (matched_points[counter][1]
-                                  - self.camera_intrinsics[1][2]) \
-                                 / self.camera_intrinsics[1][1]
-                    r2 = relative_x * relative_x + relative_y * relative_y
-                    radial = (1
-                              + self.distortion_coefficients[0] * r2
-                              + self.distortion_coefficients[1] * r2 * r2
-                              + self.distortion_coefficients[4] * r2 * r2 * r2
-                              )
-                    distorted_x = relative_x * radial
-                    distorted_y = relative_y * radial
-
-                    distorted_x = distorted_x + (
-                        2 * self.distortion_coefficients[2]
-                        * relative_x * relative_y
-                        + self.distortion_coefficients[3]
-                        * (r2 + 2
-                           * relative_x
-                           * relative_x))
-
-                    distorted_y = distorted_y + (
-                        self.distortion_coefficients[2]
-                        * (r2 + 2 * relative_y
-                           * relative_y)
-                        + 2 *
-                        self.distortion_coefficients[3]
-                        * relative_x * relative_y)
-
-                    distorted_x = distorted_x * self.camera_intrinsics[0][0] \
-                                  + self.camera_intrinsics[0][2]
-                    distorted_y = distorted_y * self.camera_intrinsics[1][1] \
-                                  + self.camera_intrinsics[1][2]
-
-                    img_points[counter][0] = distorted_x
-                    img_points[counter][1] = distorted_y
-
-            _, unique_idxs, counts = \
-                np.unique(indexes, return_index=True, return_counts=True)
-
-            unique_idxs = unique_idxs[counts == 1]
-
-            indexes = indexes[unique_idxs]
-            object_points = object_points[unique_idxs]
-            img_points = img_points[unique_idxs]
-
-            return indexes, object_points, img_points
+                img_points = pdu.distort_points(img_points,
+                                                camera_intrinsics,
+                                                self.distortion_coefficients)
+                _record_stage(timings, 'distortion', clock)
+
+            return _remove_duplicates(indexes, object_points, img_points)
 
         return default_return
 
+    def _detect_points_by_components(self,
+                                     image,
+                                     is_distorted,
+                                     camera_intrinsics):
+        """
+        As _detect_points(), but dots are localised once, with find_dots(),
+        and the dot centres, rather than the image, are undistorted and
+        warped to the reference image. Returned image points are the
+        measured dot centres, so are not resampled.
+        """
+        # pylint:disable=too-many-locals
+        default_return = np.zeros((0, 1)), np.zeros((0, 3)), np.zeros((0, 2))
+
+        timings = {}
+        self.stage_timings = timings
+        clock = time.perf_counter()
+
+        smoothed = cv2.GaussianBlur(image,
+                                    (self.gaussian_sigma, self.gaussian_sigma),
+                                    0)
+        clock = _record_stage(timings, 'smoothing', clock)
+
+        thresholded = cv2.adaptiveThreshold(smoothed,
+                                            255,
+                                            cv2.ADAPTIVE_THRESH_MEAN_C,
+                                            cv2.THRESH_BINARY,
+                                            self.threshold_window_size,
+                                            self.threshold_offset)
+        clock = _record_stage(timings, 'thresholding', clock)
+
+        params = self.dot_detector_params
+        dots = find_dots(thresholded,
+                         image,
+                         min_area=params.minArea if params.filterByArea else 0,
+                         max_area=params.maxArea if params.filterByArea
+                         else np.inf,
+                         min_inertia_ratio=params.minInertiaRatio
+                         if params.filterByInertia else 0.0)
+        clock = _record_stage(timings, 'dot_localisation', clock)
+
+        if dots.shape[0] <= 4:
+            return default_return
+
+        undistorted_key_points = dots.copy()
+        if is_distorted:
+            undistorted_key_points[:, 1:3] = cv2.undistortPointsIter(
+                dots[:, 1:3].reshape(-1, 1, 2),
+                camera_intrinsics,
+                self.distortion_coefficients,
+                np.eye(3),
+                camera_intrinsics,
+                (cv2.TERM_CRITERIA_COUNT | cv2.TERM_CRITERIA_EPS, 20, 1e-6)
+            ).reshape(-1, 2)
+            clock = _record_stage(timings, 'undistortion', clock)
+
+        homography = self._find_fiducial_homography(undistorted_key_points)
+        warped_points = cv2.perspectiveTransform(
+            undistorted_key_points[:, 1:3].reshape(-1, 1, 2),
+            homography).reshape(-1, 2)
+
+        # Only keep dots that would be inside the warped reference image.
+        inside = (warped_points[:, 0] >= 0) \
+            & (warped_points[:, 1] >= 0) \
+            & (warped_points[:, 0] < self.reference_image_size[0]) \
+            & (warped_points[:, 1] < self.reference_image_size[1])
+        clock = _record_stage(timings, 'warping', clock)
+
+        indexes, object_points, _, rms_error = \
+            self._match_to_model(warped_points[inside], dots.shape[0])
+        _record_stage(timings, 'matching', clock)
+
+        if rms_error > self.rms_tolerance:
+            LOGGER.warning('Matching points to reference, RMS too high')
+            return default_return
+
+        return _remove_duplicates(indexes.astype(np.int16).reshape(-1, 1),
+                                  object_points,
+                                  dots[inside, 1:3])
+
     def get_model_points(self):
         """
         If you look in base class, this is expected to return Dict[int, np.ndarray]
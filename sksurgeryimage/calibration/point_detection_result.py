@@ -0,0 +1,105 @@
+# coding=utf-8
+
+"""
+Compact, consistently typed storage for the output of a PointDetector.
+"""
+
+from typing import List, Tuple
+import numpy as np
+
+# Object points, then image points, stored in one float32 buffer.
+_OBJECT_POINT_SIZE = 3
+_IMAGE_POINT_SIZE = 2
+
+
+class PointDetectionResult:
+    """
+    Points detected in one image, with int32 ids, and float32 object
+    and image points stored back to back in one contiguous array, so
+    object_points and image_points are C-contiguous views, that OpenCV
+    functions, e.g. cv2.calibrateCamera, accept without copying.
+
+    :param ids: N or Nx1 ids
+    :param object_points: Nx3 object points
+    :param image_points: Nx2 image points, or N x 1 x 2
+    """
+    __slots__ = ('ids', '_points')
+
+    def __init__(self,
+                 ids: np.ndarray,
+                 object_points: np.ndarray,
+                 image_points: np.ndarray):
+        ids = np.asarray(ids).reshape(-1)
+        number_of_points = ids.shape[0]
+        object_points = np.asarray(object_points)
+        image_points = np.asarray(image_points)
+        if object_points.size != number_of_points * _OBJECT_POINT_SIZE:
+            raise ValueError("object_points should be Nx3, "
+                             f"for {number_of_points} ids")
+        if image_points.size != number_of_points * _IMAGE_POINT_SIZE:
+            raise ValueError("image_points should be Nx2, "
+                             f"for {number_of_points} ids")
+
+        self.ids = ids.astype(np.int32)
+        self._points = np.empty(
+            number_of_points * (_OBJECT_POINT_SIZE + _IMAGE_POINT_SIZE),
+            dtype=np.float32)
+        self.object_points[:] = object_points.reshape(-1, _OBJECT_POINT_SIZE)
+        self.image_points[:] = image_points.reshape(-1, _IMAGE_POINT_SIZE)
+
+    @property
+    def object_points(self) -> np.ndarray:
+        """
+        Nx3 float32 object points, a view of the underlying array.
+        """
+        end = len(self) * _OBJECT_POINT_SIZE
+        return self._points[:end].reshape(-1, _OBJECT_POINT_SIZE)
+
+    @property
+    def image_points(self) -> np.ndarray:
+        """
+        Nx2 float32 image points, a view of the underlying array.
+        """
+        start = len(self) * _OBJECT_POINT_SIZE
+        return self._points[start:].reshape(-1, _IMAGE_POINT_SIZE)
+
+    def __len__(self) -> int:
+        return self.ids.shape[0]
+
+    def __repr__(self) -> str:
+        return f"PointDetectionResult(number_of_points={len(self)})"
+
+    def __getstate__(self):
+        return self.ids, self._points
+
+    def __setstate__(self, state):
+        self.ids, self._points = state
+
+    def get_points(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns the same layout as PointDetector.get_points(),
+        but with int32 ids and float32 points.
+
+        :return: ids, object_points, image_points as Nx[1,3,2] ndarrays
+        """
+        return self.ids.reshape(-1, 1), self.object_points, self.image_points
+
+
+def get_calibration_inputs(results: List[PointDetectionResult],
+                           minimum_number_of_points: int=1) \
+        -> Tuple[List[np.ndarray], List[np.ndarray]]:
+    """
+    Returns lists of object points and image points, for
+    cv2.calibrateCamera and similar, as views, so nothing is copied.
+
+    :param results: list of PointDetectionResult, one per view
+    :param minimum_number_of_points: views with fewer points are skipped
+    :return: list of Nx3 object points, list of Nx2 image points
+    """
+    object_points = []
+    image_points = []
+    for result in results:
+        if len(result) >= minimum_number_of_points:
+            object_points.append(result.object_points)
+            image_points.append(result.image_points)
+    return object_points, image_points
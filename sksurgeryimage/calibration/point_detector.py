@@ -11,9 +11,28 @@ import copy
 from typing import Tuple
 import cv2
 import numpy as np
+from sksurgeryimage.calibration.point_detection_result \
+    import PointDetectionResult
+import sksurgeryimage.utilities.instrumentation as si
 
 LOGGER = logging.getLogger(__name__)
 
+#: Criteria for cv2.cornerSubPix, when refining coarse points.
+REFINEMENT_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER,
+                       30,
+                       0.001)
+
+#: Largest refinement half window computed from pyramid_scale, so a very
+#: small pyramid_scale does not give a window spanning many points.
+MAX_DEFAULT_REFINEMENT_HALF_WINDOW = 11
+
+#: Minimum margin, in pixels, added around a tracked target.
+TRACKING_MIN_MARGIN = 32
+
+#: If fewer than this fraction of the points of the last search of the
+#: whole image are found in the tracked ROI, the whole image is searched.
+TRACKING_MIN_POINTS_FRACTION = 0.5
+
 
 def _validate_camera_parameters(camera_intrinsics,
                                 distortion_coefficients):
@@ -37,6 +56,7 @@ def _validate_camera_parameters(camera_intrinsics,
         raise ValueError('distortion_coefficients does not have 1 row')
 
 
+# pylint: disable=too-many-instance-attributes
 class PointDetector:
     """
     Class to detect points in a 2D video image.
@@ -50,17 +70,70 @@ class PointDetector:
     See get_model_points() for how to return the 3D points, as Dict[int, np.ndarray(1,3)].
     Derived classes must assign self.model_points in their constructor.
 
+    Setting pyramid_scale enables a coarse-to-fine mode. Detection runs
+    on an image downsampled by pyramid_scale, and then each detected point
+    is refined at full resolution, by _refine_points(), looking only at a
+    small window around the point. By default, this uses cv2.cornerSubPix,
+    which suits corner based detectors. Derived classes can override
+    _refine_points() and _internal_get_coarse_points() as needed.
+
+    Setting tracking=True enables a region of interest (ROI) tracking mode,
+    for video. After a successful detection, the bounding box of the
+    detected points, enlarged by tracking_margin, is used as the search
+    region for the next frame, and points are shifted back into full image
+    coordinates. If nothing, or fewer than TRACKING_MIN_POINTS_FRACTION of
+    the points found by the last search of the whole image, is found in
+    the ROI, e.g. as the target is leaving the ROI, the same frame is
+    searched in full, and tracking restarts from that result. This assumes
+    _internal_get_points() does not depend on absolute pixel position.
+
+    get_config() and from_config() export and rebuild a detector from a
+    lightweight dict, which is also how detectors are pickled, e.g. when
+    sent to worker processes. Derived classes override get_config(), and
+    include anything expensive to compute, e.g. model points, so that
+    from_config() can skip that work.
+
     :param scale: tuple (x scale, y scale) to scale up/down the image
     :param camera_intrinsics: [3x3] camera matrix
     :param distortion_coefficients: [1xn] distortion coefficients
+    :param pyramid_scale: if not None, factor in (0, 1) for coarse detection
+    :param refinement_half_window: half size in pixels of the window used
+        to refine each coarse point at full resolution. If None, this is
+        computed from pyramid_scale, up to MAX_DEFAULT_REFINEMENT_HALF_WINDOW.
+    :param tracking: if True, search near the previous detection first
+    :param tracking_margin: fraction of the previous bounding box size, to
+        add on each side, when predicting the next ROI
     """
+    # pylint: disable=too-many-arguments
     def __init__(self,
                  scale: Tuple[float, float]=(1, 1),
                  camera_intrinsics: np.ndarray=None,
-                 distortion_coefficients: np.ndarray=None):
+                 distortion_coefficients: np.ndarray=None,
+                 pyramid_scale: float=None,
+                 refinement_half_window: int=None,
+                 tracking: bool=False,
+                 tracking_margin: float=0.5):
 
         self.scale = scale
         self.scale_x, self.scale_y = scale
+        if pyramid_scale is not None and not 0 < pyramid_scale < 1:
+            raise ValueError("pyramid_scale should be between 0 and 1")
+        if refinement_half_window is not None and refinement_half_window < 1:
+            raise ValueError("refinement_half_window should be >= 1")
+        self.pyramid_scale = pyramid_scale
+        self.refinement_half_window = refinement_half_window
+        if pyramid_scale is not None and refinement_half_window is None:
+            # Covers a few pixels of error at the coarse level.
+            self.refinement_half_window = \
+                min(int(np.ceil(2.0 / pyramid_scale)),
+                    MAX_DEFAULT_REFINEMENT_HALF_WINDOW)
+        if tracking_margin < 0:
+            raise ValueError("tracking_margin should be >= 0")
+        self.tracking = tracking
+        self.tracking_margin = tracking_margin
+        self.tracked_roi = None
+        self.tracked_image_shape = None
+        self.tracked_number_of_points = 0
         self.camera_intrinsics = None
         self.distortion_coefficients = None
         self.model_points = None # But MUST be assigned in derived class.
@@ -104,6 +177,40 @@ class PointDetector:
         tmp_dc = copy.deepcopy(self.distortion_coefficients)
         return tmp_ci, tmp_dc
 
+    def get_config(self) -> dict:
+        """
+        Returns the constructor arguments, as a dict containing only
+        Python types and numpy arrays. Transient state, such as the
+        tracked ROI, is not included.
+
+        :return: dict, which from_config() can use to rebuild this detector
+        """
+        return {'scale': tuple(self.scale),
+                'camera_intrinsics': copy.deepcopy(self.camera_intrinsics),
+                'distortion_coefficients':
+                    copy.deepcopy(self.distortion_coefficients),
+                'pyramid_scale': self.pyramid_scale,
+                'refinement_half_window': self.refinement_half_window,
+                'tracking': self.tracking,
+                'tracking_margin': self.tracking_margin}
+
+    @classmethod
+    def from_config(cls, config: dict):
+        """
+        Creates a detector from the output of get_config().
+
+        :param config: dict from get_config()
+        :return: new detector
+        """
+        return cls(**config)
+
+    def __reduce__(self):
+        """
+        Pickles via get_config(), as some derived classes contain
+        OpenCV objects that cannot be pickled directly.
+        """
+        return self.__class__.from_config, (self.get_config(),)
+
     def get_points(self, image: np.ndarray, is_distorted:bool=True) \
             -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
         """
@@ -120,23 +227,31 @@ class PointDetector:
         if not isinstance(image, np.ndarray):
             raise TypeError('image is not an ndarray')
 
-        grey = image
-        if len(image.shape) > 2:
-            if image.shape[2] == 3:
-                grey = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            elif image.shape[2] == 4:
-                grey = cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY)
-
-        is_resized = False
-        if self.scale_x != 1 or self.scale_y != 1:
-            resized = cv2.resize(grey, None, fx=self.scale_x, fy=self.scale_y,
-                                 interpolation=cv2.INTER_LINEAR)
-            is_resized = True
-        else:
-            resized = grey
+        with si.stage('point_detector.preprocess'):
+            grey = image
+            if len(image.shape) > 2:
+                if image.shape[2] == 3:
+                    grey = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+                elif image.shape[2] == 4:
+                    grey = cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY)
 
-        ids, object_points, image_points = \
-            self._internal_get_points(resized, is_distorted=is_distorted)
+            is_resized = False
+            if self.scale_x != 1 or self.scale_y != 1:
+                resized = cv2.resize(grey, None,
+                                     fx=self.scale_x, fy=self.scale_y,
+                                     interpolation=cv2.INTER_LINEAR)
+                is_resized = True
+            else:
+                resized = grey
+
+        with si.stage('point_detector.detect'):
+            if self.tracking:
+                ids, object_points, image_points = \
+                    self._get_points_tracked(resized,
+                                             is_distorted=is_distorted)
+            else:
+                ids, object_points, image_points = \
+                    self._detect(resized, is_distorted=is_distorted)
 
         if is_resized:
             image_points[:, 0] /= self.scale_x
@@ -144,6 +259,158 @@ class PointDetector:
 
         return ids, object_points, image_points
 
+    def get_result(self, image: np.ndarray, is_distorted: bool=True) \
+            -> PointDetectionResult:
+        """
+        As get_points(), but returns a PointDetectionResult, with int32
+        ids and float32 points, whichever detector is used, e.g. to
+        accumulate many views for calibration.
+
+        :param image: numpy 2D RGB/grayscale image.
+        :param is_distorted: False if the input image has already been \
+             undistorted.
+        :return: PointDetectionResult
+        """
+        return PointDetectionResult(*self.get_points(image,
+                                                     is_distorted=is_distorted))
+
+    def reset_tracking(self):
+        """
+        Forgets the tracked ROI, so the next frame is searched in full.
+        """
+        self.tracked_roi = None
+        self.tracked_image_shape = None
+        self.tracked_number_of_points = 0
+
+    def _detect(self, image: np.ndarray, is_distorted: bool=True):
+        """
+        Runs detection on the whole of image, either directly, or coarse
+        to fine, if pyramid_scale is set.
+
+        :param image: numpy 2D grey scale image.
+        :param is_distorted: passed to _internal_get_points().
+        :return: ids, object_points, image_points as Nx[1,3,2] ndarrays
+        """
+        if self.pyramid_scale is not None:
+            return self._get_points_coarse_to_fine(image,
+                                                   is_distorted=is_distorted)
+        return self._internal_get_points(image, is_distorted=is_distorted)
+
+    def _get_points_tracked(self, image: np.ndarray, is_distorted: bool=True):
+        """
+        Searches the tracked ROI, if there is one, falling back to
+        the whole image, if too few points are found in the ROI,
+        and then updates the tracked ROI.
+
+        :param image: numpy 2D grey scale image.
+        :param is_distorted: passed to _internal_get_points().
+        :return: ids, object_points, image_points as Nx[1,3,2] ndarrays
+        """
+        if self.tracked_roi is not None \
+                and self.tracked_image_shape == image.shape[0:2]:
+            min_x, min_y, max_x, max_y = self.tracked_roi
+            ids, object_points, image_points = \
+                self._detect(image[min_y:max_y, min_x:max_x],
+                             is_distorted=is_distorted)
+            if image_points.shape[0] > 0 and image_points.shape[0] \
+                    >= TRACKING_MIN_POINTS_FRACTION \
+                    * self.tracked_number_of_points:
+                image_points = image_points.reshape(-1, 2) + (min_x, min_y)
+                self._update_tracked_roi(image, image_points)
+                return ids, object_points, image_points
+            LOGGER.debug("Found %s of %s points in tracked ROI, "
+                         "searching all.", image_points.shape[0],
+                         self.tracked_number_of_points)
+
+        ids, object_points, image_points = \
+            self._detect(image, is_distorted=is_distorted)
+        self._update_tracked_roi(image, image_points)
+        self.tracked_number_of_points = image_points.shape[0]
+        return ids, object_points, image_points
+
+    def _update_tracked_roi(self, image: np.ndarray, image_points: np.ndarray):
+        """
+        Predicts the next ROI, as the bounding box of image_points,
+        enlarged by tracking_margin, and clipped to the image.
+        """
+        if image_points.shape[0] == 0:
+            self.reset_tracking()
+            return
+        points = image_points.reshape(-1, 2)
+        lower = points.min(axis=0)
+        upper = points.max(axis=0)
+        margin = np.maximum((upper - lower) * self.tracking_margin,
+                            TRACKING_MIN_MARGIN)
+        height, width = image.shape[0:2]
+        min_x, min_y = np.maximum(np.floor(lower - margin), 0).astype(int)
+        max_x, max_y = np.minimum(np.ceil(upper + margin) + 1,
+                                  (width, height)).astype(int)
+        self.tracked_roi = (int(min_x), int(min_y), int(max_x), int(max_y))
+        self.tracked_image_shape = image.shape[0:2]
+
+    def _get_points_coarse_to_fine(self,
+                                   image: np.ndarray,
+                                   is_distorted: bool=True):
+        """
+        Detects points on a downsampled copy of image, maps them back
+        to the coordinates of image, and refines them at full resolution.
+
+        :param image: numpy 2D grey scale image.
+        :param is_distorted: passed to _internal_get_coarse_points().
+        :return: ids, object_points, image_points as Nx[1,3,2] ndarrays
+        """
+        coarse = cv2.resize(image, None,
+                            fx=self.pyramid_scale, fy=self.pyramid_scale,
+                            interpolation=cv2.INTER_AREA)
+
+        ids, object_points, coarse_points = \
+            self._internal_get_coarse_points(coarse, is_distorted=is_distorted)
+
+        if coarse_points.shape[0] == 0:
+            return ids, object_points, coarse_points
+
+        # Map from coarse pixel centres to full resolution pixel centres.
+        image_points = (coarse_points.reshape(-1, 2) + 0.5) \
+            / self.pyramid_scale - 0.5
+
+        image_points = self._refine_points(image, image_points)
+
+        return ids, object_points, image_points
+
+    def _internal_get_coarse_points(self,
+                                    image: np.ndarray,
+                                    is_distorted: bool=True):
+        """
+        Detects points in the downsampled image, when using pyramid_scale.
+        By default, calls _internal_get_points(). Derived classes that use
+        resolution dependent data, e.g. camera intrinsics, can override this.
+
+        :param image: numpy 2D grey scale image, downsampled by pyramid_scale.
+        :param is_distorted: False if the input image has already been \
+                undistorted.
+        :return: ids, object_points, image_points as Nx[1,3,2] ndarrays
+        """
+        return self._internal_get_points(image, is_distorted=is_distorted)
+
+    def _refine_points(self, image: np.ndarray, image_points: np.ndarray):
+        """
+        Refines approximate points at full resolution. By default, uses
+        cv2.cornerSubPix, within refinement_half_window pixels of each point.
+
+        :param image: numpy 2D grey scale image, at full resolution.
+        :param image_points: Nx2 approximate points, in image coordinates.
+        :return: Nx2 refined points
+        """
+        corners = np.ascontiguousarray(image_points,
+                                       dtype=np.float32).reshape(-1, 1, 2)
+        half_window = self.refinement_half_window
+        cv2.cornerSubPix(image,
+                         corners,
+                         (half_window, half_window),
+                         (-1, -1),
+                         REFINEMENT_CRITERIA)
+        return corners.reshape(-1, 2)
+
     def _internal_get_points(self, image: np.ndarray, is_distorted: bool=True):
         """
         Derived classes override this one.
@@ -0,0 +1,177 @@
+# coding=utf-8
+
+"""
+Functions to run a PointDetector over many frames, using a process pool.
+
+The Python parts of the detectors hold the GIL, so processes, not threads,
+are used. Each worker builds its own detector once, either by unpickling
+the detector passed in, or by calling a factory function, e.g. a
+module level function, or functools.partial, that returns a detector.
+Detectors pickle via PointDetector.get_config(), so unpickling does not
+repeat expensive setup, such as detecting a reference image.
+
+Each worker sees an arbitrary subset of the frames, so ROI tracking,
+see PointDetector, is turned off in the workers' detectors, and every
+frame is searched in full. With one worker, frames are processed in
+order, in this process, so tracking is left as it is.
+"""
+
+import collections
+import concurrent.futures
+import logging
+import os
+import time
+import cv2
+import sksurgerycore.utilities.validate_file as vf
+from sksurgeryimage.calibration.point_detector import PointDetector
+
+LOGGER = logging.getLogger(__name__)
+
+# Each worker process holds one detector, created by _initialise_worker.
+_WORKER_DETECTOR = None
+
+
+def _initialise_worker(detector_or_factory):
+    """
+    Creates the detector for this worker process, with tracking turned
+    off, as consecutive frames go to different workers, and stops OpenCV
+    from creating its own threads, as we are already running in parallel.
+    """
+    # pylint: disable=global-statement
+    global _WORKER_DETECTOR
+    cv2.setNumThreads(1)
+    _WORKER_DETECTOR = _create_detector(detector_or_factory)
+    if _WORKER_DETECTOR.tracking:
+        LOGGER.debug("Turning off tracking in worker process.")
+        _WORKER_DETECTOR.tracking = False
+        _WORKER_DETECTOR.reset_tracking()
+
+
+def _create_detector(detector_or_factory):
+    """
+    Returns detector_or_factory if it is a PointDetector,
+    otherwise calls it, to create one.
+    """
+    if isinstance(detector_or_factory, PointDetector):
+        return detector_or_factory
+    if callable(detector_or_factory):
+        detector = detector_or_factory()
+        if not isinstance(detector, PointDetector):
+            raise TypeError("factory did not return a PointDetector")
+        return detector
+    raise TypeError("detector_or_factory should be a PointDetector, "
+                    "or a callable that returns a PointDetector")
+
+
+def _timed_get_points(detector, frame, is_distorted):
+    """
+    Calls detector.get_points(), and times it.
+
+    :return: ids, object_points, image_points, seconds
+    """
+    start = time.perf_counter()
+    ids, object_points, image_points = \
+        detector.get_points(frame, is_distorted=is_distorted)
+    return ids, object_points, image_points, time.perf_counter() - start
+
+
+def _worker_get_points(frame, is_distorted):
+    """
+    Runs the worker's detector on one frame.
+    """
+    return _timed_get_points(_WORKER_DETECTOR, frame, is_distorted)
+
+
+def read_video_frames(file_name):
+    """
+    Generator, yielding each frame of a video file.
+
+    :param file_name: path to a video file, readable by cv2.VideoCapture
+    """
+    vf.validate_is_file(file_name)
+    source = cv2.VideoCapture(file_name)
+    if not source.isOpened():
+        raise RuntimeError(f"Failed to open video file:{file_name}")
+    try:
+        while True:
+            ret, frame = source.read()
+            if not ret:
+                break
+            yield frame
+    finally:
+        source.release()
+
+
+def iterate_points_batch(detector_or_factory,
+                         frames,
+                         is_distorted=True,
+                         number_of_workers=None,
+                         max_pending=None):
+    """
+    Generator, detecting points in each frame, and yielding results
+    in the same order as frames. Frames are read lazily, and at most
+    max_pending frames are in flight, so long videos are not held in memory.
+
+    :param detector_or_factory: a PointDetector, or a picklable
+        callable that takes no arguments and returns a PointDetector
+    :param frames: list or iterator of images, or a video file name
+    :param is_distorted: passed to get_points()
+    :param number_of_workers: number of processes, defaults to os.cpu_count().
+        If 1, runs in this process, with no pool. Otherwise, tracking is
+        turned off in the workers' detectors.
+    :param max_pending: max frames queued, defaults to 2 * number_of_workers
+    :return: yields ids, object_points, image_points, seconds per frame
+    """
+    if isinstance(frames, str):
+        frames = read_video_frames(frames)
+
+    if number_of_workers is None:
+        number_of_workers = os.cpu_count() or 1
+    if number_of_workers < 1:
+        raise ValueError("number_of_workers should be >= 1")
+
+    if number_of_workers == 1:
+        detector = _create_detector(detector_or_factory)
+        for frame in frames:
+            yield _timed_get_points(detector, frame, is_distorted)
+        return
+
+    if max_pending is None:
+        max_pending = 2 * number_of_workers
+    if max_pending < 1:
+        raise ValueError("max_pending should be >= 1")
+
+    LOGGER.info("Detecting points with %s processes.", number_of_workers)
+
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=number_of_workers,
+            initializer=_initialise_worker,
+            initargs=(detector_or_factory,)) as executor:
+        pending = collections.deque()
+        for frame in frames:
+            pending.append(executor.submit(_worker_get_points,
+                                           frame,
+                                           is_distorted))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def get_points_batch(detector_or_factory,
+                     frames,
+                     is_distorted=True,
+                     number_of_workers=None,
+                     max_pending=None):
+    """
+    Detects points in all frames, using a process pool.
+    See iterate_points_batch().
+
+    :return: list of (ids, object_points, image_points, seconds),
+        in the same order as frames
+    """
+    return list(iterate_points_batch(detector_or_factory,
+                                     frames,
+                                     is_distorted=is_distorted,
+                                     number_of_workers=number_of_workers,
+                                     max_pending=max_pending))
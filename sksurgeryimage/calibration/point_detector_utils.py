@@ -52,14 +52,136 @@ def get_intersect(a_1, a_2, b_1, b_2):
     :param b_1: [x, y] a point on the second line
     :param b_2: [x, y] another point on the second line
     """
-    stacked = np.vstack([a_1, a_2, b_1, b_2])
-    homogenous = np.hstack((stacked, np.ones((4, 1))))
-    line_1 = np.cross(homogenous[0], homogenous[1])
-    line_2 = np.cross(homogenous[2], homogenous[3])
-    p_x, p_y, p_z = np.cross(line_1, line_2)
-    if p_z == 0:  # lines are parallel
-        return float('inf'), float('inf')
-    return p_x/p_z, p_y/p_z
+    p_x, p_y = get_intersects(np.reshape(a_1, (1, 2)),
+                              np.reshape(a_2, (1, 2)),
+                              np.reshape(b_1, (1, 2)),
+                              np.reshape(b_2, (1, 2)))[0]
+    return p_x, p_y
+
+
+def get_intersects(a_1, a_2, b_1, b_2):
+    """
+    Vectorised get_intersect(), for N pairs of lines at once.
+
+    :param a_1: Nx2 points on the first lines
+    :param a_2: Nx2 other points on the first lines
+    :param b_1: Nx2 points on the second lines
+    :param b_2: Nx2 other points on the second lines
+    :return: Nx2 intersections, inf where lines are parallel
+    """
+    ones = np.ones((np.shape(a_1)[0], 1))
+    line_1 = np.cross(np.hstack((a_1, ones)), np.hstack((a_2, ones)))
+    line_2 = np.cross(np.hstack((b_1, ones)), np.hstack((b_2, ones)))
+    points = np.cross(line_1, line_2)
+    intersects = np.full((points.shape[0], 2), float('inf'))
+    not_parallel = points[:, 2] != 0
+    intersects[not_parallel] = points[not_parallel, 0:2] \
+        / points[not_parallel, 2:3]
+    return intersects
+
+
+def keypoints_to_array(keypoints) -> np.ndarray:
+    """
+    Converts a list of cv2.KeyPoint to an Nx3 array of [size, x, y],
+    in bulk, using cv2.KeyPoint_convert, rather than per key point.
+
+    :param keypoints: list or tuple of cv2.KeyPoint, e.g. from a
+        cv2.SimpleBlobDetector
+    :return: Nx3 array
+    """
+    number_of_keypoints = len(keypoints)
+    result = np.empty((number_of_keypoints, 3))
+    if number_of_keypoints > 0:
+        result[:, 0] = np.fromiter((keypoint.size for keypoint in keypoints),
+                                   dtype=np.float64,
+                                   count=number_of_keypoints)
+        result[:, 1:3] = cv2.KeyPoint_convert(keypoints)
+    return result
+
+
+def scale_camera_matrix(camera_matrix, factor: float) -> np.ndarray:
+    """
+    Returns camera_matrix, for the image resized by factor, e.g. the
+    downsampled image in pyramid mode, mapping pixel centres to pixel
+    centres, as cv2.resize does.
+
+    :param camera_matrix: 3x3 camera intrinsic matrix
+    :param factor: resize factor, e.g. pyramid_scale
+    :return: 3x3 float64 camera intrinsic matrix
+    """
+    scaled = np.array(camera_matrix, dtype=np.float64)
+    scaled[0][0] *= factor
+    scaled[1][1] *= factor
+    scaled[0][2] = (scaled[0][2] + 0.5) * factor - 0.5
+    scaled[1][2] = (scaled[1][2] + 0.5) * factor - 0.5
+    return scaled
+
+
+def distort_points(points, camera_matrix, distortion_coefficients):
+    """
+    Applies lens distortion to undistorted pixel coordinates, i.e. the
+    inverse of cv2.undistortPoints(), using cv2.projectPoints() with an
+    identity pose, so all OpenCV distortion models are supported,
+    e.g. 4, 5, 8, 12 or 14 coefficients.
+
+    :param points: Nx2 undistorted pixel coordinates
+    :param camera_matrix: 3x3 camera intrinsic matrix
+    :param distortion_coefficients: OpenCV distortion coefficients
+    :return: Nx2 distorted pixel coordinates
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if points.shape[0] == 0:
+        return points.copy()
+    camera_matrix = np.asarray(camera_matrix, dtype=np.float64)
+    normalised = np.ones((points.shape[0], 3))
+    normalised[:, 0] = (points[:, 0] - camera_matrix[0][2]) / camera_matrix[0][0]
+    normalised[:, 1] = (points[:, 1] - camera_matrix[1][2]) / camera_matrix[1][1]
+    distorted, _ = cv2.projectPoints(normalised,
+                                     np.zeros(3),
+                                     np.zeros(3),
+                                     camera_matrix,
+                                     np.asarray(distortion_coefficients,
+                                                dtype=np.float64))
+    return distorted.reshape(-1, 2)
+
+
+def create_dense_model(model: dict):
+    """
+    Converts a model, a dict of {id: 3D point}, to arrays indexed by id,
+    so that looking up many ids is one numpy indexing operation.
+
+    :param model: dict of {id: 3D point}, ids must be non-negative
+    :return: is_in_model, a bool array, true for each id in the model, and
+        dense_points, a float array of 3D points, both of length max id + 1
+    """
+    ids = np.array([int(idx) for idx in model.keys()], dtype=np.int64)
+    if np.any(ids < 0):
+        raise ValueError("Model ids must be non-negative.")
+    length = int(np.max(ids)) + 1 if ids.size > 0 else 0
+    is_in_model = np.zeros(length, dtype=bool)
+    dense_points = np.zeros((length, 3))
+    is_in_model[ids] = True
+    if ids.size > 0:
+        dense_points[ids] = np.array(
+            [np.reshape(point, 3) for point in model.values()])
+    return is_in_model, dense_points
+
+
+def get_model_mask(ids: np.ndarray, is_in_model: np.ndarray) -> np.ndarray:
+    """
+    Returns a mask of which ids are in a model, from create_dense_model().
+
+    :param ids: Nx1 or N ndarray of ids, or None
+    :param is_in_model: bool array from create_dense_model()
+    :return: bool array of length N
+    """
+    if ids is None:
+        return np.zeros(0, dtype=bool)
+    ids = np.reshape(ids, -1)
+    in_range = (ids >= 0) & (ids < is_in_model.shape[0])
+    mask = np.zeros(ids.shape[0], dtype=bool)
+    mask[in_range] = is_in_model[ids[in_range]]
+    return mask
 
 
 def get_number_of_points(ids: np.ndarray,
@@ -68,8 +190,87 @@ def get_number_of_points(ids: np.ndarray,
     """
     Counts how many ids in ids (Nx1 ndarray), are in the model (dict of {id: 3D point},
     """
-    number_of_points = 0
-    for i in range(ids.shape[0]):
-        if ids[i][0] in model:
-            number_of_points += 1
-    return number_of_points
+    if ids is None or len(model) == 0:
+        return 0
+    model_ids = np.fromiter(model.keys(), dtype=np.int64, count=len(model))
+    return int(np.count_nonzero(np.isin(np.reshape(ids, -1), model_ids)))
+
+
+def aruco_dictionary_to_config(dictionary: cv2.aruco.Dictionary) -> dict:
+    """
+    Converts an aruco dictionary, which cannot be pickled, to a dict.
+
+    :param dictionary: aruco dictionary, or None
+    :return: dict of bytes_list, marker_size, max_correction_bits, or None
+    """
+    if dictionary is None:
+        return None
+    return {'bytes_list': np.array(dictionary.bytesList),
+            'marker_size': int(dictionary.markerSize),
+            'max_correction_bits': int(dictionary.maxCorrectionBits)}
+
+
+def aruco_dictionary_from_config(config: dict) -> cv2.aruco.Dictionary:
+    """
+    Inverse of aruco_dictionary_to_config().
+
+    :param config: dict of bytes_list, marker_size, max_correction_bits, or None
+    :return: aruco dictionary, or None
+    """
+    if config is None:
+        return None
+    return cv2.aruco.Dictionary(np.array(config['bytes_list'], dtype=np.uint8),
+                                config['marker_size'],
+                                config['max_correction_bits'])
+
+
+def opencv_parameters_to_config(parameters) -> dict:
+    """
+    Converts an OpenCV parameters object, e.g. cv2.aruco.DetectorParameters
+    or cv2.SimpleBlobDetector_Params, which cannot be pickled, to a dict
+    of its public attributes.
+
+    :param parameters: OpenCV parameters object, or None
+    :return: dict of attribute name: value, or None
+    """
+    if parameters is None:
+        return None
+    config = {}
+    for name in dir(parameters):
+        if name.startswith('_'):
+            continue
+        value = getattr(parameters, name)
+        if not callable(value):
+            config[name] = value
+    return config
+
+
+def opencv_parameters_from_config(parameters_type, config: dict):
+    """
+    Inverse of opencv_parameters_to_config().
+
+    :param parameters_type: e.g. cv2.aruco.DetectorParameters
+    :param config: dict of attribute name: value, or None
+    :return: new instance of parameters_type, or None
+    """
+    if config is None:
+        return None
+    parameters = parameters_type()
+    for name, value in config.items():
+        setattr(parameters, name, value)
+    return parameters
+
+
+def aruco_objects_from_config(config: dict) -> dict:
+    """
+    Returns a copy of a detector config, with the 'dictionary' and
+    'parameters' entries converted back to OpenCV aruco objects.
+
+    :param config: dict, from a detector's get_config()
+    :return: dict, suitable for passing to the detector's constructor
+    """
+    config = dict(config)
+    config['dictionary'] = aruco_dictionary_from_config(config['dictionary'])
+    config['parameters'] = opencv_parameters_from_config(
+        cv2.aruco.DetectorParameters, config['parameters'])
+    return config
@@ -0,0 +1,257 @@
+# coding=utf-8
+
+"""
+Functions to measure the reprojection error of PointDetector outputs,
+for many frames at once, given a camera model.
+
+Points from all frames are concatenated, with a frame index per point,
+so projection and error computation are single numpy and OpenCV calls,
+rather than a loop over frames. Only estimating poses, if they are not
+provided, calls cv2.solvePnP once per frame.
+"""
+
+from typing import List, Tuple
+import cv2
+import numpy as np
+from sksurgeryimage.calibration.point_detection_result \
+    import PointDetectionResult
+
+# pylint: disable=too-many-arguments
+
+
+def concatenate_results(results: List) \
+        -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Concatenates the points of many frames.
+
+    :param results: list of PointDetectionResult, or of
+        (ids, object_points, image_points), one per frame
+    :return: frame_indexes (N), object_points (Nx3), image_points (Nx2)
+    """
+    object_points = []
+    image_points = []
+    counts = np.zeros(len(results), dtype=np.int64)
+    for index, result in enumerate(results):
+        if not isinstance(result, PointDetectionResult):
+            result = PointDetectionResult(*result[0:3])
+        object_points.append(result.object_points)
+        image_points.append(result.image_points)
+        counts[index] = len(result)
+    frame_indexes = np.repeat(np.arange(len(results)), counts)
+    if frame_indexes.shape[0] == 0:
+        return frame_indexes, np.zeros((0, 3)), np.zeros((0, 2))
+    return frame_indexes, \
+        np.concatenate(object_points).astype(np.float64), \
+        np.concatenate(image_points).astype(np.float64)
+
+
+def estimate_poses(frame_indexes: np.ndarray,
+                   object_points: np.ndarray,
+                   image_points: np.ndarray,
+                   camera_matrix: np.ndarray,
+                   distortion_coefficients: np.ndarray,
+                   number_of_frames: int=None) \
+        -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Estimates the pose of each frame with cv2.solvePnP.
+
+    :param frame_indexes: N frame index of each point, sorted
+    :param object_points: Nx3 object points
+    :param image_points: Nx2 image points
+    :param camera_matrix: 3x3 camera matrix
+    :param distortion_coefficients: OpenCV distortion coefficients
+    :param number_of_frames: defaults to max(frame_indexes) + 1
+    :return: Fx3 rotation vectors, Fx3 translation vectors, NaN for
+        frames with fewer than 4 points, or where cv2.solvePnP failed
+    """
+    if number_of_frames is None:
+        number_of_frames = int(np.max(frame_indexes)) + 1 \
+            if frame_indexes.shape[0] > 0 else 0
+    rvecs = np.full((number_of_frames, 3), np.nan)
+    tvecs = np.full((number_of_frames, 3), np.nan)
+    boundaries = np.searchsorted(frame_indexes,
+                                 np.arange(number_of_frames + 1))
+    for frame in range(number_of_frames):
+        start, end = boundaries[frame:frame + 2]
+        if end - start < 4:
+            continue
+        success, rvec, tvec = cv2.solvePnP(object_points[start:end],
+                                           image_points[start:end],
+                                           camera_matrix,
+                                           distortion_coefficients)
+        if success:
+            rvecs[frame] = rvec.reshape(3)
+            tvecs[frame] = tvec.reshape(3)
+    return rvecs, tvecs
+
+
+def rotate_points(points: np.ndarray, rotation_vectors: np.ndarray) \
+        -> np.ndarray:
+    """
+    Rotates each point by its own rotation vector, using Rodrigues'
+    formula, vectorised over all points.
+
+    :param points: Nx3 points
+    :param rotation_vectors: Nx3 rotation vectors, in radians
+    :return: Nx3 rotated points
+    """
+    angles = np.linalg.norm(rotation_vectors, axis=1, keepdims=True)
+    axes = np.divide(rotation_vectors, angles,
+                     out=np.zeros_like(rotation_vectors),
+                     where=angles > 0)
+    cosines = np.cos(angles)
+    return points * cosines \
+        + np.cross(axes, points) * np.sin(angles) \
+        + axes * np.sum(axes * points, axis=1, keepdims=True) * (1 - cosines)
+
+
+def project_points(frame_indexes: np.ndarray,
+                   object_points: np.ndarray,
+                   rvecs: np.ndarray,
+                   tvecs: np.ndarray,
+                   camera_matrix: np.ndarray,
+                   distortion_coefficients: np.ndarray) -> np.ndarray:
+    """
+    Projects the object points of all frames, each with its frame's pose,
+    in one call to cv2.projectPoints.
+
+    :param frame_indexes: N frame index of each point
+    :param object_points: Nx3 object points
+    :param rvecs: Fx3 rotation vector of each frame
+    :param tvecs: Fx3 translation vector of each frame
+    :param camera_matrix: 3x3 camera matrix
+    :param distortion_coefficients: OpenCV distortion coefficients
+    :return: Nx2 projected points, NaN where the pose is NaN
+    """
+    if frame_indexes.shape[0] == 0:
+        return np.zeros((0, 2))
+    rvecs = np.asarray(rvecs, dtype=np.float64).reshape(-1, 3)
+    tvecs = np.asarray(tvecs, dtype=np.float64).reshape(-1, 3)
+    camera_points = rotate_points(np.asarray(object_points, dtype=np.float64),
+                                  rvecs[frame_indexes]) \
+        + tvecs[frame_indexes]
+    is_valid = np.all(np.isfinite(camera_points), axis=1)
+    projected = np.full((camera_points.shape[0], 2), np.nan)
+    if np.any(is_valid):
+        valid_projected, _ = cv2.projectPoints(
+            camera_points[is_valid],
+            np.zeros(3),
+            np.zeros(3),
+            np.asarray(camera_matrix, dtype=np.float64),
+            np.asarray(distortion_coefficients, dtype=np.float64))
+        projected[is_valid] = valid_projected.reshape(-1, 2)
+    return projected
+
+
+def get_frame_rms(frame_indexes: np.ndarray,
+                  point_errors: np.ndarray,
+                  number_of_frames: int) -> np.ndarray:
+    """
+    Returns the RMS of the point errors in each frame.
+
+    :param frame_indexes: N frame index of each point
+    :param point_errors: N errors, NaN errors are ignored
+    :param number_of_frames: F
+    :return: F RMS errors, NaN for frames with no valid points
+    """
+    is_valid = np.isfinite(point_errors)
+    squared = np.bincount(frame_indexes[is_valid],
+                          point_errors[is_valid] ** 2,
+                          minlength=number_of_frames)
+    counts = np.bincount(frame_indexes[is_valid],
+                         minlength=number_of_frames)
+    frame_rms = np.full(number_of_frames, np.nan)
+    has_points = counts > 0
+    frame_rms[has_points] = np.sqrt(squared[has_points] / counts[has_points])
+    return frame_rms
+
+
+def summarise(point_errors: np.ndarray,
+              frame_rms: np.ndarray,
+              seconds: np.ndarray=None) -> dict:
+    """
+    Returns aggregate statistics, as a dict of numbers, e.g. to write
+    to JSON and compare detector accuracy, and speed, between versions.
+
+    :param point_errors: N errors, in pixels, NaN errors are ignored
+    :param frame_rms: F per frame RMS errors
+    :param seconds: optional F detection times, e.g. from
+        point_detector_batch.get_points_batch()
+    :return: dict of statistics
+    """
+    valid = point_errors[np.isfinite(point_errors)]
+    summary = {'number_of_frames': int(frame_rms.shape[0]),
+               'number_of_frames_evaluated':
+                   int(np.count_nonzero(np.isfinite(frame_rms))),
+               'number_of_points': int(valid.shape[0]),
+               'rms': float('nan'),
+               'mean': float('nan'),
+               'median': float('nan'),
+               'percentile_95': float('nan'),
+               'max': float('nan')}
+    if valid.shape[0] > 0:
+        summary['rms'] = float(np.sqrt(np.mean(valid ** 2)))
+        summary['mean'] = float(np.mean(valid))
+        summary['median'] = float(np.median(valid))
+        summary['percentile_95'] = float(np.percentile(valid, 95))
+        summary['max'] = float(np.max(valid))
+    if seconds is not None:
+        seconds = np.asarray(seconds, dtype=np.float64)
+        summary['mean_seconds_per_frame'] = float(np.mean(seconds)) \
+            if seconds.shape[0] > 0 else float('nan')
+    return summary
+
+
+def evaluate_reprojection_errors(results: List,
+                                 camera_matrix: np.ndarray,
+                                 distortion_coefficients: np.ndarray,
+                                 rvecs: np.ndarray=None,
+                                 tvecs: np.ndarray=None,
+                                 seconds: np.ndarray=None) -> dict:
+    """
+    Measures reprojection errors of detections in many frames.
+
+    :param results: list of PointDetectionResult, or of
+        (ids, object_points, image_points), one per frame
+    :param camera_matrix: 3x3 camera matrix
+    :param distortion_coefficients: OpenCV distortion coefficients
+    :param rvecs: optional Fx3 rotation vectors, e.g. from
+        cv2.calibrateCamera, if None, estimated with estimate_poses()
+    :param tvecs: optional Fx3 translation vectors
+    :param seconds: optional F detection times, passed to summarise()
+    :return: dict of 'frame_indexes' (N), 'point_errors' (N),
+        'frame_rms' (F), 'rvecs' (Fx3), 'tvecs' (Fx3),
+        and 'summary', from summarise()
+    """
+    if (rvecs is None) != (tvecs is None):
+        raise ValueError("Provide both rvecs and tvecs, or neither")
+    number_of_frames = len(results)
+    frame_indexes, object_points, image_points = concatenate_results(results)
+
+    if rvecs is None:
+        rvecs, tvecs = estimate_poses(frame_indexes,
+                                      object_points,
+                                      image_points,
+                                      camera_matrix,
+                                      distortion_coefficients,
+                                      number_of_frames)
+    rvecs = np.asarray(rvecs, dtype=np.float64).reshape(-1, 3)
+    tvecs = np.asarray(tvecs, dtype=np.float64).reshape(-1, 3)
+    if rvecs.shape[0] != number_of_frames \
+            or tvecs.shape[0] != number_of_frames:
+        raise ValueError("Provide one rvec and tvec per frame")
+
+    projected = project_points(frame_indexes,
+                               object_points,
+                               rvecs,
+                               tvecs,
+                               camera_matrix,
+                               distortion_coefficients)
+    point_errors = np.linalg.norm(projected - image_points, axis=1)
+    frame_rms = get_frame_rms(frame_indexes, point_errors, number_of_frames)
+    return {'frame_indexes': frame_indexes,
+            'point_errors': point_errors,
+            'frame_rms': frame_rms,
+            'rvecs': rvecs,
+            'tvecs': tvecs,
+            'summary': summarise(point_errors, frame_rms, seconds)}
@@ -1,7 +1,12 @@
 # coding=utf-8
 
 """Functions to support deinterlacing, reinterlacing and
-vertical destacking of 2D video frames."""
+vertical destacking of 2D video frames.
+
+All functions work on 2D (e.g. grayscale or Bayer) and 3D (multi-channel)
+frames of any dtype. Only the row axis is split or merged, so single channel
+inputs produce single channel outputs.
+"""
 
 import numpy as np
 
@@ -15,6 +20,8 @@ def validate_interlaced_image_sizes(even_rows, odd_rows, interlaced):
     3. Inputs must all have an even number of rows.
     4. even_rows and odd_rows must have the same number of rows.
     5. even_rows and odd_rows must have half the number of rows as interlaced.
+    6. Inputs must all have the same channel layout, i.e. all 2D, or all
+       3D with the same number of channels.
     """
 
     if not isinstance(even_rows, np.ndarray):
@@ -34,6 +41,11 @@ def validate_interlaced_image_sizes(even_rows, odd_rows, interlaced):
         raise ValueError("odd_rows should have the same number of "
                          + "columns as interlaced")
 
+    if even_rows.shape[2:] != odd_rows.shape[2:] \
+            or odd_rows.shape[2:] != interlaced.shape[2:]:
+        raise ValueError("even_rows, odd_rows and interlaced should have "
+                         + "the same number of channels")
+
     if even_rows.shape[0] % 2 != 0:
         raise ValueError("even_rows should have an even number of rows")
 
@@ -74,7 +86,7 @@ def interlace_to_new(even_rows, odd_rows):
         raise TypeError('odd_rows is not a numpy array')
 
     new_height = even_rows.shape[0] + odd_rows.shape[0]
-    new_dims = (new_height, even_rows.shape[1], even_rows.shape[2])
+    new_dims = (new_height,) + even_rows.shape[1:]
     interlaced = np.empty(new_dims, dtype=even_rows.dtype)
 
     # Contains further validation.
@@ -90,8 +102,8 @@ def deinterlace_to_preallocated(interlaced, even_rows, odd_rows):
     """
     validate_interlaced_image_sizes(even_rows, odd_rows, interlaced)
 
-    even_rows[:, :, :] = interlaced[0::2]
-    odd_rows[:, :, :] = interlaced[1::2]
+    even_rows[...] = interlaced[0::2]
+    odd_rows[...] = interlaced[1::2]
 
 
 def deinterlace_to_view(interlaced):
@@ -126,9 +138,7 @@ def deinterlace_to_new(interlaced):
     if interlaced.shape[0] % 2 != 0:
         raise ValueError("interlaced should have an even number of rows")
 
-    output_dims = (interlaced.shape[0]//2,
-                   interlaced.shape[1],
-                   interlaced.shape[2])
+    output_dims = (interlaced.shape[0]//2,) + interlaced.shape[1:]
 
     even_rows = np.empty(output_dims, dtype=interlaced.dtype)
     odd_rows = np.empty(output_dims, dtype=interlaced.dtype)
@@ -171,8 +181,8 @@ def split_stacked_to_preallocated(stacked, top, bottom):
     """
     validate_interlaced_image_sizes(top, bottom, stacked)
 
-    top[:, :, :] = stacked[0:stacked.shape[0] // 2, :, :]
-    bottom[:, :, :] = stacked[stacked.shape[0] // 2:, :, :]
+    top[...] = stacked[0:stacked.shape[0] // 2]
+    bottom[...] = stacked[stacked.shape[0] // 2:]
 
 
 def split_stacked_to_view(stacked):
@@ -188,8 +198,8 @@ def split_stacked_to_view(stacked):
     if stacked.shape[0] % 2 != 0:
         raise ValueError("stacked should have an even number of rows")
 
-    top_half = stacked[0:stacked.shape[0]//2, :, :]
-    bottom_half = stacked[stacked.shape[0]//2:, :, :]
+    top_half = stacked[0:stacked.shape[0]//2]
+    bottom_half = stacked[stacked.shape[0]//2:]
 
     return top_half, bottom_half
 
@@ -210,9 +220,7 @@ def split_stacked_to_new(stacked):
     if stacked.shape[0] % 2 != 0:
         raise ValueError("stacked should have an even number of rows")
 
-    output_dims = (stacked.shape[0]//2,
-                   stacked.shape[1],
-                   stacked.shape[2])
+    output_dims = (stacked.shape[0]//2,) + stacked.shape[1:]
 
     top_half = np.empty(output_dims, dtype=stacked.dtype)
     bottom_half = np.empty(output_dims, dtype=stacked.dtype)
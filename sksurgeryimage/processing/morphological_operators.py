@@ -4,12 +4,161 @@
 Functions to support morphological operators.
 
 In many cases, these will just be convenience wrappers around OpenCV functions.
+
+Structuring elements are cached by (shape, size), so repeatedly calling
+these functions, e.g. once per video frame, does not rebuild the kernel.
+All functions accept an optional, pre-allocated dst image, and
+MorphologyChain runs a sequence of operations using two re-usable buffers.
+
+erode_with_cross() and dilate_with_cross() switch to faster, but
+equivalent, algorithms for large elements or many iterations, see
+SEPARABLE_MIN_SIZE and DISTANCE_TRANSFORM_MIN_ITERATIONS. The crossover
+points were measured with benchmarks/bench_morphological_operators.py.
 """
 
+import functools
 import cv2
+import numpy as np
+
+#: Cross elements at least this big are applied as the pointwise min/max
+#: of a horizontal and a vertical line, which OpenCV runs separably.
+SEPARABLE_MIN_SIZE = 31
+
+#: A 3x3 cross iterated at least this many times on a binary image is
+#: computed with a single L1 distance transform.
+DISTANCE_TRANSFORM_MIN_ITERATIONS = 40
+
+_CROSS_METHODS = ('auto', 'direct', 'separable', 'distance')
+
+
+def _validate_size(size):
+    """
+    Converts size to a (width, height) tuple of positive ints.
+
+    :param size: int, or tuple of (width, height)
+    :return: (width, height)
+    :raises ValueError: if size is not positive
+    """
+    if isinstance(size, (int, np.integer)):
+        size = (int(size), int(size))
+    width, height = size
+    if width < 1 or height < 1:
+        raise ValueError(f"Structuring element size must be >= 1, not {size}")
+    return int(width), int(height)
+
+
+@functools.lru_cache(maxsize=64)
+def _cached_structuring_element(shape, size):
+    """
+    Creates, and caches, a read-only structuring element.
+    """
+    kernel = cv2.getStructuringElement(shape, size)
+    kernel.setflags(write=False)
+    return kernel
+
+
+def get_structuring_element(shape=cv2.MORPH_CROSS, size=3):
+    """
+    Returns a structuring element, which is only created on the first
+    call for a given shape and size, and then cached. The returned array
+    is read-only, as it is shared between callers.
+
+    :param shape: cv2.MORPH_CROSS, cv2.MORPH_RECT or cv2.MORPH_ELLIPSE
+    :param size: int, or tuple of (width, height) of structuring element
+    :return: the structuring element, as a read-only numpy array
+    """
+    if shape not in (cv2.MORPH_CROSS, cv2.MORPH_RECT, cv2.MORPH_ELLIPSE):
+        raise ValueError(f"Unsupported structuring element shape: {shape}")
+    return _cached_structuring_element(shape, _validate_size(size))
+
 
+# pylint: disable=too-many-arguments
+def morphology(src, operation, dst=None, shape=cv2.MORPH_CROSS, size=3,
+               iterations=1):
+    """
+    Applies a morphological operation, using a cached structuring element.
 
-def erode_with_cross(src, dst=None, size=3, iterations=1):
+    :param src: source image
+    :param operation: one of cv2.MORPH_ERODE, cv2.MORPH_DILATE,
+        cv2.MORPH_OPEN, cv2.MORPH_CLOSE, cv2.MORPH_GRADIENT,
+        cv2.MORPH_TOPHAT, cv2.MORPH_BLACKHAT
+    :param dst: if provided, an image of the same size and type as src
+    :param shape: cv2.MORPH_CROSS, cv2.MORPH_RECT or cv2.MORPH_ELLIPSE
+    :param size: int, or tuple of (width, height) of structuring element
+    :param iterations: number of iterations
+    :return: the output image, which is dst if dst was provided
+    """
+    kernel = get_structuring_element(shape, size)
+    return cv2.morphologyEx(src, operation, kernel, dst=dst,
+                            iterations=iterations)
+
+
+def erode(src, dst=None, shape=cv2.MORPH_CROSS, size=3, iterations=1):
+    """
+    Erodes an image. See morphology().
+    """
+    width, height = _validate_size(size)
+    if shape == cv2.MORPH_CROSS and width == height:
+        return erode_with_cross(src, dst=dst, size=width,
+                                iterations=iterations)
+    return morphology(src, cv2.MORPH_ERODE, dst=dst, shape=shape,
+                      size=size, iterations=iterations)
+
+
+def dilate(src, dst=None, shape=cv2.MORPH_CROSS, size=3, iterations=1):
+    """
+    Dilates an image. See morphology().
+    """
+    width, height = _validate_size(size)
+    if shape == cv2.MORPH_CROSS and width == height:
+        return dilate_with_cross(src, dst=dst, size=width,
+                                 iterations=iterations)
+    return morphology(src, cv2.MORPH_DILATE, dst=dst, shape=shape,
+                      size=size, iterations=iterations)
+
+
+def open_image(src, dst=None, shape=cv2.MORPH_CROSS, size=3, iterations=1):
+    """
+    Opens an image, i.e. erode then dilate. See morphology().
+    """
+    return morphology(src, cv2.MORPH_OPEN, dst=dst, shape=shape,
+                      size=size, iterations=iterations)
+
+
+def close_image(src, dst=None, shape=cv2.MORPH_CROSS, size=3, iterations=1):
+    """
+    Closes an image, i.e. dilate then erode. See morphology().
+    """
+    return morphology(src, cv2.MORPH_CLOSE, dst=dst, shape=shape,
+                      size=size, iterations=iterations)
+
+
+def gradient(src, dst=None, shape=cv2.MORPH_CROSS, size=3, iterations=1):
+    """
+    Morphological gradient, i.e. dilation minus erosion. See morphology().
+    """
+    return morphology(src, cv2.MORPH_GRADIENT, dst=dst, shape=shape,
+                      size=size, iterations=iterations)
+
+
+def top_hat(src, dst=None, shape=cv2.MORPH_CROSS, size=3, iterations=1):
+    """
+    Top-hat, i.e. image minus opening. See morphology().
+    """
+    return morphology(src, cv2.MORPH_TOPHAT, dst=dst, shape=shape,
+                      size=size, iterations=iterations)
+
+
+def black_hat(src, dst=None, shape=cv2.MORPH_CROSS, size=3, iterations=1):
+    """
+    Black-hat, i.e. closing minus image. See morphology().
+    """
+    return morphology(src, cv2.MORPH_BLACKHAT, dst=dst, shape=shape,
+                      size=size, iterations=iterations)
+
+
+# pylint: disable=too-many-arguments
+def erode_with_cross(src, dst=None, size=3, iterations=1, method='auto'):
     """
     Erodes an image with a cross element.
     OpenCV supports both grey scale and RGB erosion.
@@ -18,14 +167,16 @@ def erode_with_cross(src, dst=None, size=3, iterations=1):
     :param dst: if provided, an image of the same size as src
     :param size: size of structuring element
     :param iterations: number of iterations
+    :param method: 'auto', 'direct', 'separable' or 'distance'. All give
+        identical output, 'auto' picks the fastest applicable one.
     :return: the eroded image
     """
-    kernel = cv2.getStructuringElement(cv2.MORPH_CROSS, (size, size))
-    eroded = cv2.erode(src, dst=dst, kernel=kernel, iterations=iterations)
-    return eroded
+    return _morphology_with_cross(src, dst, size, iterations, method,
+                                  is_erosion=True)
 
 
-def dilate_with_cross(src, dst=None, size=3, iterations=1):
+# pylint: disable=too-many-arguments
+def dilate_with_cross(src, dst=None, size=3, iterations=1, method='auto'):
     """
     Dilates an image with a cross element.
     OpenCV supports both grey scale and RGB erosion.
@@ -34,8 +185,164 @@ def dilate_with_cross(src, dst=None, size=3, iterations=1):
     :param dst: if provided, an image of the same size as src
     :param size: size of structuring element
     :param iterations: number of iterations
-    :return: the eroded image
+    :param method: 'auto', 'direct', 'separable' or 'distance'. All give
+        identical output, 'auto' picks the fastest applicable one.
+    :return: the dilated image
+    """
+    return _morphology_with_cross(src, dst, size, iterations, method,
+                                  is_erosion=False)
+
+
+def _is_binary(src):
+    """
+    Returns True if src is a single channel uint8 image of only 0 and 255.
+    """
+    if src.dtype != np.uint8 or src.ndim != 2:
+        return False
+    _, binary = cv2.threshold(src, 0, 255, cv2.THRESH_BINARY)
+    return cv2.norm(src, binary, cv2.NORM_INF) == 0
+
+
+def _select_cross_method(src, size, iterations):
+    """
+    Picks the fastest method that gives identical output.
+    """
+    if size == 3 \
+            and DISTANCE_TRANSFORM_MIN_ITERATIONS <= iterations < 255 \
+            and _is_binary(src):
+        return 'distance'
+    if size >= SEPARABLE_MIN_SIZE and iterations > 0:
+        return 'separable'
+    return 'direct'
+
+
+# pylint: disable=too-many-arguments
+def _morphology_with_cross(src, dst, size, iterations, method, is_erosion):
+    """
+    Erodes or dilates with a cross element, using the requested method.
+    """
+    if method not in _CROSS_METHODS:
+        raise ValueError(f"method should be one of {_CROSS_METHODS}")
+    if method == 'auto':
+        method = _select_cross_method(src, size, iterations)
+
+    if method == 'distance':
+        if size != 3 or not 0 < iterations < 255 or not _is_binary(src):
+            raise ValueError("The distance method requires a binary, "
+                             "single channel uint8 image, size=3 "
+                             "and 0 < iterations < 255")
+        return _cross_by_distance(src, dst, iterations, is_erosion)
+
+    if method == 'separable' and iterations > 0:
+        return _cross_by_lines(src, dst, size, iterations, is_erosion)
+
+    kernel = get_structuring_element(cv2.MORPH_CROSS, size)
+    if is_erosion:
+        return cv2.erode(src, dst=dst, kernel=kernel, iterations=iterations)
+    return cv2.dilate(src, dst=dst, kernel=kernel, iterations=iterations)
+
+
+def _cross_by_distance(src, dst, iterations, is_erosion):
+    """
+    Iterating a 3x3 cross n times is equivalent to using a diamond of
+    radius n, so for binary images, a pixel survives erosion if its
+    city-block distance to the nearest background pixel is > n. Dilation
+    is the same test applied to the inverted image.
+    """
+    if is_erosion:
+        distances = cv2.distanceTransform(src, cv2.DIST_L1, cv2.DIST_MASK_3,
+                                          dstType=cv2.CV_8U)
+        return cv2.compare(distances, iterations, cv2.CMP_GT, dst=dst)
+    distances = cv2.distanceTransform(cv2.bitwise_not(src),
+                                      cv2.DIST_L1, cv2.DIST_MASK_3,
+                                      dstType=cv2.CV_8U)
+    return cv2.compare(distances, iterations, cv2.CMP_LE, dst=dst)
+
+
+def _cross_by_lines(src, dst, size, iterations, is_erosion):
+    """
+    A cross is the union of a horizontal and a vertical line, so eroding
+    (dilating) with a cross is the pointwise min (max) of eroding
+    (dilating) with each line, and OpenCV runs line elements separably.
+    """
+    horizontal = get_structuring_element(cv2.MORPH_RECT, (size, 1))
+    vertical = get_structuring_element(cv2.MORPH_RECT, (1, size))
+    operator = cv2.erode if is_erosion else cv2.dilate
+    combine = cv2.min if is_erosion else cv2.max
+
+    current = src
+    for counter in range(iterations):
+        first = operator(current, horizontal)
+        second = operator(current, vertical)
+        output = dst if counter == iterations - 1 else first
+        current = combine(first, second, dst=output)
+    return current
+
+
+class MorphologyChain:
     """
-    kernel = cv2.getStructuringElement(cv2.MORPH_CROSS, (size, size))
-    dilated = cv2.dilate(src, dst=dst, kernel=kernel, iterations=iterations)
-    return dilated
+    Runs a sequence of morphological operations, alternating between
+    two internal buffers, so that no memory is allocated per call,
+    once the buffers have been created for a given image size and type.
+
+    e.g. mask clean-up::
+
+        chain = MorphologyChain()
+        chain.add(cv2.MORPH_OPEN, size=3).add(cv2.MORPH_CLOSE, size=5)
+        cleaned = chain.apply(mask)
+    """
+    def __init__(self):
+        self.steps = []
+        self.buffers = [None, None]
+
+    # pylint: disable=too-many-arguments
+    def add(self, operation, shape=cv2.MORPH_CROSS, size=3, iterations=1):
+        """
+        Appends an operation to the chain. See morphology().
+
+        :return: self, so calls can be chained.
+        """
+        kernel = get_structuring_element(shape, size)
+        self.steps.append((operation, kernel, iterations))
+        return self
+
+    def apply(self, src, dst=None):
+        """
+        Runs all operations in order.
+
+        If dst is None, the result is one of the internal buffers, which
+        will be overwritten by the next call to apply(). Copy it, or
+        provide dst, if you need to keep it.
+
+        :param src: source image, which is not modified
+        :param dst: if provided, an image of the same size and type as src
+        :return: the output image
+        """
+        if not isinstance(src, np.ndarray):
+            raise TypeError('src is not a numpy array')
+        if not self.steps:
+            raise ValueError('MorphologyChain has no operations')
+
+        self._allocate_buffers(src)
+
+        current = src
+        last_step = len(self.steps) - 1
+        for counter, (operation, kernel, iterations) in enumerate(self.steps):
+            if counter == last_step and dst is not None:
+                output = dst
+            else:
+                output = self.buffers[counter % 2]
+            current = cv2.morphologyEx(current, operation, kernel,
+                                       dst=output, iterations=iterations)
+        return current
+
+    def _allocate_buffers(self, src):
+        """
+        (Re)creates the internal buffers if src has changed size or type.
+        """
+        for counter in range(2):
+            buffer = self.buffers[counter]
+            if buffer is None \
+                    or buffer.shape != src.shape \
+                    or buffer.dtype != src.dtype:
+                self.buffers[counter] = np.empty_like(src)
@@ -0,0 +1,254 @@
+# coding=utf-8
+
+"""
+Opt-in timing of processing stages, such as grabbing, retrieving,
+deinterlacing, undistorting, remapping, detecting points and writing,
+to find which stage makes a frame late.
+
+Stages are timed only while at least one callback is registered.
+Otherwise stage() returns a shared object that does nothing, so the cost
+is one function call and one check of a module level tuple::
+
+    import sksurgeryimage.utilities.instrumentation as si
+
+    with si.collect() as histograms:
+        ...
+    print(histograms.get_summary())
+
+or register any callable taking (stage name, seconds) with add_callback().
+Stage names are prefixed by the module or class that records them,
+e.g. 'video_source.grab', 'stereo_video.remap' or 'chessboard.refine'.
+"""
+
+import bisect
+import contextlib
+import threading
+import time
+from typing import Callable
+import numpy as np
+
+#: Upper edges of histogram bins, in seconds, 10 per decade,
+#: from 1 microsecond to 100 seconds.
+HISTOGRAM_EDGES = tuple(10 ** (exponent / 10) for exponent in range(-60, 21))
+
+# Replaced, not modified, when callbacks change, so record() can
+# iterate it without a lock, while other threads register callbacks.
+_CALLBACKS = ()
+_CALLBACKS_LOCK = threading.Lock()
+
+
+def add_callback(callback: Callable[[str, float], None]):
+    """
+    Registers callback, to be called with (stage name, seconds) each time
+    a stage completes, in the thread that ran it.
+
+    :param callback: callable taking a str and a float
+    """
+    global _CALLBACKS  # pylint: disable=global-statement
+    if not callable(callback):
+        raise TypeError("callback is not callable")
+    with _CALLBACKS_LOCK:
+        if callback not in _CALLBACKS:
+            _CALLBACKS = _CALLBACKS + (callback,)
+
+
+def remove_callback(callback: Callable[[str, float], None]):
+    """
+    Unregisters callback, if registered.
+    """
+    global _CALLBACKS  # pylint: disable=global-statement
+    with _CALLBACKS_LOCK:
+        _CALLBACKS = tuple(registered for registered in _CALLBACKS
+                           if registered is not callback)
+
+
+def is_enabled() -> bool:
+    """
+    Returns True if any callback is registered.
+    """
+    return len(_CALLBACKS) > 0
+
+
+def record(name: str, seconds: float):
+    """
+    Passes the time of a stage to all registered callbacks, e.g. for
+    stages timed elsewhere.
+
+    :param name: stage name
+    :param seconds: duration of the stage
+    """
+    for callback in _CALLBACKS:
+        callback(name, seconds)
+
+
+class _Stage:
+    """
+    Context manager timing one stage.
+    """
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullStage:
+    """
+    Context manager that does nothing, used while disabled.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name: str):
+    """
+    Returns a context manager timing the enclosed code as stage name,
+    if any callback is registered, or doing nothing otherwise.
+
+    :param name: stage name
+    """
+    if not _CALLBACKS:
+        return _NULL_STAGE
+    return _Stage(name)
+
+
+class StageHistograms:
+    """
+    Callback accumulating a histogram of durations for each stage.
+    Safe to use from several threads, e.g. with
+    ThreadedTimestampedVideoWriter.
+    """
+    def __init__(self, edges=HISTOGRAM_EDGES):
+        """
+        :param edges: increasing upper edges of bins, in seconds,
+            with a final bin for longer durations
+        """
+        self.edges = tuple(edges)
+        if list(self.edges) != sorted(self.edges):
+            raise ValueError("edges must be increasing")
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._totals = {}
+        self._maxima = {}
+
+    def __call__(self, name: str, seconds: float):
+        index = bisect.bisect_left(self.edges, seconds)
+        with self._lock:
+            counts = self._counts.get(name)
+            if counts is None:
+                counts = [0] * (len(self.edges) + 1)
+                self._counts[name] = counts
+                self._totals[name] = 0.0
+                self._maxima[name] = 0.0
+            counts[index] += 1
+            self._totals[name] += seconds
+            self._maxima[name] = max(self._maxima[name], seconds)
+
+    def reset(self):
+        """
+        Forgets all durations.
+        """
+        with self._lock:
+            self._counts = {}
+            self._totals = {}
+            self._maxima = {}
+
+    def get_stages(self) -> list:
+        """
+        Returns the names of the stages recorded so far.
+        """
+        with self._lock:
+            return sorted(self._counts)
+
+    def get_histogram(self, name: str):
+        """
+        Returns the histogram of stage name.
+
+        :return: upper edges of bins, as a numpy array, with inf for the
+            last bin, and the count in each bin, as a numpy array
+        :raises: KeyError if name has not been recorded
+        """
+        with self._lock:
+            counts = np.array(self._counts[name])
+        return np.array(self.edges + (np.inf,)), counts
+
+    def get_percentile(self, name: str, percentile: float) -> float:
+        """
+        Returns an upper bound of the given percentile of the durations
+        of stage name, i.e. the upper edge of the bin containing it,
+        or the maximum duration, if smaller.
+
+        :param percentile: in [0, 100]
+        :raises: KeyError if name has not been recorded
+        """
+        edges, counts = self.get_histogram(name)
+        cumulative = np.cumsum(counts)
+        index = int(np.searchsorted(cumulative,
+                                    cumulative[-1] * percentile / 100))
+        with self._lock:
+            maximum = self._maxima[name]
+        return float(min(edges[index], maximum))
+
+    def get_summary(self) -> dict:
+        """
+        Returns statistics of each stage, in seconds, as a dict of
+        stage name : dict of 'count', 'total', 'mean', 'p50', 'p99', 'max'.
+        """
+        summary = {}
+        for name in self.get_stages():
+            with self._lock:
+                count = sum(self._counts[name])
+                total = self._totals[name]
+                maximum = self._maxima[name]
+            summary[name] = {'count': count,
+                             'total': total,
+                             'mean': total / count,
+                             'p50': self.get_percentile(name, 50),
+                             'p99': self.get_percentile(name, 99),
+                             'max': maximum}
+        return summary
+
+    def get_histograms(self) -> dict:
+        """
+        Returns all histograms, as lists, e.g. to write to JSON, as a dict
+        of 'edges' : upper edges of bins except the last, in seconds, and
+        'counts' : dict of stage name : list of counts, one more than edges.
+        """
+        with self._lock:
+            return {'edges': list(self.edges),
+                    'counts': {name: list(counts)
+                               for name, counts in self._counts.items()}}
+
+
+@contextlib.contextmanager
+def collect(histograms: StageHistograms=None):
+    """
+    Context manager registering a StageHistograms callback while
+    the enclosed code runs.
+
+    :param histograms: optional StageHistograms, to add to
+    :return: the StageHistograms
+    """
+    if histograms is None:
+        histograms = StageHistograms()
+    add_callback(histograms)
+    try:
+        yield histograms
+    finally:
+        remove_callback(histograms)
@@ -4,6 +4,7 @@
 Tests for Aruco implementation of PointDetector.
 """
 import os
+import pickle
 import cv2
 import numpy as np
 import pytest
@@ -185,3 +186,35 @@ def test_aruco_detector_with_rotate_180():
     assert image_points[10][1] == image_points[3][1]
     assert image_points[10][0] == image_points[4][0]
     assert image_points[10][1] > image_points[4][1]
+
+
+def test_aruco_detector_pickle_round_trip():
+    image = cv2.imread('tests/data/calibration/test-aruco.png')
+    dictionary = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_ARUCO_ORIGINAL)
+    parameters = cv2.aruco.DetectorParameters()
+    parameters.adaptiveThreshWinSizeMax = 33
+    detector = apd.ArucoPointDetector(dictionary, parameters, _get_model_1())
+
+    copied = pickle.loads(pickle.dumps(detector))
+    assert copied.parameters.adaptiveThreshWinSizeMax == 33
+    np.testing.assert_array_equal(copied.dictionary.bytesList,
+                                  dictionary.bytesList)
+    for expected, actual in zip(detector.get_points(image), copied.get_points(image)):
+        np.testing.assert_array_equal(expected, actual)
+
+
+def test_aruco_detector_points_match_model():
+    image = cv2.imread('tests/data/calibration/test-aruco.png')
+    model = _get_model_1()
+    del model[1000]
+    del model[11]
+    dictionary = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_ARUCO_ORIGINAL)
+    parameters = cv2.aruco.DetectorParameters()
+    detector = apd.ArucoPointDetector(dictionary, parameters, model, (1, 1))
+    ids, object_points, _ = detector.get_points(image)
+    assert ids.shape[0] == 10
+    for i in range(ids.shape[0]):
+        np.testing.assert_array_equal(object_points[i], model[ids[i][0]][0])
+
+    ids, _, _ = detector.get_points(np.zeros((100, 100), dtype=np.uint8))
+    assert ids.shape == (0, 1)
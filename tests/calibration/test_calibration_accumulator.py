@@ -0,0 +1,121 @@
+# coding=utf-8
+
+"""
+Tests for CalibrationAccumulator.
+"""
+
+import cv2
+import numpy as np
+import pytest
+import sksurgeryimage.calibration.calibration_accumulator as ca
+from sksurgeryimage.calibration.point_detection_result import PointDetectionResult
+
+INTRINSICS = np.array([[800.0, 0, 330], [0, 790, 250], [0, 0, 1]])
+DISTORTION = np.array([0.1, -0.05, 0, 0, 0])
+IMAGE_SIZE = (640, 480)
+
+
+def _make_board(number_in_x=9, number_in_y=6, size=20):
+    board = np.zeros((number_in_x * number_in_y, 3))
+    board[:, 0:2] = np.mgrid[0:number_in_x, 0:number_in_y].T.reshape(-1, 2) * size
+    return board
+
+
+def _make_views(number_of_views, board, seed=0):
+    rng = np.random.default_rng(seed)
+    views = []
+    while len(views) < number_of_views:
+        rotation = rng.normal(0, 0.35, 3)
+        translation = np.array([-80 + rng.normal(0, 40),
+                                -50 + rng.normal(0, 30),
+                                450 + rng.normal(0, 80)])
+        image_points, _ = cv2.projectPoints(board, rotation, translation,
+                                            INTRINSICS, DISTORTION)
+        image_points = image_points.reshape(-1, 2)
+        if np.all(image_points >= 0) and np.all(image_points < IMAGE_SIZE):
+            image_points += rng.normal(0, 0.1, image_points.shape)
+            views.append(PointDetectionResult(np.arange(board.shape[0]),
+                                              board,
+                                              image_points))
+    return views
+
+
+def test_accumulator_estimates_intrinsics():
+    accumulator = ca.CalibrationAccumulator(IMAGE_SIZE)
+    assert accumulator.get_rolling_intrinsics() is None
+    assert accumulator.calibrate() is None
+    assert not accumulator.needs_recalibration()
+
+    for view in _make_views(30, _make_board()):
+        accumulator.add(view)
+    assert 10 < len(accumulator) <= 30
+    assert accumulator.get_number_of_points() == 54 * len(accumulator)
+
+    rolling = accumulator.get_rolling_intrinsics()
+    np.testing.assert_allclose(rolling, INTRINSICS, rtol=0.05, atol=20)
+
+    assert accumulator.needs_recalibration()
+    rms, camera_matrix, distortion = accumulator.calibrate()
+    assert rms < 0.5
+    np.testing.assert_allclose(camera_matrix, INTRINSICS, rtol=0.01, atol=2)
+    np.testing.assert_allclose(distortion.reshape(-1)[0:2], DISTORTION[0:2],
+                               atol=0.02)
+
+    # Calibration is not repeated until coverage changes.
+    assert not accumulator.needs_recalibration()
+    assert accumulator.calibrate()[0] == rms
+    assert accumulator.calibrate(force=True)[0] == pytest.approx(rms)
+
+
+def test_accumulator_rejects_views():
+    board = _make_board()
+    views = _make_views(2, board)
+    accumulator = ca.CalibrationAccumulator(IMAGE_SIZE, maximum_number_of_views=2)
+
+    # Too few points.
+    assert not accumulator.add(PointDetectionResult(np.arange(3), board[0:3],
+                                                    views[0].image_points[0:3]))
+    assert accumulator.add(views[0])
+    # Same pose again, covering nothing new.
+    assert not accumulator.add(views[0])
+    assert accumulator.add_points(*views[1].get_points())
+    # Full.
+    assert not accumulator.add(_make_views(1, board, seed=1)[0])
+    assert len(accumulator) == 2
+
+    ids, object_points, image_points = accumulator.get_view(1)
+    np.testing.assert_array_equal(ids, views[1].ids)
+    np.testing.assert_array_equal(object_points, views[1].object_points)
+    np.testing.assert_array_equal(image_points, views[1].image_points)
+    with pytest.raises(IndexError):
+        accumulator.get_view(2)
+
+    with pytest.raises(ValueError):
+        ca.CalibrationAccumulator(IMAGE_SIZE, minimum_number_of_points=3)
+
+
+def test_accumulator_grows_without_copying_inputs():
+    board = _make_board(60, 40, 2)
+    views = _make_views(3, board)
+    accumulator = ca.CalibrationAccumulator(IMAGE_SIZE, minimum_pose_distance=0)
+    for view in views:
+        assert accumulator.add(view)
+    assert accumulator.get_number_of_points() == 3 * 2400 > ca.INITIAL_CAPACITY
+
+    object_points, image_points = accumulator.get_calibration_inputs()
+    assert len(object_points) == 3
+    for index, view in enumerate(views):
+        assert object_points[index].dtype == np.float32
+        assert np.shares_memory(object_points[index], accumulator._object_points)
+        assert np.shares_memory(image_points[index], accumulator._image_points)
+        np.testing.assert_array_equal(image_points[index], view.image_points)
+
+
+def test_accumulator_ignores_non_planar_views_for_rolling_estimate():
+    board = _make_board()
+    board[0, 2] = 10
+    accumulator = ca.CalibrationAccumulator(IMAGE_SIZE)
+    for view in _make_views(10, board):
+        accumulator.add(view)
+    assert len(accumulator) > 0
+    assert accumulator.get_rolling_intrinsics() is None
@@ -4,6 +4,7 @@
 Tests for ChArUco + Chessboard implementation of PointDetector.
 """
 import os
+import pickle
 import cv2
 import pytest
 import numpy as np
@@ -248,3 +249,158 @@ def test_charuco_plus_chess_invalid_because_no_chessboard_detected(load_referenc
         _, _, _ = detector.get_points(roi)
 
     assert str(excinfo.value) == "No chessboard detected."
+
+
+def test_charuco_plus_chessboard_config():
+    input_image, point_detector = _create_default_detector()
+    config = point_detector.get_config()
+
+    copied = cpcbd.CharucoPlusChessboardPointDetector.from_config(config)
+    assert copied.reference_image is None
+    np.testing.assert_array_equal(copied.rotation_matrix,
+                                  point_detector.rotation_matrix)
+    assert copied.get_model_points().keys() == point_detector.get_model_points().keys()
+
+    copied = pickle.loads(pickle.dumps(point_detector))
+    for expected, actual in zip(point_detector.get_points(input_image),
+                                copied.get_points(input_image)):
+        np.testing.assert_array_equal(expected, actual)
+
+
+def test_charuco_plus_chessboard_cache(tmp_path):
+    dictionary = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_250)
+    cpcbd._MODEL_CACHE.clear()
+    detector = cpcbd.CharucoPlusChessboardPointDetector(
+        dictionary, cache_directory=str(tmp_path))
+    assert len(list(tmp_path.glob("*.npz"))) == 1
+
+    # Re-loaded from disk, without detecting the reference image.
+    cpcbd._MODEL_CACHE.clear()
+    cached = cpcbd.CharucoPlusChessboardPointDetector(
+        dictionary, cache_directory=str(tmp_path))
+    assert cached.reference_image is None
+    np.testing.assert_array_equal(cached.rotation_matrix, detector.rotation_matrix)
+    np.testing.assert_array_equal(cached.translation_vector, detector.translation_vector)
+    assert cached.get_model_points().keys() == detector.get_model_points().keys()
+
+    # A different board must not hit the same cache entry.
+    other = cpcbd.CharucoPlusChessboardPointDetector(
+        dictionary, chessboard_id_offset=1000, cache_directory=str(tmp_path))
+    assert len(list(tmp_path.glob("*.npz"))) == 2
+    assert max(other.get_model_points().keys()) > 1000
+
+
+def test_charuco_plus_chessboard_cache_key_and_size(monkeypatch):
+    board_config = {'a': 1, 'b': {'c': 2}}
+    key = cpcbd._get_cache_key(board_config)
+    assert key == cpcbd._get_cache_key(dict(board_config))
+    monkeypatch.setattr(cpcbd, 'MODEL_CACHE_FORMAT_VERSION',
+                        cpcbd.MODEL_CACHE_FORMAT_VERSION + 1)
+    assert cpcbd._get_cache_key(board_config) != key
+    monkeypatch.undo()
+    monkeypatch.setattr(cv2, '__version__', '0.0.0')
+    assert cpcbd._get_cache_key(board_config) != key
+
+    # The least recently used entries are dropped.
+    monkeypatch.setattr(cpcbd, '_MODEL_CACHE', type(cpcbd._MODEL_CACHE)())
+    for idx in range(cpcbd.MODEL_CACHE_SIZE):
+        cpcbd._write_model_cache(idx, None, {}, np.eye(3), np.zeros((3, 1)))
+    assert cpcbd._read_model_cache(0, None) is not None
+    cpcbd._write_model_cache('new', None, {}, np.eye(3), np.zeros((3, 1)))
+    assert len(cpcbd._MODEL_CACHE) == cpcbd.MODEL_CACHE_SIZE
+    assert cpcbd._read_model_cache(0, None) is not None
+    assert cpcbd._read_model_cache(1, None) is None
+
+
+def test_charuco_plus_chessboard_parallel_and_restricted():
+    input_image, sequential = _create_default_detector()
+    assert not sequential.parallel
+    assert not sequential.restrict_chessboard_search
+    config = sequential.get_config()
+    config['parallel'] = True
+    config['restrict_chessboard_search'] = True
+    point_detector = cpcbd.CharucoPlusChessboardPointDetector.from_config(config)
+    assert point_detector._executor is None
+
+    grey = cv2.cvtColor(input_image, cv2.COLOR_BGR2GRAY)
+    _, charuco_object_points, charuco_image_points = \
+        point_detector.charuco_point_detector.get_points(grey)
+    roi = point_detector._predict_chessboard_roi(grey.shape,
+                                                 charuco_object_points,
+                                                 charuco_image_points)
+    _, _, chess_image_points = \
+        point_detector.chessboard_point_detector.get_points(grey)
+    min_x, min_y, max_x, max_y = roi
+    assert (max_x - min_x) * (max_y - min_y) < 0.5 * grey.size
+    assert np.all(chess_image_points >= [min_x, min_y])
+    assert np.all(chess_image_points < [max_x, max_y])
+
+    # The second frame is searched where the first predicts. The rotated
+    # frame's chessboard is elsewhere, so is searched for again.
+    for image in [input_image,
+                  input_image,
+                  cv2.rotate(input_image, cv2.ROTATE_180)]:
+        for expected, actual in zip(sequential.get_points(image),
+                                    point_detector.get_points(image)):
+            np.testing.assert_array_equal(expected, actual)
+
+    # Detecting the model points does not create the thread.
+    cpcbd._MODEL_CACHE.clear()
+    uncached = cpcbd.CharucoPlusChessboardPointDetector.from_config(
+        {key: value for key, value in config.items()
+         if key not in ['model_points', 'rotation_matrix', 'translation_vector']})
+    assert uncached.parallel
+    assert uncached._executor is None
+
+    # The threads are re-created after closing, and after unpickling.
+    assert point_detector._executor is not None
+    copied = pickle.loads(pickle.dumps(point_detector))
+    assert copied.parallel
+    assert copied._executor is None
+    with copied:
+        for expected, actual in zip(point_detector.get_points(input_image),
+                                    copied.get_points(input_image)):
+            np.testing.assert_array_equal(expected, actual)
+    assert copied._executor is None
+    point_detector.close()
+    assert point_detector._executor is None
+    assert point_detector.get_points(input_image)[0].shape[0] > 0
+    point_detector.close()
+
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_charuco_plus_chessboard_wrong_prediction(parallel, monkeypatch):
+    input_image, unrestricted = _create_default_detector()
+    config = unrestricted.get_config()
+    config['parallel'] = parallel
+    config['restrict_chessboard_search'] = True
+    with cpcbd.CharucoPlusChessboardPointDetector.from_config(config) \
+            as point_detector:
+        # Predict a corner of the image, away from the chessboard.
+        monkeypatch.setattr(point_detector, '_predict_chessboard_roi',
+                            lambda *args: (0, 0, 50, 50))
+        for _ in range(2):
+            for expected, actual in zip(unrestricted.get_points(input_image),
+                                        point_detector.get_points(input_image)):
+                np.testing.assert_array_equal(expected, actual)
+
+
+def test_charuco_plus_chessboard_merged_model():
+    input_image, point_detector = _create_default_detector()
+    ids, object_points, _ = point_detector.get_points(input_image)
+    assert ids.dtype == np.int32
+
+    chess_detector = point_detector.chessboard_point_detector
+    chess_object_points = np.transpose(
+        np.matmul(point_detector.rotation_matrix,
+                  np.transpose(chess_detector.object_points))
+        + point_detector.translation_vector)
+    is_chess = ids[:, 0] >= point_detector.chessboard_id_offset
+    assert np.count_nonzero(is_chess) == chess_detector.expected_number_of_points
+    np.testing.assert_array_equal(
+        object_points[is_chess],
+        chess_object_points[ids[is_chess, 0] - point_detector.chessboard_id_offset])
+
+    charuco_model = point_detector.charuco_point_detector.model_points
+    for idx, point in zip(ids[~is_chess, 0], object_points[~is_chess]):
+        np.testing.assert_array_equal(point, charuco_model[idx])
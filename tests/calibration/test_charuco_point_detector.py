@@ -4,6 +4,7 @@
 Tests for ChArUco implementation of PointDetector.
 """
 import os
+import pickle
 import cv2
 import numpy as np
 import sksurgeryimage.calibration.point_detector_utils as pdu
@@ -133,3 +134,135 @@ def test_charuco_detector_rotated_180():
     assert rotated_image_points[0][1] == rotated_image_points[1][1]
     assert rotated_image_points[0][0] == rotated_image_points[12][0]
     assert rotated_image_points[0][1] > rotated_image_points[12][1]
+
+
+def test_charuco_detector_pyramid_mode():
+    image = cv2.imread('tests/data/calibration/test-charuco.png')
+    image = cv2.resize(image, None, fx=3, fy=3, interpolation=cv2.INTER_CUBIC)
+    dictionary = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_250)
+    detector = CharucoPointDetector(dictionary, (13, 10), (3, 2), legacy_pattern=True)
+    ids, object_points, image_points = detector.get_points(image)
+
+    detector = CharucoPointDetector(dictionary, (13, 10), (3, 2), legacy_pattern=True,
+                                    pyramid_scale=0.25)
+    ids2, object_points2, image_points2 = detector.get_points(image)
+    np.testing.assert_array_equal(ids, ids2)
+    np.testing.assert_array_equal(object_points, object_points2)
+    np.testing.assert_allclose(image_points, image_points2, atol=1)
+
+
+def test_charuco_detector_pyramid_mode_with_distortion():
+    # Distort the test image, with strong barrel distortion.
+    image = cv2.imread('tests/data/calibration/test-charuco.png', cv2.IMREAD_GRAYSCALE)
+    height, width = image.shape
+    camera_matrix = np.array([[0.8 * width, 0, width / 2 - 0.5],
+                              [0, 0.8 * width, height / 2 - 0.5],
+                              [0, 0, 1]])
+    distortion_coefficients = np.array([-0.3, 0, 0, 0, 0])
+    grid_x, grid_y = np.meshgrid(np.arange(width, dtype=np.float32),
+                                 np.arange(height, dtype=np.float32))
+    undistorted = cv2.undistortPoints(
+        np.stack((grid_x.ravel(), grid_y.ravel()), axis=1).reshape(-1, 1, 2),
+        camera_matrix, distortion_coefficients, P=camera_matrix).reshape(height, width, 2)
+    image = cv2.remap(image, undistorted[:, :, 0], undistorted[:, :, 1],
+                      cv2.INTER_LINEAR, borderValue=255)
+
+    dictionary = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_250)
+    detector = CharucoPointDetector(dictionary, (13, 10), (3, 2), legacy_pattern=True,
+                                    camera_matrix=camera_matrix,
+                                    distortion_coefficients=distortion_coefficients)
+    expected_ids, _, expected_image_points = detector.get_points(image)
+    assert expected_ids.shape[0] == 108
+
+    detector = CharucoPointDetector(dictionary, (13, 10), (3, 2), legacy_pattern=True,
+                                    camera_matrix=camera_matrix,
+                                    distortion_coefficients=distortion_coefficients,
+                                    pyramid_scale=0.5)
+    ids, _, image_points = detector.get_points(image)
+    np.testing.assert_array_equal(ids, expected_ids)
+    assert np.max(np.linalg.norm(image_points - expected_image_points, axis=1)) < 1.0
+
+
+def test_charuco_detector_tracking_mode():
+    image = cv2.imread('tests/data/calibration/test-charuco-blanked.png')
+    image = cv2.copyMakeBorder(image, 200, 200, 300, 300, cv2.BORDER_CONSTANT, value=(255, 255, 255))
+    dictionary = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_250)
+    detector = CharucoPointDetector(dictionary, (13, 10), (3, 2), legacy_pattern=True)
+    expected_ids, expected_object_points, expected_image_points = detector.get_points(image)
+
+    detector = CharucoPointDetector(dictionary, (13, 10), (3, 2), legacy_pattern=True,
+                                    tracking=True)
+    for _ in range(2):
+        ids, object_points, image_points = detector.get_points(image)
+        np.testing.assert_array_equal(ids, expected_ids)
+        np.testing.assert_array_equal(object_points, expected_object_points)
+        np.testing.assert_allclose(image_points, expected_image_points, atol=0.01)
+        assert detector.tracked_roi is not None
+
+
+def test_charuco_detector_tracking_mode_loses_points():
+    image = cv2.imread('tests/data/calibration/test-charuco-blanked.png')
+    image = cv2.copyMakeBorder(image, 200, 200, 300, 300, cv2.BORDER_CONSTANT, value=(255, 255, 255))
+    dictionary = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_250)
+    detector = CharucoPointDetector(dictionary, (13, 10), (3, 2), legacy_pattern=True,
+                                    tracking=True, tracking_margin=0)
+    ids, _, _ = detector.get_points(image)
+    assert detector.tracked_number_of_points == ids.shape[0]
+
+    # Most of the board moves out of the tracked ROI, but not the image.
+    moved = np.roll(image, -250, axis=1)
+    expected_ids, _, expected_image_points = \
+        CharucoPointDetector(dictionary, (13, 10), (3, 2),
+                             legacy_pattern=True).get_points(moved)
+    ids, _, image_points = detector.get_points(moved)
+    np.testing.assert_array_equal(ids, expected_ids)
+    np.testing.assert_allclose(image_points, expected_image_points, atol=0.01)
+    assert detector.tracked_number_of_points == ids.shape[0]
+
+    detector.reset_tracking()
+    assert detector.tracked_number_of_points == 0
+
+
+def test_charuco_detector_config():
+    image = cv2.imread('tests/data/calibration/test-charuco.png')
+    dictionary = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_250)
+    detector = CharucoPointDetector(dictionary, (13, 10), (3, 2), legacy_pattern=True)
+    config = detector.get_config()
+    assert len(config['model_points']) == 108
+
+    # Model points are taken from the config, not the reference image.
+    copied = CharucoPointDetector.from_config(config)
+    assert copied.reference_image is None
+    for expected, actual in zip(detector.get_points(image), copied.get_points(image)):
+        np.testing.assert_array_equal(expected, actual)
+
+    copied = pickle.loads(pickle.dumps(detector))
+    for expected, actual in zip(detector.get_points(image), copied.get_points(image)):
+        np.testing.assert_array_equal(expected, actual)
+    np.testing.assert_array_equal(detector.get_reference_image(),
+                                  copied.get_reference_image())
+
+
+def test_charuco_model_points_match_reference_image():
+    dictionary = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_250)
+    for legacy_pattern in [True, False]:
+        detector = CharucoPointDetector(dictionary, (19, 26), (5, 4),
+                                        legacy_pattern=legacy_pattern)
+        assert detector.reference_image is None
+        ids, object_points, _ = detector.get_points(detector.get_reference_image())
+        model = detector.get_model_points()
+        assert sorted(model.keys()) == sorted(ids[:, 0].tolist())
+        for i in range(ids.shape[0]):
+            np.testing.assert_array_equal(model[ids[i][0]], object_points[i])
+
+
+def test_charuco_detector_uses_parameters():
+    image = cv2.imread('tests/data/calibration/test-charuco.png')
+    dictionary = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_250)
+    parameters = cv2.aruco.DetectorParameters()
+    parameters.minMarkerPerimeterRate = 3.5
+    parameters.maxMarkerPerimeterRate = 4.0
+    detector = CharucoPointDetector(dictionary, (13, 10), (3, 2),
+                                    parameters=parameters)
+    ids, _, _ = detector.get_points(image)
+    assert ids.shape[0] == 0
@@ -4,10 +4,13 @@
 Tests for chessboard implementation of PointDetector.
 """
 import os
+import pickle
+import pytest
 import cv2 as cv2
 import numpy as np
 import sksurgeryimage.calibration.point_detector_utils as pdu
 from sksurgeryimage.calibration.chessboard_point_detector import ChessboardPointDetector
+import sksurgeryimage.calibration.chessboard_point_detector as cpd
 
 
 def test_chessboard_detector():
@@ -173,3 +176,217 @@ def test_wrong_chessboard_image():
     assert ids.shape[0] == 0
     assert object_points.shape[0] == 0
     assert image_points.shape[0] == 0
+
+
+def test_chessboard_detector_pyramid_mode():
+    # Synthetic, sharp, 4K image of a 14x11 square chessboard,
+    # with ground truth corner locations.
+    square = 100
+    board = np.kron((np.indices((11, 14)).sum(axis=0) % 2).astype(np.uint8) * 255,
+                    np.ones((square, square), dtype=np.uint8))
+    board = cv2.copyMakeBorder(board, square, square, square, square,
+                               cv2.BORDER_CONSTANT, value=255)
+    height, width = board.shape
+    homography = cv2.getPerspectiveTransform(
+        np.float32([[0, 0], [width, 0], [width, height], [0, height]]),
+        np.float32([[500, 300], [3300, 450], [3100, 1900], [700, 1800]]))
+    image = cv2.warpPerspective(board, homography, (3840, 2160), borderValue=128)
+    image = cv2.GaussianBlur(image, (5, 5), 1.2)
+    grid_x, grid_y = np.meshgrid(np.arange(2, 15) * square, np.arange(2, 12) * square)
+    corners = np.stack([grid_x.ravel(), grid_y.ravel()], axis=1) - 0.5
+    expected = cv2.perspectiveTransform(corners.reshape(-1, 1, 2), homography).reshape(-1, 2)
+
+    for pyramid_scale in [None, 0.5, 0.25]:
+        detector = ChessboardPointDetector((13, 10), 3, pyramid_scale=pyramid_scale)
+        ids, object_points, image_points = detector.get_points(image)
+        assert ids.shape[0] == 130
+        assert object_points.shape[0] == 130
+        assert image_points.shape == (130, 2)
+        errors = np.minimum(np.linalg.norm(image_points - expected, axis=1).max(),
+                            np.linalg.norm(image_points[::-1] - expected, axis=1).max())
+        assert errors < 0.2
+
+    detector = ChessboardPointDetector((13, 10), 3, pyramid_scale=0.25)
+    ids, _, image_points = detector.get_points(np.zeros((2160, 3840), dtype=np.uint8))
+    assert ids.shape[0] == 0
+    assert image_points.shape[0] == 0
+
+
+@pytest.mark.parametrize("file_name", ['leftImage', 'rightImage'])
+@pytest.mark.parametrize("scale", [(1, 1), (1, 2)])
+@pytest.mark.parametrize("scale_refinement_window", [False, True])
+def test_chessboard_detector_pyramid_mode_matches_full_resolution(
+        file_name, scale, scale_refinement_window):
+    image = cv2.imread(f'tests/data/calib-ucl-chessboard/{file_name}.png')
+    detector = ChessboardPointDetector(
+        (13, 10), 3, scale=scale,
+        scale_refinement_window=scale_refinement_window)
+    expected_ids, _, expected = detector.get_points(image)
+    assert expected_ids.shape[0] == 130
+
+    pyramid_scales = [0.5, 0.25] if scale == (1, 2) else [0.5]
+    for pyramid_scale in pyramid_scales:
+        detector = ChessboardPointDetector(
+            (13, 10), 3, scale=scale, pyramid_scale=pyramid_scale,
+            scale_refinement_window=scale_refinement_window)
+        ids, _, image_points = detector.get_points(image)
+        np.testing.assert_array_equal(ids, expected_ids)
+        np.testing.assert_allclose(image_points, expected, atol=0.01)
+
+
+def test_chessboard_detector_tracking_mode():
+    image = cv2.imread('tests/data/calib-ucl-chessboard/leftImage.png')
+    reference = ChessboardPointDetector((13, 10), 3)
+    expected_ids, expected_object_points, expected_image_points = reference.get_points(image)
+
+    detector = ChessboardPointDetector((13, 10), 3, tracking=True)
+    assert detector.tracked_roi is None
+
+    # First frame, searches everything, then tracks.
+    ids, object_points, image_points = detector.get_points(image)
+    np.testing.assert_array_equal(ids, expected_ids)
+    np.testing.assert_allclose(image_points, expected_image_points)
+    min_x, min_y, max_x, max_y = detector.tracked_roi
+    assert (max_x - min_x) * (max_y - min_y) < image.shape[0] * image.shape[1]
+
+    # Second frame, moved a bit, searches only the ROI.
+    shift = (25, 10)
+    moved = np.roll(image, shift, axis=(1, 0))
+    ids, object_points, image_points = detector.get_points(moved)
+    np.testing.assert_array_equal(ids, expected_ids)
+    np.testing.assert_array_equal(object_points, expected_object_points)
+    np.testing.assert_allclose(image_points, expected_image_points + shift, atol=0.01)
+
+    # Missing, so it resets.
+    ids, _, image_points = detector.get_points(np.zeros_like(image))
+    assert ids.shape[0] == 0
+    assert image_points.shape[0] == 0
+    assert detector.tracked_roi is None
+
+    # Moved partly outside the old ROI, so falls back to the full frame.
+    detector.get_points(image)
+    moved = np.roll(image, (500, 0), axis=(1, 0))
+    ids, _, image_points = detector.get_points(moved)
+    np.testing.assert_array_equal(ids, expected_ids)
+    np.testing.assert_allclose(image_points, expected_image_points + (500, 0), atol=0.01)
+
+
+def test_chessboard_detector_config():
+    image = cv2.imread('tests/data/calib-ucl-chessboard/leftImage.png')
+    detector = ChessboardPointDetector((13, 10), 3, scale=(1, 2))
+    config = detector.get_config()
+    assert config['number_of_corners'] == (13, 10)
+    assert config['scale'] == (1, 2)
+
+    copied = pickle.loads(pickle.dumps(detector))
+    assert isinstance(copied, ChessboardPointDetector)
+    for expected, actual in zip(detector.get_points(image), copied.get_points(image)):
+        np.testing.assert_array_equal(expected, actual)
+
+
+def test_chessboard_detector_fast_check():
+    chessboard = cv2.imread('tests/data/calib-ucl-chessboard/leftImage.png')
+    dots = cv2.imread('tests/data/calib-ucl-circles/detecting_same_point_twice_dots.png')
+    blank = np.full((1080, 1920), 128, dtype=np.uint8)
+
+    detector = ChessboardPointDetector((13, 10), 3)
+    fast_detector = ChessboardPointDetector((13, 10), 3, fast_check=True)
+    assert fast_detector.get_config()['fast_check']
+
+    # Chessboard frames are not rejected, so results are unchanged.
+    for expected, actual in zip(detector.get_points(chessboard),
+                                fast_detector.get_points(chessboard)):
+        np.testing.assert_array_equal(expected, actual)
+
+    for image in [dots, blank]:
+        ids, object_points, image_points = fast_detector.get_points(image)
+        assert ids.shape == (0, 1)
+        assert object_points.shape == (0, 3)
+        assert image_points.shape == (0, 2)
+
+    statistics = fast_detector.get_fast_check_statistics()
+    assert statistics['frames'] == 3
+    assert statistics['rejected'] == 2
+    assert statistics['passed'] == 1
+    assert statistics['found'] == 1
+    assert statistics['rejection_rate'] == 2 / 3
+    assert statistics['hit_rate'] == 1
+    assert statistics['miss_rate'] == 0
+
+    fast_detector.reset_fast_check_statistics()
+    assert fast_detector.get_fast_check_statistics()['frames'] == 0
+    assert detector.get_fast_check_statistics()['frames'] == 0
+
+    with pytest.raises(ValueError):
+        ChessboardPointDetector((13, 10), 3, fast_check=True, fast_check_size=0)
+
+
+def test_get_refinement_half_window():
+    grid = np.mgrid[0:4, 0:3].T.reshape(-1, 1, 2).astype(np.float32)
+    assert cpd.get_refinement_half_window(grid * 100, (4, 3)) == 11
+    assert cpd.get_refinement_half_window(grid * 20, (4, 3)) == 8
+    assert cpd.get_refinement_half_window(grid * 2, (4, 3)) == 2
+    stretched = grid * [100, 10]
+    assert cpd.get_refinement_half_window(stretched, (4, 3)) == 4
+
+
+def _make_corners(number_of_corners):
+    return np.array([[[x * 10 + 10, y * 10 + 10]]
+                     for y in range(number_of_corners[1])
+                     for x in range(number_of_corners[0])], dtype=np.float32)
+
+
+def test_canonicalise_corner_order():
+    # Even by even, rotationally symmetric, so the first row is the top.
+    image = np.zeros((50, 50), dtype=np.uint8)
+    corners = _make_corners((4, 2))
+    np.testing.assert_array_equal(
+        cpd.canonicalise_corner_order(image, corners, (4, 2)), corners)
+    np.testing.assert_array_equal(
+        cpd.canonicalise_corner_order(image, corners[::-1], (4, 2)), corners)
+
+    # Odd by even, so the first corner is next to a dark square.
+    corners = _make_corners((3, 2))
+    image[10:20, 20:30] = 255
+    np.testing.assert_array_equal(
+        cpd.canonicalise_corner_order(image, corners, (3, 2)), corners)
+    np.testing.assert_array_equal(
+        cpd.canonicalise_corner_order(255 - image, corners, (3, 2)),
+        corners[::-1])
+
+
+def test_chessboard_detector_backends():
+    image = cv2.imread('tests/data/calib-opencv/left01.jpg')
+    detector = ChessboardPointDetector((9, 6), 3)
+    ids, object_points, image_points = detector.get_points(image)
+    assert ids.shape[0] == 54
+
+    scaled = ChessboardPointDetector((9, 6), 3, scale_refinement_window=True)
+    assert scaled.get_config()['scale_refinement_window']
+    _, _, scaled_points = scaled.get_points(image)
+    np.testing.assert_allclose(image_points, scaled_points, atol=0.5)
+
+    sector_based = ChessboardPointDetector(
+        (9, 6), 3, backend=cpd.FIND_CHESSBOARD_CORNERS_SB)
+    assert sector_based.get_config()['backend'] == cpd.FIND_CHESSBOARD_CORNERS_SB
+    sb_ids, sb_object_points, sb_image_points = sector_based.get_points(image)
+    np.testing.assert_array_equal(ids, sb_ids)
+    np.testing.assert_array_equal(object_points, sb_object_points)
+    assert sb_image_points.shape == (54, 2)
+
+    # Corners are in the same order, to within a pixel.
+    np.testing.assert_allclose(image_points, sb_image_points, atol=1.0)
+
+    # Including for other boards and orientations.
+    image = cv2.imread('tests/data/calibration/pattern_4x4_19x26_5_4_with_inset_9x14.png')
+    detector = ChessboardPointDetector((8, 13), 3)
+    sector_based = ChessboardPointDetector(
+        (8, 13), 3, backend=cpd.FIND_CHESSBOARD_CORNERS_SB)
+    for rotation in [None, cv2.ROTATE_90_CLOCKWISE, cv2.ROTATE_180]:
+        rotated = image if rotation is None else cv2.rotate(image, rotation)
+        _, _, image_points = detector.get_points(rotated)
+        _, _, sb_image_points = sector_based.get_points(rotated)
+        np.testing.assert_allclose(image_points, sb_image_points, atol=1.0)
+
+    with pytest.raises(ValueError):
+        ChessboardPointDetector((9, 6), 3, backend='findCirclesGrid')
@@ -4,8 +4,10 @@
 Tests for dotty grid implementation of PointDetector.
 """
 
+import pickle
 import numpy as np
 import cv2
+import pytest
 import tests.calibration.test_dotty_grid_utils as tdgu
 import sksurgeryimage.calibration.dotty_grid_point_detector as dotty_pd
 
@@ -615,3 +617,240 @@ def test_distorted_and_undistorted(setup_dotty_metal_model_OR):
     )
 
     assert (num_3 > 369 and num_3 < 373)
+
+
+def test_pyramid_mode(setup_dotty_metal_model_OR):
+    model_points = setup_dotty_metal_model_OR
+    image = cv2.imread('tests/data/calib-ucl-circles/detecting_same_point_twice_dots.png')
+    intrinsics = np.loadtxt('tests/data/calib-ucl-circles/10_54_44/viking.calib.left.intrinsics.txt')
+    distortion = np.loadtxt('tests/data/calib-ucl-circles/10_54_44/viking.calib.right.distortion.txt')
+
+    results = []
+    for pyramid_scale in [None, 0.5]:
+        detector = dotty_pd.DottyGridPointDetector(model_points,
+                                                   [133, 141, 308, 316],
+                                                   intrinsics,
+                                                   distortion,
+                                                   reference_image_size=(2600, 1900),
+                                                   pyramid_scale=pyramid_scale,
+                                                   refinement_half_window=20)
+        ids, _, image_points = detector.get_points(image)
+        results.append(dict(zip(ids[:, 0].tolist(), image_points)))
+
+    assert len(results[1]) > 360
+    common = set(results[0]) & set(results[1])
+    assert len(common) > 360
+    errors = [np.linalg.norm(results[0][idx] - results[1][idx]) for idx in common]
+    assert np.median(errors) < 0.5
+    assert np.max(errors) < 2
+
+
+def test_get_otsu_thresholds():
+    generator = np.random.default_rng(seed=1)
+    patches = [generator.integers(0, 256, (15, 17), dtype=np.uint8),
+               np.full((9, 9), 17, dtype=np.uint8),
+               np.where(generator.random((11, 11)) < 0.3, 40, 200)
+               .astype(np.uint8)]
+    histograms = [np.bincount(patch.ravel(), minlength=256)
+                  for patch in patches]
+    thresholds = dotty_pd.get_otsu_thresholds(histograms)
+    for patch, threshold in zip(patches, thresholds):
+        expected, _ = cv2.threshold(patch, 0, 255,
+                                    cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        assert threshold == expected
+
+
+def test_refine_points(setup_dotty_metal_model_OR):
+    model_points = setup_dotty_metal_model_OR
+    image = np.full((100, 120), 255, dtype=np.uint8)
+    cv2.circle(image, (50, 40), 6, 0, -1)
+    cv2.circle(image, (3, 60), 6, 0, -1)
+    detector = dotty_pd.DottyGridPointDetector(model_points,
+                                               [133, 141, 308, 316],
+                                               np.eye(3),
+                                               np.zeros(5),
+                                               reference_image_size=(2600, 1900),
+                                               pyramid_scale=0.5,
+                                               refinement_half_window=10)
+    points = np.array([[51.6, 38.7],  # Refined to the dot centre.
+                       [3.2, 61.0],  # Dot cut by the image edge, kept.
+                       [80.0, 80.0],  # No dot, kept.
+                       [-5.0, 50.0]])  # Outside the image, kept.
+    refined = detector._refine_points(image, points)
+    np.testing.assert_allclose(refined[0], [50, 40], atol=1e-6)
+    np.testing.assert_array_equal(refined[1:], points[1:])
+    assert 'refinement' in detector.get_stage_timings()
+
+
+def test_pickle_round_trip(setup_dotty_metal_model_OR):
+    model_points = setup_dotty_metal_model_OR
+    image = cv2.imread('tests/data/calib-ucl-circles/detecting_same_point_twice_dots.png')
+    intrinsics = np.loadtxt('tests/data/calib-ucl-circles/10_54_44/viking.calib.left.intrinsics.txt')
+    distortion = np.loadtxt('tests/data/calib-ucl-circles/10_54_44/viking.calib.right.distortion.txt')
+    detector = dotty_pd.DottyGridPointDetector(model_points,
+                                               [133, 141, 308, 316],
+                                               intrinsics,
+                                               distortion,
+                                               reference_image_size=(2600, 1900))
+
+    copied = pickle.loads(pickle.dumps(detector))
+    assert copied.dot_detector_params.minArea == detector.dot_detector_params.minArea
+
+    for expected, actual in zip(detector.get_points(image), copied.get_points(image)):
+        np.testing.assert_array_equal(expected, actual)
+
+
+def test_find_nearest_points():
+    generator = np.random.default_rng(seed=3)
+    reference_points = generator.random((300, 2)) * 1000
+    points = generator.random((50, 2)) * 1000
+    # Include exact hits, and a tie, which should go to the lowest index.
+    points[0] = reference_points[10]
+    reference_points[20] = reference_points[10]
+
+    indexes, distances = dotty_pd.find_nearest_points(points,
+                                                      reference_points,
+                                                      chunk_size=7)
+    for i, point in enumerate(points):
+        squared = np.sum((reference_points - point) ** 2, axis=1)
+        assert indexes[i] == np.argmin(squared)
+        assert distances[i] == pytest.approx(np.min(squared))
+    assert indexes[0] == 10
+    assert distances[0] == 0
+
+
+def test_cached_undistortion_and_timings(setup_dotty_metal_model_OR):
+    model_points = setup_dotty_metal_model_OR
+    image = cv2.imread('tests/data/calib-ucl-circles/detecting_same_point_twice_dots.png')
+    intrinsics = np.loadtxt('tests/data/calib-ucl-circles/10_54_44/viking.calib.left.intrinsics.txt')
+    distortion = np.loadtxt('tests/data/calib-ucl-circles/10_54_44/viking.calib.right.distortion.txt')
+    detector = dotty_pd.DottyGridPointDetector(model_points,
+                                               [133, 141, 308, 316],
+                                               intrinsics,
+                                               distortion,
+                                               reference_image_size=(2600, 1900))
+    ids_1, _, image_points_1 = detector.get_points(image)
+    assert len(detector._undistort_maps) == 1
+    timings = detector.get_stage_timings()
+    for stage in ['smoothing', 'thresholding', 'blob_detection',
+                  'undistortion', 'warping', 'matching', 'distortion']:
+        assert timings[stage] >= 0
+
+    ids_2, _, image_points_2 = detector.get_points(image)
+    assert len(detector._undistort_maps) == 1
+    np.testing.assert_array_equal(ids_1, ids_2)
+    np.testing.assert_array_equal(image_points_1, image_points_2)
+
+    grey = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    smoothed = cv2.GaussianBlur(grey, (5, 5), 0)
+    np.testing.assert_array_equal(detector._undistort(smoothed, intrinsics),
+                                  cv2.undistort(smoothed, intrinsics, distortion))
+
+    detector.set_camera_parameters(intrinsics, np.zeros(5))
+    assert len(detector._undistort_maps) == 0
+    np.testing.assert_array_equal(detector._undistort(smoothed, intrinsics),
+                                  smoothed)
+
+
+def test_undistortion_maps_are_bounded(setup_dotty_metal_model_OR):
+    model_points = setup_dotty_metal_model_OR
+    intrinsics = np.loadtxt('tests/data/calib-ucl-circles/10_54_44/viking.calib.left.intrinsics.txt')
+    distortion = np.loadtxt('tests/data/calib-ucl-circles/10_54_44/viking.calib.right.distortion.txt')
+    detector = dotty_pd.DottyGridPointDetector(model_points,
+                                               [133, 141, 308, 316],
+                                               intrinsics,
+                                               distortion,
+                                               reference_image_size=(2600, 1900))
+    images = [np.zeros((100 + 10 * i, 200), dtype=np.uint8)
+              for i in range(dotty_pd.UNDISTORT_MAPS_CACHE_SIZE + 1)]
+    for image in images:
+        detector._undistort(image, intrinsics)
+    assert len(detector._undistort_maps) == \
+        dotty_pd.UNDISTORT_MAPS_CACHE_SIZE
+
+    # The least recently used map is removed first.
+    sizes = [key[0:2] for key in detector._undistort_maps]
+    assert (200, 100) not in sizes
+    assert sizes[-1] == (200, 100 + 10 * dotty_pd.UNDISTORT_MAPS_CACHE_SIZE)
+
+    detector._undistort(images[1], intrinsics)
+    sizes = [key[0:2] for key in detector._undistort_maps]
+    assert sizes[-1] == (200, 110)
+
+    undistorted = detector._undistort(images[0], intrinsics)
+    np.testing.assert_array_equal(undistorted,
+                                  cv2.undistort(images[0], intrinsics,
+                                                distortion))
+    assert len(detector._undistort_maps) == \
+        dotty_pd.UNDISTORT_MAPS_CACHE_SIZE
+
+
+def test_find_dots():
+    image = np.full((200, 300), 255, dtype=np.uint8)
+    cv2.circle(image, (50, 60), 10, 0, -1)
+    cv2.circle(image, (150, 100), 15, 0, -1)
+    cv2.rectangle(image, (200, 20), (290, 25), 0, -1)  # Too thin.
+    cv2.circle(image, (0, 150), 10, 0, -1)  # Touching the border.
+    dots = dotty_pd.find_dots(image, image, min_area=50, min_inertia_ratio=0.1)
+    assert dots.shape == (2, 3)
+    dots = dots[np.argsort(dots[:, 1])]
+    np.testing.assert_allclose(dots[:, 1:3], [[50, 60], [150, 100]], atol=1e-6)
+    np.testing.assert_allclose(dots[:, 0], [20, 30], rtol=0.05)
+
+    # Centres are weighted by intensity, so are subpixel.
+    blurred = cv2.GaussianBlur(image, (7, 7), 0)
+    shifted = np.float32([[1, 0, 0.25], [0, 1, 0.5]])
+    blurred = cv2.warpAffine(blurred, shifted, (300, 200),
+                             borderValue=255)
+    thresholded = cv2.threshold(blurred, 128, 255, cv2.THRESH_BINARY)[1]
+    dots = dotty_pd.find_dots(thresholded, blurred, min_area=50,
+                              min_inertia_ratio=0.1)
+    dots = dots[np.argsort(dots[:, 1])]
+    np.testing.assert_allclose(dots[:, 1:3], [[50.25, 60.5], [150.25, 100.5]],
+                               atol=0.1)
+
+    assert dotty_pd.find_dots(np.full((20, 20), 255, dtype=np.uint8),
+                              np.full((20, 20), 255, dtype=np.uint8)).shape \
+        == (0, 3)
+
+
+def test_connected_components_localiser(setup_dotty_metal_model_OR):
+    model_points = setup_dotty_metal_model_OR
+    image = cv2.imread('tests/data/calib-ucl-circles/detecting_same_point_twice_dots.png')
+    intrinsics = np.loadtxt('tests/data/calib-ucl-circles/10_54_44/viking.calib.left.intrinsics.txt')
+    distortion = np.loadtxt('tests/data/calib-ucl-circles/10_54_44/viking.calib.right.distortion.txt')
+
+    with pytest.raises(ValueError):
+        dotty_pd.DottyGridPointDetector(model_points,
+                                        [133, 141, 308, 316],
+                                        intrinsics,
+                                        distortion,
+                                        reference_image_size=(2600, 1900),
+                                        dot_localiser='hough')
+
+    blob_detector = dotty_pd.DottyGridPointDetector(
+        model_points, [133, 141, 308, 316], intrinsics, distortion,
+        reference_image_size=(2600, 1900))
+    detector = dotty_pd.DottyGridPointDetector(
+        model_points, [133, 141, 308, 316], intrinsics, distortion,
+        reference_image_size=(2600, 1900),
+        dot_localiser=dotty_pd.CONNECTED_COMPONENTS)
+    assert detector.get_config()['dot_localiser'] \
+        == dotty_pd.CONNECTED_COMPONENTS
+    assert pickle.loads(pickle.dumps(detector)).dot_localiser \
+        == dotty_pd.CONNECTED_COMPONENTS
+
+    blob_ids, _, blob_image_points = blob_detector.get_points(image)
+    ids, object_points, image_points = detector.get_points(image)
+    assert 'dot_localisation' in detector.get_stage_timings()
+    assert ids.shape[0] >= blob_ids.shape[0]
+    assert object_points.shape == (ids.shape[0], 3)
+    assert len(np.unique(ids)) == ids.shape[0]
+
+    # Where both localisers find a dot, they agree to within a pixel.
+    _, in_blob, in_components = np.intersect1d(blob_ids[:, 0], ids[:, 0],
+                                               return_indices=True)
+    assert len(in_blob) > 0.9 * blob_ids.shape[0]
+    distances = np.linalg.norm(blob_image_points[in_blob]
+                               - image_points[in_components], axis=1)
+    assert np.median(distances) < 1.0
@@ -0,0 +1,104 @@
+# coding=utf-8
+
+"""
+Tests for PointDetectionResult.
+"""
+
+import pickle
+import cv2
+import numpy as np
+import pytest
+import sksurgeryimage.calibration.point_detection_result as pdr
+from sksurgeryimage.calibration.chessboard_point_detector import ChessboardPointDetector
+from sksurgeryimage.calibration.charuco_point_detector import CharucoPointDetector
+
+
+def test_result_layout():
+    ids = np.array([[3], [1]], dtype=np.int16)
+    object_points = np.array([[1, 2, 0], [4, 5, 0]], dtype=np.float64)
+    image_points = np.array([[[10.5, 20.25]], [[30.0, 40.75]]])
+    result = pdr.PointDetectionResult(ids, object_points, image_points)
+
+    assert len(result) == 2
+    assert result.ids.dtype == np.int32
+    assert result.object_points.dtype == np.float32
+    assert result.image_points.dtype == np.float32
+    assert result.object_points.shape == (2, 3)
+    assert result.image_points.shape == (2, 2)
+    assert result.object_points.flags['C_CONTIGUOUS']
+    assert result.image_points.flags['C_CONTIGUOUS']
+    assert np.shares_memory(result.object_points, result._points)
+    assert np.shares_memory(result.image_points, result._points)
+    np.testing.assert_array_equal(result.object_points, object_points)
+    np.testing.assert_array_equal(result.image_points,
+                                  image_points.reshape(-1, 2))
+
+    returned_ids, _, _ = result.get_points()
+    assert returned_ids.shape == (2, 1)
+    np.testing.assert_array_equal(returned_ids, ids)
+
+    copied = pickle.loads(pickle.dumps(result))
+    np.testing.assert_array_equal(copied.ids, result.ids)
+    np.testing.assert_array_equal(copied.image_points, result.image_points)
+
+    with pytest.raises(AttributeError):
+        result.extra = 1
+
+
+def test_empty_and_invalid_results():
+    result = pdr.PointDetectionResult(np.zeros((0, 1)),
+                                      np.zeros((0, 3)),
+                                      np.zeros((0, 2)))
+    assert len(result) == 0
+    assert result.object_points.shape == (0, 3)
+    assert result.image_points.shape == (0, 2)
+
+    with pytest.raises(ValueError):
+        pdr.PointDetectionResult(np.zeros((2, 1)), np.zeros((1, 3)), np.zeros((2, 2)))
+    with pytest.raises(ValueError):
+        pdr.PointDetectionResult(np.zeros((2, 1)), np.zeros((2, 3)), np.zeros((3, 2)))
+
+
+def test_detectors_return_consistent_results():
+    chessboard = cv2.imread('tests/data/calib-ucl-chessboard/leftImage.png')
+    charuco = cv2.imread('tests/data/calibration/test-charuco.png')
+    dictionary = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_250)
+    for detector, image in [(ChessboardPointDetector((13, 10), 3), chessboard),
+                            (ChessboardPointDetector((13, 10), 3), charuco),
+                            (CharucoPointDetector(dictionary, (13, 10), (3, 2)),
+                             charuco)]:
+        ids, object_points, image_points = detector.get_points(image)
+        result = detector.get_result(image)
+        assert result.ids.dtype == np.int32
+        assert len(result) == ids.shape[0]
+        np.testing.assert_array_equal(result.ids, ids.reshape(-1))
+        np.testing.assert_allclose(result.object_points, object_points, rtol=1e-6)
+        np.testing.assert_allclose(result.image_points, image_points, rtol=1e-6)
+
+
+def test_get_calibration_inputs():
+    image = cv2.imread('tests/data/calibration/test-charuco.png')
+    dictionary = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_250)
+    detector = CharucoPointDetector(dictionary, (13, 10), (3, 2))
+    height, width = image.shape[0:2]
+    homography = np.array([[0.9, 0.1, 20], [-0.05, 0.85, 30], [1e-4, 5e-5, 1]])
+    warped = cv2.warpPerspective(image, homography, (width, height),
+                                 borderValue=(255, 255, 255))
+    empty = detector.get_result(np.zeros_like(image))
+    results = [detector.get_result(image),
+               empty,
+               detector.get_result(cv2.rotate(image, cv2.ROTATE_180)),
+               detector.get_result(warped)]
+    assert len(empty) == 0
+
+    object_points, image_points = pdr.get_calibration_inputs(results, 6)
+    assert len(object_points) == 3
+    assert np.shares_memory(object_points[0], results[0]._points)
+    assert np.shares_memory(image_points[0], results[0]._points)
+
+    rms, _, _, _, _ = cv2.calibrateCamera(object_points,
+                                          image_points,
+                                          (width, height),
+                                          None,
+                                          None)
+    assert rms < 1
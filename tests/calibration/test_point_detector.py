@@ -70,3 +70,21 @@ def test_invalid_as_setting_invalid_distortion_params():
     with pytest.raises(ValueError):
         detector.set_camera_parameters(camera_intrinsics=np.eye(3),
                                        distortion_coefficients=np.zeros((2, 5)))
+
+
+def test_invalid_pyramid_scale():
+    with pytest.raises(ValueError):
+        PointDetector(pyramid_scale=0)
+    with pytest.raises(ValueError):
+        PointDetector(pyramid_scale=1.5)
+    with pytest.raises(ValueError):
+        PointDetector(pyramid_scale=0.5, refinement_half_window=0)
+
+
+def test_default_refinement_window():
+    detector = PointDetector(pyramid_scale=0.25)
+    assert detector.refinement_half_window == 8
+    detector = PointDetector(pyramid_scale=0.01)
+    assert detector.refinement_half_window == 11
+    detector = PointDetector(pyramid_scale=0.01, refinement_half_window=50)
+    assert detector.refinement_half_window == 50
@@ -0,0 +1,93 @@
+# coding=utf-8
+
+"""
+Tests for running PointDetectors over batches of frames.
+"""
+
+import functools
+import cv2
+import numpy as np
+import pytest
+import sksurgeryimage.calibration.point_detector_batch as pdb
+from sksurgeryimage.calibration.chessboard_point_detector import ChessboardPointDetector
+from sksurgeryimage.calibration.charuco_point_detector import CharucoPointDetector
+
+
+def _make_charuco_detector(number_of_squares, size):
+    dictionary = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_250)
+    return CharucoPointDetector(dictionary, number_of_squares, size)
+
+
+def _make_frames():
+    image = cv2.imread('tests/data/calib-ucl-chessboard/leftImage.png')
+    return [image, np.zeros_like(image), np.roll(image, 50, axis=1), image]
+
+
+@pytest.mark.parametrize("number_of_workers", [1, 2])
+def test_batch_matches_sequential(number_of_workers):
+    frames = _make_frames()
+    detector = ChessboardPointDetector((13, 10), 3)
+    expected = [detector.get_points(frame) for frame in frames]
+
+    results = pdb.get_points_batch(detector, frames,
+                                   number_of_workers=number_of_workers,
+                                   max_pending=1)
+    assert len(results) == len(frames)
+    for result, (ids, object_points, image_points) in zip(results, expected):
+        np.testing.assert_array_equal(result[0], ids)
+        np.testing.assert_array_equal(result[1], object_points)
+        np.testing.assert_array_equal(result[2], image_points)
+        assert result[3] > 0
+    assert results[1][0].shape[0] == 0
+
+
+def test_batch_turns_off_tracking_in_workers():
+    frames = _make_frames()
+    expected = [ChessboardPointDetector((13, 10), 3).get_points(frame)
+                for frame in frames]
+    detector = ChessboardPointDetector((13, 10), 3, tracking=True)
+    results = pdb.get_points_batch(detector, frames, number_of_workers=2)
+    for result, (ids, _, image_points) in zip(results, expected):
+        np.testing.assert_array_equal(result[0], ids)
+        np.testing.assert_array_equal(result[2], image_points)
+    assert detector.tracking
+
+    factory = functools.partial(ChessboardPointDetector, (13, 10), 3,
+                                tracking=True)
+    pdb._initialise_worker(factory)
+    assert not pdb._WORKER_DETECTOR.tracking
+    cv2.setNumThreads(-1)
+
+
+def test_batch_with_factory_and_iterator():
+    image = cv2.imread('tests/data/calibration/test-charuco.png')
+    factory = functools.partial(_make_charuco_detector, (13, 10), (3, 2))
+    frames = (image for _ in range(3))
+    results = list(pdb.iterate_points_batch(factory, frames, number_of_workers=2))
+    assert len(results) == 3
+    for ids, _, _, _ in results:
+        assert ids.shape[0] == 108
+
+
+def test_batch_from_video_file():
+    detector = ChessboardPointDetector((13, 10), 3)
+    results = pdb.get_points_batch(detector,
+                                   'tests/data/calib-ucl-chessboard/leftImage.avi',
+                                   number_of_workers=1)
+    assert len(results) == 1
+    assert results[0][0].shape[0] == 130
+
+
+def test_batch_invalid_arguments():
+    frames = _make_frames()
+    with pytest.raises(ValueError):
+        pdb.get_points_batch(ChessboardPointDetector((13, 10), 3), frames,
+                             number_of_workers=0)
+    with pytest.raises(TypeError):
+        pdb.get_points_batch("not a detector", frames, number_of_workers=1)
+    with pytest.raises(TypeError):
+        pdb.get_points_batch(lambda: "not a detector", frames, number_of_workers=1)
+    with pytest.raises(ValueError):
+        pdb.get_points_batch(ChessboardPointDetector((13, 10), 3),
+                             'tests/data/no_such_file.avi',
+                             number_of_workers=1)
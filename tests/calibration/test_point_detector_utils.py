@@ -0,0 +1,105 @@
+# coding=utf-8
+
+"""
+Tests for point_detector_utils.
+"""
+
+import cv2
+import numpy as np
+import pytest
+import sksurgeryimage.calibration.point_detector_utils as pdu
+
+
+def test_get_intersects_matches_get_intersect():
+    generator = np.random.default_rng(seed=1)
+    points = generator.random((4, 50, 2)) * 100
+    intersects = pdu.get_intersects(points[0], points[1], points[2], points[3])
+    assert intersects.shape == (50, 2)
+    for i in range(50):
+        expected = pdu.get_intersect(points[0][i], points[1][i],
+                                     points[2][i], points[3][i])
+        np.testing.assert_allclose(intersects[i], expected)
+
+
+def test_get_intersects_parallel():
+    intersects = pdu.get_intersects(np.array([[0, 0], [0, 0]]),
+                                    np.array([[1, 1], [2, 2]]),
+                                    np.array([[0, 1], [2, 0]]),
+                                    np.array([[1, 2], [0, 2]]))
+    assert np.all(np.isinf(intersects[0]))
+    np.testing.assert_allclose(intersects[1], [1, 1])
+
+
+def test_dense_model():
+    model = {3: np.array([[1, 2, 3]]), 7: np.array([4, 5, 6])}
+    is_in_model, dense_points = pdu.create_dense_model(model)
+    assert is_in_model.shape == (8,)
+    assert np.count_nonzero(is_in_model) == 2
+    np.testing.assert_array_equal(dense_points[3], [1, 2, 3])
+    np.testing.assert_array_equal(dense_points[7], [4, 5, 6])
+
+    ids = np.array([[7], [1], [3], [100], [-1]])
+    mask = pdu.get_model_mask(ids, is_in_model)
+    np.testing.assert_array_equal(mask, [True, False, True, False, False])
+    assert pdu.get_number_of_points(ids, model) == 2
+    assert pdu.get_number_of_points(None, model) == 0
+    assert pdu.get_model_mask(None, is_in_model).shape == (0,)
+
+    with pytest.raises(ValueError):
+        pdu.create_dense_model({-1: np.zeros(3)})
+
+
+def test_distort_points_inverts_undistort_points():
+    camera_matrix = np.array([[1000, 0, 960], [0, 1010, 540], [0, 0, 1]],
+                             dtype=np.float64)
+    generator = np.random.default_rng(seed=2)
+    distorted = generator.random((100, 2)) * [1920, 1080]
+    for distortion in [np.array([-0.3, 0.1, 0.001, -0.002]),
+                       np.array([-0.3, 0.1, 0.001, -0.002, 0.01]),
+                       np.array([-0.3, 0.1, 0.001, -0.002, 0.01,
+                                 0.02, 0.01, 0.005]),
+                       np.array([-0.3, 0.1, 0.001, -0.002, 0.01,
+                                 0.02, 0.01, 0.005, 0.001, 0.0005,
+                                 -0.001, 0.0002])]:
+        undistorted = cv2.undistortPointsIter(
+            distorted.reshape(-1, 1, 2), camera_matrix, distortion,
+            np.eye(3), camera_matrix,
+            (cv2.TERM_CRITERIA_COUNT | cv2.TERM_CRITERIA_EPS, 100, 1e-12))
+        redistorted = pdu.distort_points(undistorted, camera_matrix, distortion)
+        np.testing.assert_allclose(redistorted, distorted, atol=1e-3)
+
+    assert pdu.distort_points(np.zeros((0, 2)), camera_matrix,
+                              np.zeros(5)).shape == (0, 2)
+
+
+def test_distort_points_matches_brown_conrady():
+    camera_matrix = np.array([[800, 0, 320], [0, 820, 240], [0, 0, 1]],
+                             dtype=np.float64)
+    k_1, k_2, p_1, p_2, k_3 = -0.2, 0.05, 0.001, 0.002, 0.01
+    points = np.array([[10, 20], [320, 240], [600, 400]], dtype=np.float64)
+    distorted = pdu.distort_points(points, camera_matrix,
+                                   np.array([k_1, k_2, p_1, p_2, k_3]))
+    for point, result in zip(points, distorted):
+        x = (point[0] - 320) / 800
+        y = (point[1] - 240) / 820
+        r_2 = x * x + y * y
+        radial = 1 + k_1 * r_2 + k_2 * r_2 * r_2 + k_3 * r_2 * r_2 * r_2
+        x_d = x * radial + 2 * p_1 * x * y + p_2 * (r_2 + 2 * x * x)
+        y_d = y * radial + p_1 * (r_2 + 2 * y * y) + 2 * p_2 * x * y
+        np.testing.assert_allclose(result, [x_d * 800 + 320, y_d * 820 + 240])
+
+
+def test_keypoints_to_array():
+    keypoints = [cv2.KeyPoint(1.5, 2.25, 10), cv2.KeyPoint(100, 200.5, 3.5)]
+    array = pdu.keypoints_to_array(keypoints)
+    np.testing.assert_array_equal(array, [[10, 1.5, 2.25], [3.5, 100, 200.5]])
+    np.testing.assert_array_equal(pdu.keypoints_to_array(tuple(keypoints)), array)
+
+    assert pdu.keypoints_to_array([]).shape == (0, 3)
+
+
+def test_scale_camera_matrix():
+    camera_matrix = np.array([[800.0, 0, 319.5], [0, 820, 239.5], [0, 0, 1]])
+    scaled = pdu.scale_camera_matrix(camera_matrix, 0.5)
+    np.testing.assert_allclose(scaled, [[400, 0, 159.5], [0, 410, 119.5], [0, 0, 1]])
+    assert camera_matrix[0][0] == 800
@@ -0,0 +1,100 @@
+# coding=utf-8
+
+"""
+Tests for the vectorised reprojection error functions.
+"""
+
+import cv2
+import numpy as np
+import pytest
+import sksurgeryimage.calibration.reprojection_error as re
+from sksurgeryimage.calibration.point_detection_result import PointDetectionResult
+
+INTRINSICS = np.array([[800.0, 0, 330], [0, 790, 250], [0, 0, 1]])
+DISTORTION = np.array([0.1, -0.05, 0.001, -0.002, 0.01])
+
+
+def _make_frames(number_of_frames, noise=0.0, seed=0):
+    rng = np.random.default_rng(seed)
+    board = np.zeros((54, 3))
+    board[:, 0:2] = np.mgrid[0:9, 0:6].T.reshape(-1, 2) * 20
+    rvecs = rng.normal(0, 0.3, (number_of_frames, 3))
+    tvecs = np.column_stack((rng.normal(-80, 20, number_of_frames),
+                             rng.normal(-50, 20, number_of_frames),
+                             rng.normal(450, 50, number_of_frames)))
+    frames = []
+    for rvec, tvec in zip(rvecs, tvecs):
+        image_points, _ = cv2.projectPoints(board, rvec, tvec,
+                                            INTRINSICS, DISTORTION)
+        image_points = image_points.reshape(-1, 2) \
+            + rng.normal(0, noise, (54, 2))
+        frames.append((np.arange(54).reshape(-1, 1), board, image_points))
+    return frames, rvecs, tvecs
+
+
+def test_rotate_points_matches_rodrigues():
+    rng = np.random.default_rng(1)
+    points = rng.normal(0, 10, (20, 3))
+    rotations = rng.normal(0, 1, (20, 3))
+    rotations[0] = 0
+    rotated = re.rotate_points(points, rotations)
+    for point, rotation, expected in zip(points, rotations, rotated):
+        matrix, _ = cv2.Rodrigues(rotation)
+        np.testing.assert_allclose(expected, matrix @ point, atol=1e-10)
+
+
+def test_project_points_matches_opencv():
+    frames, rvecs, tvecs = _make_frames(5)
+    frame_indexes, object_points, image_points = re.concatenate_results(frames)
+    assert frame_indexes.shape == (270,)
+    projected = re.project_points(frame_indexes, object_points, rvecs, tvecs,
+                                  INTRINSICS, DISTORTION)
+    np.testing.assert_allclose(projected, image_points, atol=1e-6)
+
+
+def test_evaluate_with_given_and_estimated_poses():
+    frames, rvecs, tvecs = _make_frames(10, noise=0.2)
+    frames[3] = (np.zeros((0, 1)), np.zeros((0, 3)), np.zeros((0, 2)))
+    frames[5] = PointDetectionResult(*frames[5])
+
+    given = re.evaluate_reprojection_errors(frames, INTRINSICS, DISTORTION,
+                                            rvecs, tvecs,
+                                            seconds=np.full(10, 0.01))
+    assert given['point_errors'].shape == (9 * 54,)
+    assert np.isnan(given['frame_rms'][3])
+    summary = given['summary']
+    assert summary['number_of_frames'] == 10
+    assert summary['number_of_frames_evaluated'] == 9
+    assert summary['number_of_points'] == 9 * 54
+    assert summary['rms'] == pytest.approx(0.2 * np.sqrt(2), rel=0.15)
+    assert summary['median'] <= summary['percentile_95'] <= summary['max']
+    assert summary['mean_seconds_per_frame'] == pytest.approx(0.01)
+
+    # Per frame RMS matches a per frame loop.
+    for frame in [0, 5, 9]:
+        _, object_points, image_points = frames[frame] \
+            if isinstance(frames[frame], tuple) else frames[frame].get_points()
+        projected, _ = cv2.projectPoints(np.asarray(object_points, dtype=np.float64),
+                                         rvecs[frame], tvecs[frame],
+                                         INTRINSICS, DISTORTION)
+        errors = np.linalg.norm(projected.reshape(-1, 2) - image_points, axis=1)
+        assert given['frame_rms'][frame] == pytest.approx(
+            np.sqrt(np.mean(errors ** 2)), rel=1e-3)
+
+    # Fitting the pose to each frame can only reduce its error.
+    estimated = re.evaluate_reprojection_errors(frames, INTRINSICS, DISTORTION)
+    assert np.all(np.isnan(estimated['rvecs'][3]))
+    assert estimated['summary']['rms'] <= summary['rms']
+    assert 'mean_seconds_per_frame' not in estimated['summary']
+
+
+def test_evaluate_invalid_and_empty():
+    frames, rvecs, tvecs = _make_frames(2)
+    with pytest.raises(ValueError):
+        re.evaluate_reprojection_errors(frames, INTRINSICS, DISTORTION, rvecs=rvecs)
+    with pytest.raises(ValueError):
+        re.evaluate_reprojection_errors(frames, INTRINSICS, DISTORTION,
+                                        rvecs[0:1], tvecs[0:1])
+    empty = re.evaluate_reprojection_errors([], INTRINSICS, DISTORTION)
+    assert empty['summary']['number_of_points'] == 0
+    assert np.isnan(empty['summary']['rms'])
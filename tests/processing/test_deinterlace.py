@@ -85,3 +85,28 @@ def test_deinterlace_from_file():
     even_new, odd_new = interlace.deinterlace_to_new(interlaced)
     np.testing.assert_array_equal(even_new, expected_even)
     np.testing.assert_array_equal(odd_new, expected_odd)
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint16])
+def test_deinterlace_single_channel(dtype):
+    interlaced = np.arange(8 * 6, dtype=dtype).reshape((8, 6))
+
+    even_new, odd_new = interlace.deinterlace_to_new(interlaced)
+    assert even_new.shape == (4, 6)
+    assert odd_new.shape == (4, 6)
+    assert even_new.dtype == dtype
+    np.testing.assert_array_equal(even_new, interlaced[0::2])
+    np.testing.assert_array_equal(odd_new, interlaced[1::2])
+
+    even_view, odd_view = interlace.deinterlace_to_view(interlaced)
+    np.testing.assert_array_equal(even_view, even_new)
+    np.testing.assert_array_equal(odd_view, odd_new)
+
+
+def test_deinterlace_mismatched_channels():
+    interlaced = np.zeros((8, 6, 3), dtype=np.uint8)
+    even_rows = np.zeros((4, 6), dtype=np.uint8)
+    odd_rows = np.zeros((4, 6), dtype=np.uint8)
+
+    with pytest.raises(ValueError):
+        interlace.deinterlace_to_preallocated(interlaced, even_rows, odd_rows)
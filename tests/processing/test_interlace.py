@@ -64,3 +64,12 @@ def test_interlace_from_file():
     expected_interlaced = cv2.imread('tests/data/processing/test-16x8-rgb.png')
     interlaced = interlace.interlace_to_new(even, odd)
     np.testing.assert_array_equal(interlaced, expected_interlaced)
+
+
+def test_interlace_single_channel_round_trip():
+    expected_interlaced = np.arange(8 * 6, dtype=np.uint16).reshape((8, 6))
+    even, odd = interlace.deinterlace_to_new(expected_interlaced)
+    interlaced = interlace.interlace_to_new(even, odd)
+    assert interlaced.shape == (8, 6)
+    assert interlaced.dtype == np.uint16
+    np.testing.assert_array_equal(interlaced, expected_interlaced)
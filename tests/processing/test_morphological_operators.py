@@ -26,3 +26,123 @@ def test_dilate_cross_3():
     expected = cv2.imread('tests/data/processing/j_dilated.png')
     output = mo.dilate_with_cross(original, iterations=10)
     np.testing.assert_array_equal(output, expected)
+
+
+def test_structuring_element_is_cached():
+    first = mo.get_structuring_element(cv2.MORPH_ELLIPSE, 5)
+    second = mo.get_structuring_element(cv2.MORPH_ELLIPSE, (5, 5))
+    assert first is second
+    assert not first.flags.writeable
+    np.testing.assert_array_equal(
+        first, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5)))
+
+
+def test_invalid_structuring_element():
+    with pytest.raises(ValueError):
+        mo.get_structuring_element(cv2.MORPH_CROSS, 0)
+    with pytest.raises(ValueError):
+        mo.get_structuring_element(99, 3)
+
+
+@pytest.mark.parametrize("function, operation", [
+    (mo.open_image, cv2.MORPH_OPEN),
+    (mo.close_image, cv2.MORPH_CLOSE),
+    (mo.gradient, cv2.MORPH_GRADIENT),
+    (mo.top_hat, cv2.MORPH_TOPHAT),
+    (mo.black_hat, cv2.MORPH_BLACKHAT),
+])
+def test_composed_operations_into_preallocated(function, operation):
+    original = cv2.imread('tests/data/processing/j.png', cv2.IMREAD_GRAYSCALE)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
+    expected = cv2.morphologyEx(original, operation, kernel)
+    dst = np.zeros_like(original)
+    output = function(original, dst=dst, shape=cv2.MORPH_RECT, size=5)
+    assert output is dst
+    np.testing.assert_array_equal(output, expected)
+
+
+def test_chain_matches_separate_calls():
+    original = cv2.imread('tests/data/processing/j.png', cv2.IMREAD_GRAYSCALE)
+    expected = mo.erode(original, size=3)
+    expected = mo.open_image(expected, shape=cv2.MORPH_ELLIPSE, size=5)
+    expected = mo.dilate_with_cross(expected, size=3, iterations=2)
+
+    chain = mo.MorphologyChain()
+    chain.add(cv2.MORPH_ERODE, size=3) \
+         .add(cv2.MORPH_OPEN, shape=cv2.MORPH_ELLIPSE, size=5) \
+         .add(cv2.MORPH_DILATE, size=3, iterations=2)
+
+    output = chain.apply(original)
+    np.testing.assert_array_equal(output, expected)
+    buffers = [id(buffer) for buffer in chain.buffers]
+
+    dst = np.zeros_like(original)
+    output = chain.apply(original, dst=dst)
+    assert output is dst
+    np.testing.assert_array_equal(output, expected)
+    assert [id(buffer) for buffer in chain.buffers] == buffers
+
+
+def test_empty_chain():
+    chain = mo.MorphologyChain()
+    with pytest.raises(ValueError):
+        chain.apply(np.zeros((10, 10), dtype=np.uint8))
+    with pytest.raises(TypeError):
+        chain.add(cv2.MORPH_ERODE).apply(None)
+
+
+def _make_binary_mask():
+    generator = np.random.default_rng(seed=42)
+    mask = (generator.random((120, 160)) > 0.3).astype(np.uint8) * 255
+    return cv2.medianBlur(mask, 5)
+
+
+@pytest.mark.parametrize("size, iterations", [(3, 1), (3, 45), (21, 1), (31, 3)])
+@pytest.mark.parametrize("method", ['direct', 'separable', 'auto'])
+def test_fast_paths_are_identical(size, iterations, method):
+    original = _make_binary_mask()
+    kernel = cv2.getStructuringElement(cv2.MORPH_CROSS, (size, size))
+    expected_eroded = cv2.erode(original, kernel, iterations=iterations)
+    expected_dilated = cv2.dilate(original, kernel, iterations=iterations)
+
+    eroded = mo.erode_with_cross(original, size=size, iterations=iterations,
+                                 method=method)
+    dilated = mo.dilate_with_cross(original, size=size, iterations=iterations,
+                                   method=method)
+    np.testing.assert_array_equal(eroded, expected_eroded)
+    np.testing.assert_array_equal(dilated, expected_dilated)
+
+
+@pytest.mark.parametrize("iterations", [1, 5, 30])
+def test_distance_path_is_identical(iterations):
+    original = _make_binary_mask()
+    kernel = cv2.getStructuringElement(cv2.MORPH_CROSS, (3, 3))
+    expected = cv2.erode(original, kernel, iterations=iterations)
+    dst = np.zeros_like(original)
+    output = mo.erode_with_cross(original, dst=dst, iterations=iterations,
+                                 method='distance')
+    assert output is dst
+    np.testing.assert_array_equal(output, expected)
+
+    expected = cv2.dilate(original, kernel, iterations=iterations)
+    output = mo.dilate_with_cross(original, iterations=iterations,
+                                  method='distance')
+    np.testing.assert_array_equal(output, expected)
+
+
+def test_separable_path_on_colour_image():
+    original = cv2.imread('tests/data/processing/j.png')
+    kernel = cv2.getStructuringElement(cv2.MORPH_CROSS, (25, 25))
+    expected = cv2.dilate(original, kernel, iterations=2)
+    dst = np.zeros_like(original)
+    output = mo.dilate_with_cross(original, dst=dst, size=25, iterations=2)
+    assert output is dst
+    np.testing.assert_array_equal(output, expected)
+
+
+def test_invalid_cross_method():
+    original = cv2.imread('tests/data/processing/j.png')
+    with pytest.raises(ValueError):
+        mo.erode_with_cross(original, method='fastest')
+    with pytest.raises(ValueError):
+        mo.erode_with_cross(original, iterations=30, method='distance')
@@ -96,4 +96,18 @@ def test_split_from_file():
     # Testing creating new images
     top_new, bottom_new = i.split_stacked_to_new(stacked)
     np.testing.assert_array_equal(top_new, expected_top)
-    np.testing.assert_array_equal(bottom_new, expected_bottom)
\ No newline at end of file
+    np.testing.assert_array_equal(bottom_new, expected_bottom)
+
+
+def test_single_channel_split():
+    stacked = np.arange(8 * 6, dtype=np.uint16).reshape((8, 6))
+
+    top, bottom = i.split_stacked_to_new(stacked)
+    assert top.shape == (4, 6)
+    assert top.dtype == np.uint16
+    np.testing.assert_array_equal(top, stacked[:4])
+    np.testing.assert_array_equal(bottom, stacked[4:])
+
+    top_view, bottom_view = i.split_stacked_to_view(stacked)
+    np.testing.assert_array_equal(top_view, top)
+    np.testing.assert_array_equal(bottom_view, bottom)
@@ -0,0 +1,113 @@
+# coding=utf-8
+
+"""
+Tests for the per-stage timing instrumentation.
+"""
+
+import json
+import os
+import cv2
+import numpy as np
+import pytest
+import sksurgeryimage.utilities.instrumentation as si
+import sksurgeryimage.acquire.stereo_video as sv
+import sksurgeryimage.acquire.video_writer as vw
+from sksurgeryimage.calibration.chessboard_point_detector import ChessboardPointDetector
+
+
+def test_disabled_by_default():
+    assert not si.is_enabled()
+    assert si.stage('a') is si.stage('b')
+    with si.stage('a'):
+        pass
+
+
+def test_callbacks():
+    recorded = []
+
+    def callback(name, seconds):
+        recorded.append((name, seconds))
+
+    si.add_callback(callback)
+    si.add_callback(callback)
+    try:
+        assert si.is_enabled()
+        with pytest.raises(RuntimeError):
+            with si.stage('failing'):
+                raise RuntimeError("Still timed")
+        si.record('external', 0.5)
+    finally:
+        si.remove_callback(callback)
+    assert not si.is_enabled()
+
+    assert [name for name, _ in recorded] == ['failing', 'external']
+    assert recorded[0][1] >= 0
+    with pytest.raises(TypeError):
+        si.add_callback(None)
+
+
+def test_histograms():
+    histograms = si.StageHistograms()
+    for seconds in [0.001] * 98 + [0.1, 20.0]:
+        histograms('stage', seconds)
+    histograms('never', 1000.0)
+
+    assert histograms.get_stages() == ['never', 'stage']
+    edges, counts = histograms.get_histogram('stage')
+    assert edges.shape == counts.shape
+    assert np.isinf(edges[-1])
+    assert np.sum(counts) == 100
+    assert counts[-1] == 0
+    assert histograms.get_histogram('never')[1][-1] == 1
+
+    summary = histograms.get_summary()['stage']
+    assert summary['count'] == 100
+    assert summary['total'] == pytest.approx(20.198)
+    assert summary['max'] == 20.0
+    assert summary['p50'] == pytest.approx(0.001)
+    assert 0.1 <= summary['p99'] < 0.13
+
+    exported = json.loads(json.dumps(histograms.get_histograms()))
+    assert len(exported['counts']['stage']) == len(exported['edges']) + 1
+
+    histograms.reset()
+    assert not histograms.get_stages()
+    with pytest.raises(ValueError):
+        si.StageHistograms([1, 0.5])
+
+
+def test_library_stages(tmp_path):
+    image = cv2.imread('tests/data/calib-opencv/left01.jpg')
+    detector = ChessboardPointDetector((9, 6), 3)
+    video = sv.StereoVideo(sv.StereoVideoLayouts.INTERLACED,
+                           ['tests/data/acquire/100x50_100_frames.avi'])
+    writer = vw.TimestampedVideoWriter(os.path.join(tmp_path, 'out.avi'),
+                                       width=image.shape[1],
+                                       height=image.shape[0])
+
+    with si.collect() as histograms:
+        video.grab()
+        video.retrieve()
+        video.get_scaled()
+        detector.get_points(image)
+        writer.write_frame(image)
+        writer.close()
+    assert not si.is_enabled()
+    video.release()
+
+    assert histograms.get_stages() == sorted([
+        'video_source.grab',
+        'video_source.retrieve',
+        'stereo_video.get_scaled',
+        'stereo_video.get_images',
+        'stereo_video.deinterlace',
+        'stereo_video.scale',
+        'point_detector.preprocess',
+        'point_detector.detect',
+        'chessboard.find_corners',
+        'chessboard.refine',
+        'video_writer.encode',
+        'video_writer.flush'])
+    summary = histograms.get_summary()
+    assert summary['point_detector.detect']['total'] \
+        >= summary['chessboard.find_corners']['total']